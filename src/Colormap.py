@@ -1,10 +1,18 @@
 import math
+import functools
 import pandas as pd
 import numpy as np
 from math import log10
-from PIL import Image, ImageDraw
+from PIL import Image
 from dataclasses import dataclass
 
+# the number of colors of the lookup table of the heatmap
+LUT_SIZE = 1024
+# values below are clamped before taking the logarithm
+LOG_MINIMUM = 0.00001
+# the ASCII codes of the hex digits
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype='uint8')
+
 @dataclass
 class heatmapResult:
     """somehow a struct holding the information about the map that should be generated
@@ -13,8 +21,8 @@ class heatmapResult:
     minimum: float
     # the maximum of the given values
     maximum: float
-    # an array of colors, one per given value
-    colors: [] = None
+    # an array of colors, one RGB row per given value
+    colors: np.ndarray = None
 
 class Colormap:
     """funtions to map values in the range minValue to maxValue to an rgb color.
@@ -30,32 +38,91 @@ class Colormap:
         """constructor
         """
         
+    @staticmethod
+    def __check_color_values(colorValues, name = 'colorValues'):
+        """returns the color values as an array of RGB rows
+
+        Raises:
+            ValueError: If a tuple has not 3 elements for RGB, or if a list of such tuples is empty
+        """
+        colorValues = np.asarray(colorValues, dtype='float64')
+        if len(colorValues) == 0:
+            raise ValueError('Expect an array of R, G, B tuples. Instead len(' + name + ') is 0.')
+        if colorValues.ndim != 2 or colorValues.shape[1] != 3:
+            raise ValueError('Tuple length of ' + name + ' should be 3. Instead it is: ' + str(np.shape(colorValues)[-1]) + '.')
+        return colorValues
+
     @staticmethod
     def convert_float_to_byte_colors(floatColors):
         """conversion of float color values (0.0 - 1.0) to byte values (0x00 - 0xFF)
 
         Args:
-            floatColors (list): A list of float tuples in the range 0.0 - 1.0 representing RGB values
+            floatColors (list): A list or an array of float tuples in the range 0.0 - 1.0 representing RGB values
 
         Raises:
             ValueError: If a tuple has not 3 elements for RGB, or if a list of such tuples is empty
   
         Returns:
-            list: A list of byte tuples in the range 0x00 - 0xFF representing RGB values
+            np.ndarray: An array of byte tuples in the range 0x00 - 0xFF representing RGB values
         """
-        # check parameters
-        if len(floatColors) == 0:
-            raise ValueError('Expect an array of R, G, B tuples. Instead len(colorValues) is 0.')
-        if len(floatColors[0]) != 3:
-            raise ValueError('Tuple length of colorValues should be 3. Instead it is: ' + str(len(floatColors) + '.'))
-        result = []
-        byteColors = []
-        for floatColor in floatColors:
-            r = round(floatColor[0] * 255)
-            g = round(floatColor[1] * 255)
-            b = round(floatColor[2] * 255)
-            byteColors.append((r, g, b))
-        return byteColors
+        floatColors = Colormap.__check_color_values(floatColors)
+        # round half to even like round()
+        return np.rint(floatColors * 255).astype('uint8')
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def get_lut(size = LUT_SIZE, blendValue = None, blendFactor = 0.0):
+        """returns the lookup table of the heatmap, the colors from blue (minimum) to red (maximum) followed by white 
+        for NaN. The blending is applied to the table once. The tables are cached and read-only
+
+        Args:
+            size (int, optional): The number of colors from the minimum to the maximum. Defaults to LUT_SIZE.
+            blendValue (tuple, optional): A tuple holding 3 float values ranging from 0.0 to 1.0 representing a RGB color. Defaults to None.
+            blendFactor (float, optional): A blend factor ranging from 0.0 to 1.0. The original color will be weight with (1-blendFactor), the blendValue with blendFactor. Defaults to 0.0.
+
+        Returns:
+            np.ndarray: The (size + 1) RGB rows of float values in the range 0.0 - 1.0
+        """
+        lut = np.empty((size + 1, 3))
+        # the piecewise linear mapping of heatmap_from_value, 0.0 is blue and 1.0 is red
+        positions = np.linspace(0.0, 1.0, size)
+        lut[:size, 0] = np.clip(4 * positions - 2, 0.0, 1.0)
+        lut[:size, 1] = np.clip(np.minimum(4 * positions, 4 - 4 * positions), 0.0, 1.0)
+        lut[:size, 2] = np.clip(2 - 4 * positions, 0.0, 1.0)
+        # NaN is white
+        lut[size] = 1.0
+        if blendValue is not None and blendFactor != 0.0:
+            lut = Colormap.blend_color_values(lut, blendValue, blendFactor)
+        lut.setflags(write=False)
+        return lut
+
+    @staticmethod
+    def heatmap_from_array(values, minVal, maxVal, lut = None):
+        """returns the heatmap colors of an array of values by looking them up in a table, values close to minVal will 
+        become blue and values close to maxVal will become red
+
+        Args:
+            values (np.ndarray): The values
+            minVal (float): The minimum value representing blue in the heatmap
+            maxVal (float): The maximum value representing red in the heatmap
+            lut (np.ndarray, optional): The lookup table as returned by get_lut. Defaults to None for the default table.
+
+        Returns:
+            np.ndarray: The RGB rows of float values in the range 0.0 - 1.0, one per value
+        """
+        if lut is None:
+            lut = Colormap.get_lut()
+        size = len(lut) - 1
+        values = np.asarray(values, dtype='float64')
+        dv = maxVal - minVal
+        if dv == 0:
+            # nothing to map when there is no range -> red
+            indices = np.full(values.shape, size - 1)
+        else:
+            positions = np.clip((values - minVal) / dv, 0.0, 1.0)
+            indices = np.rint(np.nan_to_num(positions) * (size - 1)).astype('int64')
+        indices[np.isnan(values)] = size
+        return lut[indices]
 
     @staticmethod
     def create_heatmap_bar(barSize, blendValue=None, blendFactor=0.0):
@@ -69,40 +136,18 @@ class Colormap:
         Returns:
             PIL.Image: The image showing the heatmap
         """
-        # create a new image
-        bar = Image.new(mode='RGB', size=barSize)
-        # create a df holding the x positions
-        values = []
-        # the x-positions
-        for x in range(barSize[0]):
-            values.append(x)
-        # the df
-        df = pd.DataFrame(np.asarray(values))
-        # ...and a name for the column
-        df.columns = ['Values']
-        
-        # get the RGB values as floats ranging from 0.0 to 1.0
-        res = Colormap.heatmap_from_dataframe(df, 'Values')
-        # blend colors if requested
-        if blendFactor != 0.0:
-            colorValues = Colormap.blend_color_values(res.colors, blendValue=blendValue, blendFactor=blendFactor)
-        # convert them to bytes ranging from 0 to 0xFF
-        colorValues = Colormap.convert_float_to_byte_colors(colorValues)
-        
-        # get a drawing context
-        draw = ImageDraw.Draw(bar)
-        for x in range(barSize[0]):
-            p0 = (x, 0)
-            p1 = (x, barSize[1] - 1)
-            draw.line((p0, p1), fill=colorValues[x])
-        return bar
+        lut = Colormap.get_lut(LUT_SIZE, None if blendValue is None else tuple(blendValue), blendFactor)
+        # the colors of the x positions
+        colorValues = Colormap.convert_float_to_byte_colors(Colormap.heatmap_from_array(np.arange(barSize[0]), 0, barSize[0] - 1, lut))
+        # every row of the bar is the same
+        return Image.fromarray(np.ascontiguousarray(np.broadcast_to(colorValues, (barSize[1], barSize[0], 3))), mode='RGB')
 
     @staticmethod
     def color_values_to_hex_triplets(colorValues):
         """converts converts float color values to a hex string
 
         Args:
-            colorValues (tuple): A list of float tuples in the range 0.0 - 1.0 representing RGB values
+            colorValues (tuple): A list or an array of float tuples in the range 0.0 - 1.0 representing RGB values
 
         Raises:
             ValueError: If a tuple has not 3 elements for RGB, or if a list of such tuples is empty
@@ -110,25 +155,20 @@ class Colormap:
         Returns:
             list: A list of strings holding color information in the form of #RRGGBB
         """
-        # check parameters
-        if len(colorValues) == 0:
-            raise ValueError('Expect an array of R, G, B tuples. Instead len(colorValues) is 0.')
-        # check the men of the given tuple
-        if len(colorValues[0]) != 3:
-            raise ValueError('Tuple lenght should be 3. Instead it is: ' + str(len(colorValues[0]) + '.'))
-        result = []
-        for colorValue in colorValues:
-            # maps it to a RGB string holding hex values
-            hexTriplet = '#%02x%02x%02x' % (round(colorValue[0] * 255), round(colorValue[1] * 255), round(colorValue[2] * 255))
-            result.append(hexTriplet)
-        return result
+        byteColors = Colormap.convert_float_to_byte_colors(colorValues)
+        # the characters of the strings, '#' followed by the hex digits of the high and low nibble of each byte
+        chars = np.empty((len(byteColors), 7), dtype='uint8')
+        chars[:, 0] = ord('#')
+        chars[:, 1::2] = HEX_DIGITS[byteColors >> 4]
+        chars[:, 2::2] = HEX_DIGITS[byteColors & 0x0f]
+        return chars.view('S7').ravel().astype('U7').tolist()
 
     @staticmethod
     def blend_color_values(colorValues, blendValue, blendFactor):
         """alpha-blending of an array of float color values and a given blend float color value
 
         Args:
-            colorValues (list): A list of float tuples in the range 0.0 - 1.0 representing RGB values
+            colorValues (list): A list or an array of float tuples in the range 0.0 - 1.0 representing RGB values
             blendValue (tuple): A tuple holding 3 float values ranging from 0.0 to 1.0 representing a RGB color.
             blendFactor (float): A blend factor ranging from 0.0 to 1.0. The original color will be weight with (1-blendFactor), the blendValue with blendFactor.
 
@@ -136,25 +176,15 @@ class Colormap:
             ValueError: If a tuple has not 3 elements for RGB, or if a list of such tuples is empty
 
         Returns:
-            list: A list of float tuples in the range 0.0 - 1.0 representing RGB values
+            np.ndarray: An array of float tuples in the range 0.0 - 1.0 representing RGB values
         """
-        # check parameters
-        if len(colorValues) == 0:
-            raise ValueError('Expect an array of R, G, B tuples. Instead len(colorValues) is 0.')
         if len(blendValue) != 3:
-            raise ValueError('Tuple length of blendValue should be 3. Instead it is: ' + str(len(blendValue) + '.'))
-        if len(colorValues[0]) != 3:
-            raise ValueError('Tuple length of colorValues should be 3. Instead it is: ' + str(len(colorValues) + '.'))
-        result = []
-        for colorValue in colorValues:
-            r = colorValue[0] * (1 - blendFactor) + blendValue[0] * blendFactor
-            g = colorValue[1] * (1 - blendFactor) + blendValue[1] * blendFactor
-            b = colorValue[2] * (1 - blendFactor) + blendValue[2] * blendFactor
-            result.append((r, g, b))
-        return result 
+            raise ValueError('Tuple length of blendValue should be 3. Instead it is: ' + str(len(blendValue)) + '.')
+        colorValues = Colormap.__check_color_values(colorValues)
+        return colorValues * (1 - blendFactor) + np.asarray(blendValue, dtype='float64') * blendFactor
 
     @staticmethod
-    def heatmap_from_dataframe(df, column, useLog = False, gain = 1.0, offset = 0.0):
+    def heatmap_from_dataframe(df, column, useLog = False, gain = 1.0, offset = 0.0, blendValue = None, blendFactor = 0.0):
         """[Returns an array of color tuples for each value in the given column of a dataframe as a heatmap.
             values close to minValue will become blue and values close to maxValue will become red.
             refer to: 
@@ -166,41 +196,28 @@ class Colormap:
             useLog (bool, optional): If True the it will use the logarithm of the values. Defaults to False.
             gain (float, optional): A gain to be applied to the values. Defaults to 1.0.
             offset (float, optional): An offset to be applied to the values. Defaults to 0.0.
+            blendValue (tuple, optional): A RGB color the heatmap is blended with. Defaults to None.
+            blendFactor (float, optional): The weight of the blendValue, see blend_color_values. Defaults to 0.0.
 
         Returns:
-            list: A list of float tuples in the range 0.0 - 1.0 representing RGB values
+            heatmapResult: The minimum, the maximum and an array of float tuples in the range 0.0 - 1.0 representing 
+                           RGB values
         """
         # get min and max
         minVal = df[column].min() * gain + offset
         maxVal = df[column].max()
         result = heatmapResult(minVal, maxVal)
+        # apply gain and offset
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan) * gain + offset
         if (useLog):
             # get the log10 of min and max, take care of small values
-            if (minVal < 0.00001):
-                minVal = -5.0
-            else:
-                minVal = math.log10(minVal)
-            if (maxVal < 0.00001):
-                maxVal = -5.0
-            else:
-                maxVal = math.log10(maxVal)
-        # init result
-        resultColors = []
-        for index, value in df[column].iteritems():
-            # apply gain and offset
-            val = value * gain + offset
-            if (useLog):
-                # use the log of the value
-                if (val < 0.00001):
-                    val = 0.00001
-                # get the color value
-                val = Colormap.heatmap_from_value(log10(val), minVal, maxVal)
-            else:
-                # get the color value
-                val = Colormap.heatmap_from_value(val, minVal, maxVal)
-            # append it to the result
-            resultColors.append(val)
-        result.colors = resultColors
+            minVal = -5.0 if minVal < LOG_MINIMUM else math.log10(minVal)
+            maxVal = -5.0 if maxVal < LOG_MINIMUM else math.log10(maxVal)
+            # use the log of the values
+            with np.errstate(invalid='ignore'):
+                values = np.log10(np.where(values < LOG_MINIMUM, LOG_MINIMUM, values))
+        lut = Colormap.get_lut(LUT_SIZE, None if blendValue is None else tuple(blendValue), blendFactor)
+        result.colors = Colormap.heatmap_from_array(values, minVal, maxVal, lut)
         return result
 
     # returns a heatmap color value for a given value
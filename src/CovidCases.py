@@ -5,7 +5,6 @@ import re
 import time
 import datetime
 import os
-import requests
 import re
 from datetime import date
 from abc import ABC, abstractmethod
@@ -140,6 +139,33 @@ class CovidCases(ABC):
         # return the dataframe
         return pd.DataFrame(np.asarray(result))
 
+    @staticmethod
+    def get_date_indexed_snapshot(df, attributes, uidColumn = 'GeoID', dtype = 'float32'):
+        """Returns a snapshot of some attributes of a data frame holding several countries, e.g. as returned by
+        get_data_by_geoid_list, in one pivot. The snapshot is indexed by the date and has a column for each attribute
+        and country, so the values of all countries for a range of dates are sliced in one shot:
+            snapshot['Incidence7DayPer100Kpopulation'].iloc[-28:]
+
+        Args:
+            df (DataFrame): The data frame holding all countries
+            attributes (list): The numeric attributes to keep, missing attributes are ignored
+            uidColumn (str, optional): The column holding the unique ID of the countries. Defaults to 'GeoID'.
+            dtype (str, optional): The type of the values. float32 is precise enough for the maps and halves the 
+                                   memory, None keeps the types of the pivot, e.g. for exact counts. Defaults to 
+                                   'float32'.
+
+        Returns:
+            DataFrame: A data frame of the values indexed by the sorted dates with the columns (attribute, uid)
+        """
+        # only the attributes that exist
+        attributes = [attribute for attribute in attributes if attribute in df.columns]
+        # one row per date, the duplicates of a country on the same day are dropped
+        df = df.drop_duplicates(subset=['Date', uidColumn], keep='last')
+        snapshot = df.pivot(index='Date', columns=uidColumn, values=attributes)
+        if dtype is not None:
+            snapshot = snapshot.astype(dtype)
+        return snapshot.sort_index()
+
     @staticmethod
     def create_combined_dataframe_by_geoid_string_list(dfList, geoIDs, lastNdays=0, sinceNcases=0): 
         """Creates a combined dataframe from a list of individual datafames. To avoid
@@ -554,6 +580,14 @@ class CovidCases(ABC):
         # return the concatenated dataframe
         return self.get_data_by_geoid_list(geoIDs, lastNdays, sinceNcases)
 
+    def get_number_of_rows(self):
+        """Return the number of rows of the data of all countries as loaded by the sub-class.
+        
+        Returns:
+            int: The number of rows
+        """
+        return len(self.__df)
+
     def get_all_data(self):
         """Return the dataframe of all countries in the database.
         
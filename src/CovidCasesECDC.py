@@ -5,7 +5,6 @@ import re
 import time
 import datetime
 import os
-import requests
 import re
 from datetime import date
 from CovidCases import CovidCases
@@ -157,6 +156,7 @@ class CovidCasesECDC(CovidCases):
         else:
             # download the file from the ecdc server
             url = 'https://opendata.ecdc.europa.eu/covid19/casedistribution/csv/'
+            import requests
             r = requests.get(url, timeout=1.0)
             if r.status_code == requests.codes.ok:
                 with open(targetFilename, 'wb') as f:
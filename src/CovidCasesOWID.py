@@ -5,10 +5,10 @@ import re
 import time
 import datetime
 import os
-import requests
 import re
 from datetime import date
 from CovidCases import CovidCases
+from Downloader import download_file
 from GeoInformationWorld import GeoInformationWorld
 
 # terms and their description from the OWID website:
@@ -280,7 +280,8 @@ class CovidCasesOWID(CovidCases):
             FileNotFoundError: In case it couldn't download the file
 
         Returns:
-            str: The filename of the database wether it has been downloaded or not.
+            str: The filename of the database wether it has been downloaded or not. If the server reports that the 
+                 file of the last download is still up to date, that file will be returned.
         """
         # todays date
         today = date.today()
@@ -302,14 +303,10 @@ class CovidCasesOWID(CovidCases):
         if os.path.exists(targetFilename):
             print('using existing file: ' + targetFilename)
         else:
-            # download the file from the ecdc server
+            # download the file from the server unless the file of the last download is still up to date
             url = 'https://covid.ourworldindata.org/data/owid-covid-data.csv'
-            r = requests.get(url, timeout=1.0)
-            if r.status_code == requests.codes.ok:
-                with open(targetFilename, 'wb') as f:
-                    f.write(r.content)
-            else:
-                raise FileNotFoundError('Error getting CSV file. Error code: ' + str(r.status_code))
+            stateFilename = os.path.join(os.path.dirname(targetFilename), 'OWID-download.json')
+            targetFilename = download_file(url, targetFilename, stateFilename, minCheckInterval=3600)
         return targetFilename
 
     def get_available_GeoID_list(self):
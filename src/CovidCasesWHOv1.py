@@ -5,7 +5,6 @@ import re
 import time
 import datetime
 import os
-import requests
 import re
 from datetime import date
 from CovidCases import CovidCases
@@ -251,6 +250,7 @@ class CovidCasesWHOv1(CovidCases):
         else:
             # download the file from the ecdc server
             url = 'https://github.com/WorldHealthOrganization/xform-covid-casecount-who/raw/master/output/admin0/all.csv'
+            import requests
             r = requests.get(url, timeout=1.0)
             if r.status_code == requests.codes.ok:
                 with open(targetFilename, 'wb') as f:
@@ -1,16 +1,14 @@
 import pandas as pd
 import numpy as np
 import os
-import geopandas as gpd
-import requests
 import json
 import datetime
 from abc import ABC, abstractmethod
 from pathlib import Path
-import folium
 from typing import List
 from dataclasses import dataclass, field
 from datetime import date, timedelta
+from GeometryCache import get_simplified_topology
 
 """ This abstract class acts as a base class for other classes that implement different folium maps based on different data 
     sources. Here are some usefull links:
@@ -68,6 +66,7 @@ def download_JSON_file(endpoint, filename):
     Raises:
         IOError: In case it can't save the data
     """
+    import requests
     # contact the server
     res = requests.get(endpoint)
     # check if there was a response
@@ -134,6 +133,11 @@ class CovidFoliumMap(ABC):
         """
         # keep the data directory
         self.__dataDirectory = dataDirectory
+        # the geo df joined with the data df, the options it was built for and the bins of its attributes
+        self.__joined = None
+        self.__joinedKey = None
+        self.__topology = None
+        self.__quantiles = None
 
     @dataclass
     class mapOptions:
@@ -160,6 +164,22 @@ class CovidFoliumMap(ABC):
         """
         bins: List[float] = field(default_factory=lambda : [])
         """ A list of values representing the colour bins (Folium supports up to 10 bins), or none to calculate default bins
+        """
+        simplifyTolerance: float = 0.0
+        """ The tolerance in degrees to simplify the borders in the map, neighbours keep sharing their borders. 0 keeps 
+        all points of the borders
+        """
+        coordinatePrecision: int = None
+        """ The number of decimal places of the coordinates in the map, or None to keep the coordinates of the geo df 
+        unless the borders are simplified
+        """
+        topoJSON: bool = False
+        """ True to embed the geometry as TopoJSON instead of GeoJSON, the shared borders are stored once
+        """
+        splitAssets: bool = False
+        """ True to write the geometry and the data as assets next to the HTML file instead of embedding them, the map
+        joins them in the browser. The geometry asset is versioned and written once, only the small data asset changes
+        every day
 
         Returns:
             mapOptions: The struct of options
@@ -173,36 +193,70 @@ class CovidFoliumMap(ABC):
 
         Args:
             basemap (str): The name of the basemap to be used. Can be one of the nice_basemaps or something different
-            coloredAttribute (str, optional): [description]. Defaults to 'Incidence7DayPer100Kpopulation'.
-            coloredAttributeAlias (str, optional): [description]. Defaults to '7-day incidence per 100.000 population'.
+            coloredAttribute (str or list, optional): The attribute to be colored or a list of attributes to create
+                                                      a layer for each, the layers share one geometry and can be 
+                                                      switched. Defaults to 'Incidence7DayPer100Kpopulation'.
+            coloredAttributeAlias (str or list, optional): The alias of the attribute or a list of aliases of the
+                                                           attributes. Defaults to '7-day incidence per 100.000 
+                                                           population'.
         """
-        # get the map options
-        dfGeo = self.get_geo_df()
-        dfData = self.get_data_df()
+        # one or more attributes
+        coloredAttributes = coloredAttribute if isinstance(coloredAttribute, list) else [coloredAttribute]
+        coloredAttributeAliases = coloredAttributeAlias if isinstance(coloredAttributeAlias, list) else [coloredAttributeAlias]
+        coloredAttribute = coloredAttributes[0]
+        # the joined geo and data df is built once, each map takes the columns it needs
         mapOptions = self.get_default_map_options()
-        # check if we have every<thing that we need
-        if (dfGeo is None) or (dfData is None):
+        joined, topology = self.get_joined_df()
+        # check if we have everything that we need
+        if joined is None:
             return None
-        # merge geo and data dfs. ensure merging to the geoDF to keep the result a geoPandas df
-        combined = dfGeo.merge(dfData[[self.get_merge_UID()] + mapOptions.tooltipAttributes], 
-                               on=self.get_merge_UID(), 
-                               how='left')
+        columns = list(dict.fromkeys([self.get_merge_UID()] + mapOptions.tooltipAttributes + coloredAttributes))
+        combined = joined[columns + [joined.geometry.name]]
+        topology = self.__get_matching_topology(joined, topology)
+        import folium
         # create the map
         map = folium.Map(attr=mapOptions.mapAttribute, location=mapOptions.mapLocation, tiles=basemap, zoom_start=mapOptions.mapZoom)
         # the alias incl. the date
-        coloredAttributeAlias = coloredAttributeAlias + ' as of ' + mapOptions.mapDate.strftime('%Y-%m-%d')
+        coloredAttributeAliases = [alias + ' as of ' + mapOptions.mapDate.strftime('%Y-%m-%d') for alias in coloredAttributeAliases]
+        coloredAttributeAlias = coloredAttributeAliases[0]
         # the bins for the colored values
         if (mapOptions.bins is None):
-            mapOptions.bins = list(combined[coloredAttribute].quantile([0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 1.0]))
+            bins = self.__get_default_bins(coloredAttribute)
         else:      
+            bins = list(mapOptions.bins)
             # the minimum/maximum in the coloredAttribute column
-            maximum = dfData[coloredAttribute].max()
-            minimum = dfData[coloredAttribute].min()
+            maximum = joined[coloredAttribute].max()
+            minimum = joined[coloredAttribute].min()
             # ensure min/max value will fit in the bins
-            mapOptions.bins[mapOptions.bins.count(0)-1] = max(maximum, mapOptions.bins[mapOptions.bins.count(0)-1])
-            mapOptions.bins[0] = min(minimum, mapOptions.bins[0])
+            bins[bins.count(0)-1] = max(maximum, bins[bins.count(0)-1])
+            bins[0] = min(minimum, bins[0])
+        if (len(coloredAttributes) > 1) or mapOptions.splitAssets:
+            from MapAssets import add_layered_choropleth
+            # the first layer uses the bins of the options, the others the default bins
+            bins = [bins] + [self.__get_default_bins(attribute) for attribute in coloredAttributes[1:]]
+            # the layers share the geometry, embedded or as an asset, the records are the rows having data
+            add_layered_choropleth(map, 
+                                   combined, 
+                                   self.get_data_df(), 
+                                   self.get_merge_UID(), 
+                                   coloredAttributes, 
+                                   coloredAttributeAliases, 
+                                   bins, 
+                                   mapOptions.tooltipAttributes, 
+                                   topology,
+                                   self.get_data_directory() if mapOptions.splitAssets else None,
+                                   mapOptions.mapAlias)
+            return map
+        geoData = combined
+        topoJSONobject = None
+        if topology is not None:
+            # the join keeps the rows of the geo df, so the features of the topology match the rows 
+            properties = json.loads(combined.drop(columns=combined.geometry.name).to_json(orient='records'))
+            geoData = topology.to_topojson(properties, 'features')
+            topoJSONobject = 'objects.features'
         # build the choropleth
-        cp = folium.Choropleth (geo_data=combined,
+        cp = folium.Choropleth (geo_data=geoData,
+                                topojson=topoJSONobject,
                                 data=combined,
                                 #data=df,
                                 columns=[self.get_merge_UID(), coloredAttribute],
@@ -212,7 +266,7 @@ class CovidFoliumMap(ABC):
                                 line_opacity=0.4,
                                 nan_fill_color='#f5f5f3',
                                 legend_name=coloredAttributeAlias,
-                                bins=[float(x) for x in mapOptions.bins],
+                                bins=[float(x) for x in bins],
                                 highlight=True,
                                 smooth_factor = 0.1)
         # give it a name
@@ -233,6 +287,217 @@ class CovidFoliumMap(ABC):
         # return the map
         return map
 
+    def __get_matching_topology(self, joined, topology):
+        """ Returns the topology to be embedded as TopoJSON or None to embed GeoJSON. Its features have to match the 
+        rows of the joined df, otherwise the map falls back to GeoJSON
+
+        Args:
+            joined (GeoDataFrame): The joined df as returned by get_joined_df
+            topology (Topology): The topology as returned by get_joined_df
+
+        Returns:
+            Topology: The topology or None
+        """
+        mapOptions = self.get_default_map_options()
+        if (not mapOptions.topoJSON) or (topology is None):
+            return None
+        if topology.get_feature_count() != len(joined):
+            print('The topology of ' + str(mapOptions.mapAlias) + ' has ' + str(topology.get_feature_count()) + 
+                  ' features but the map has ' + str(len(joined)) + ' rows, falling back to GeoJSON')
+            return None
+        return topology
+
+    def __simplify_geo_df(self, dfGeo, mapOptions):
+        """ Returns the geo df with the geometry simplified and quantized as given by the map options and the topology
+        of the simplified geometry, or the geo df and None if the geometry is kept
+
+        Args:
+            dfGeo (GeoDataFrame): The geo df
+            mapOptions (mapOptions): The options of the map
+
+        Returns:
+            tuple: The geo df and the topology or None
+        """
+        if (mapOptions.simplifyTolerance > 0) or (mapOptions.coordinatePrecision is not None) or mapOptions.topoJSON:
+            import geopandas as gpd
+            topology = get_simplified_topology(dfGeo.geometry, 
+                                               mapOptions.simplifyTolerance, 
+                                               mapOptions.coordinatePrecision, 
+                                               self.get_data_directory())
+            dfGeo = dfGeo.set_geometry(gpd.GeoSeries(topology.to_geometries(), index=dfGeo.index, crs=dfGeo.crs))
+            return dfGeo, topology
+        return dfGeo, None
+
+    def create_time_slider_map(self, 
+                               basemap, 
+                               coloredAttribute = 'Incidence7DayPer100Kpopulation', 
+                               coloredAttributeAlias = '7-day incidence per 100.000 population', 
+                               numDays = 28, 
+                               dfTimeSeries = None):
+        """ Returns a folium map showing an attribute over the last days with a slider to select the date. The 
+        geometry is embedded once and the values of all dates are embedded as one matrix, instead of one map per date
+
+        Args:
+            basemap (str): The name of the basemap to be used. Can be one of the nice_basemaps or something different
+            coloredAttribute (str, optional): The attribute to be colored. Defaults to 'Incidence7DayPer100Kpopulation'.
+            coloredAttributeAlias (str, optional): The alias of the attribute. Defaults to '7-day incidence per 100.000 
+                                                   population'.
+            numDays (int, optional): The number of days up to the date of the map. Defaults to 28.
+            dfTimeSeries (DataFrame, optional): The values indexed by the date with one column per merge UID. Defaults
+                                                to None to get them by get_time_series_df.
+
+        Returns:
+            folium.Map: The map or None if there is no geometry, no data or no time series
+        """
+        mapOptions = self.get_default_map_options()
+        joined, topology = self.get_joined_df()
+        if dfTimeSeries is None:
+            dfTimeSeries = self.get_time_series_df(coloredAttribute, numDays)
+        # check if we have everything that we need
+        if (joined is None) or (dfTimeSeries is None) or (len(dfTimeSeries) == 0):
+            return None
+        # the names shown when hovering
+        nameAttribute = 'GeoName' if 'GeoName' in joined.columns else None
+        # the bins of the values of all dates
+        values = dfTimeSeries.to_numpy(dtype='float64')
+        if np.isnan(values).all():
+            return None
+        if mapOptions.bins is None:
+            bins = list(np.nanquantile(values, [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 1.0]))
+        else:
+            # ensure min/max value will fit in the bins
+            bins = list(mapOptions.bins)
+            bins[0] = min(np.nanmin(values), bins[0])
+            bins[-1] = max(np.nanmax(values), bins[-1])
+        import folium
+        from MapAssets import add_time_slider_choropleth
+        # create the map
+        map = folium.Map(attr=mapOptions.mapAttribute, location=mapOptions.mapLocation, tiles=basemap, zoom_start=mapOptions.mapZoom)
+        add_time_slider_choropleth(map, 
+                                   joined, 
+                                   dfTimeSeries, 
+                                   self.get_merge_UID(), 
+                                   coloredAttributeAlias, 
+                                   bins, 
+                                   nameAttribute, 
+                                   self.__get_matching_topology(joined, topology), 
+                                   self.get_data_directory() if mapOptions.splitAssets else None, 
+                                   mapOptions.mapAlias)
+        return map
+
+    def get_joined_df(self):
+        """ Returns the geo df joined with the data df on the merge UID and indexed by it, and the topology of its 
+        geometry. The geometry is simplified and quantized as given by the map options. The joined df is built once
+        and rebuilt only if the options of the geometry change, so several maps of the same object only select other
+        columns of it
+
+        Returns:
+            tuple: The joined GeoDataFrame and the topology or None, (None, None) if the geo or the data df is missing
+        """
+        dfGeo = self.get_geo_df()
+        dfData = self.get_data_df()
+        if (dfGeo is None) or (dfData is None):
+            return None, None
+        mapOptions = self.get_default_map_options()
+        key = (mapOptions.simplifyTolerance, mapOptions.coordinatePrecision, mapOptions.topoJSON)
+        if (self.__joined is not None) and (self.__joinedKey == key):
+            return self.__joined, self.__topology
+        mergeUID = self.get_merge_UID()
+        # simplify and quantize the geometry embedded into the maps
+        dfGeo, topology = self.__simplify_geo_df(dfGeo[[mergeUID, dfGeo.geometry.name]], mapOptions)
+        # one row of data per feature, the data attributes replace the attributes of the geo df
+        dfData = dfData.drop_duplicates(subset=mergeUID, keep='last')
+        dfData = dfData.drop(columns=[column for column in dfData.columns if column in dfGeo.columns and column != mergeUID])
+        # merge to the geo df to keep the rows of the geo df and the result a geoPandas df
+        joined = dfGeo.merge(dfData, on=mergeUID, how='left', validate='many_to_one')
+        joined.index = pd.Index(joined[mergeUID].values)
+        self.__joined = joined
+        self.__joinedKey = key
+        self.__topology = topology
+        self.__quantiles = None
+        return joined, topology
+
+    def __get_default_bins(self, attribute):
+        """ Returns the default bins of an attribute of the joined df. The quantiles of all numeric attributes are
+        computed in one vectorized pass on the first call and kept until the joined df is rebuilt
+
+        Args:
+            attribute (str): The attribute
+
+        Returns:
+            list: The edges of the bins
+        """
+        if self.__quantiles is None:
+            numeric = self.__joined.drop(columns=self.__joined.geometry.name).select_dtypes('number')
+            self.__quantiles = numeric.quantile([0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 1.0])
+        return list(self.__quantiles[attribute])
+
+    def get_time_series_df(self, attribute, numDays):
+        """ Returns the values of an attribute over the last days up to the date of the map, indexed by the date 
+        with one column per merge UID. Sub-classes having a time series override it
+
+        Args:
+            attribute (str): The attribute
+            numDays (int): The number of days
+
+        Returns:
+            DataFrame: The values or None if the map has no time series
+        """
+        return None
+
+    @staticmethod
+    def save_map(map, target, compress = False, traceMemory = False):
+        """ Writes a map to a file like map.save, but the embedded geometry and data are serialized straight into the 
+        file instead of rendering the whole HTML into one string first
+
+        Args:
+            map (folium.Map): The map as returned by create_default_map or create_time_slider_map
+            target (str or file): The filename or a binary file object
+            compress (bool, optional): True to write a gzip file. Defaults to False.
+            traceMemory (bool, optional): True to trace the peak memory allocated while writing. Defaults to False.
+
+        Returns:
+            dict: The number of bytes written (size) and the peak memory in bytes or None (peakMemory)
+        """
+        from MapWriter import write_map
+        return write_map(map, target, compress, traceMemory)
+
+    @staticmethod
+    def __get_frame_hash(df):
+        """ Returns the SHA-256 hash of the columns, the index and the values of a df, the geometry is hashed as WKB
+
+        Args:
+            df (DataFrame): The pandas or geoPandas df
+
+        Returns:
+            str: The hash as a hex string or None if there is no df
+        """
+        import hashlib
+        if df is None:
+            return None
+        sha = hashlib.sha256()
+        sha.update(json.dumps([str(column) for column in df.columns]).encode('utf-8'))
+        geometryName = df.geometry.name if hasattr(df, 'geometry') and 'geometry' in df.columns else None
+        values = df.drop(columns=[geometryName]) if geometryName is not None else df
+        # lists and dictionaries in cells can't be hashed by pandas
+        values = values.apply(lambda column: column.map(str) if column.dtype == object else column)
+        sha.update(pd.util.hash_pandas_object(values, index=True).values.tobytes())
+        if geometryName is not None:
+            import shapely
+            for wkb in shapely.to_wkb(np.asarray(df.geometry.values, dtype=object)):
+                sha.update(wkb if wkb is not None else b'')
+        return sha.hexdigest()
+
+    def get_input_fingerprint(self):
+        """ Returns the hashes of the data df and of the geo df rendered into the maps. The map generator skips a map
+        whose inputs didn't change since the last run
+
+        Returns:
+            dict: The hashes of the data (data) and of the geometry (geometry)
+        """
+        return {'data': CovidFoliumMap.__get_frame_hash(self.get_data_df()),
+                'geometry': CovidFoliumMap.__get_frame_hash(self.get_geo_df())}
+
     def get_data_directory(self):
         """Returns the data directory as a string
         
@@ -3,14 +3,400 @@ import pandas as pd
 import numpy as np
 import math
 import os
+import sys
 import time
 import datetime
 from datetime import datetime, date, timedelta
+from CovidFoliumMap import ensure_path_exists
 from CovidFoliumMapWHO import CovidFoliumMapWHO, Continents
+from DatasetProvider import DatasetProvider
 from CovidFoliumMapRKI import CovidFoliumMapDEstates, CovidFoliumMapDEcounties
 from CovidFoliumMapRKIageAndGender import CovidFoliumMapDEageAndGenderCounties, CovidFoliumMapDEageAndGenderStates
 
-def main():
+# a job generating one map: the index of the map object and the colored attribute and its alias (None for the default 
+# attribute, lists for a map with a layer per attribute)
+MapJob = namedtuple('MapJob', 'index coloredAttribute coloredAttributeAlias')
+# the modules rendering the maps besides the modules of the map classes, a change of their code changes the maps
+RENDERING_MODULES = ['CovidFoliumMap', 'MapAssets', 'MapWriter', 'Topology', 'GeometryCache']
+# the libraries rendering the maps
+RENDERING_LIBRARIES = ['folium', 'branca', 'geopandas', 'shapely']
+# the map objects of a run, kept as a global so that the forked workers of the process pool inherit them instead of
+# receiving a pickled copy
+_mapObjects = []
+
+def get_map_jobs(mapObjects):
+    """ Returns the jobs to generate the maps of the given map objects. Every map is an independent job, the world map
+    has additional layers for the case fatality rate and the cases per million population.
+
+    Args:
+        mapObjects (list): The list of map objects
+
+    Returns:
+        list: A list of MapJob tuples
+    """
+    jobs = []
+    for index, mapObject in enumerate(mapObjects):
+        mapAlias = mapObject.get_default_map_options().mapAlias
+        if mapAlias.find('age') > 0:
+            # the maps containing age based information
+            jobs.append(MapJob(index, 'Percent cases by age: 0-14', 'Percent cases age 0-14'))
+        elif mapAlias.find('World') > 0:
+            # the world map has two more layers sharing the geometry
+            jobs.append(MapJob(index, 
+                               ['Incidence7DayPer100Kpopulation', 'PercentDeaths', 'CasesPerMillionPopulation'], 
+                               ['7-day incidence per 100.000 population', 'Case Fatality Rate (CFR)', 'Cases per million population']))
+        else:
+            # standard incidence based maps 
+            jobs.append(MapJob(index, None, None))
+    return jobs
+
+def get_map_filename(mapObject, job):
+    """ Returns the filename of the map of a job
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        job (MapJob): The job
+
+    Returns:
+        str: The filename of the map
+    """
+    return mapObject.get_data_directory() + '/' + mapObject.get_default_map_options().mapAlias + '.html'
+
+def run_map_job(mapObject, job):
+    """ Generates and saves the map of a job
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        job (MapJob): The job
+
+    Raises:
+        ValueError: In case the map object is not initialized or the map can't be created
+
+    Returns:
+        str: The filename of the map
+    """
+    # check if it is initialized
+    if mapObject.get_geo_df() is None:
+        raise ValueError('The map object is not initialized')
+    # select a basemap
+    basemap = mapObject.get_nice_basemaps()[0]
+    # build the map
+    if job.coloredAttribute is None:
+        map = mapObject.create_default_map(basemap)
+    else:
+        map = mapObject.create_default_map(basemap, 
+                                           coloredAttribute = job.coloredAttribute, 
+                                           coloredAttributeAlias = job.coloredAttributeAlias)
+    if map is None:
+        raise ValueError('The map can not be created')
+    # the filename
+    filename = get_map_filename(mapObject, job)
+    # save the map, the HTML is streamed into the file
+    mapObject.save_map(map, filename)
+    return filename
+
+def get_fingerprint_filename(mapObject, job):
+    """ Returns the filename of the fingerprint of the inputs of the map of a job, it is stored next to the map
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        job (MapJob): The job
+
+    Returns:
+        str: The filename of the fingerprint
+    """
+    return os.path.splitext(get_map_filename(mapObject, job))[0] + '.fingerprint'
+
+def get_code_version(mapObject):
+    """ Returns the hash of the code rendering the map of a map object, that is the source files of its class and 
+    of the rendering modules and the versions of the rendering libraries
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+
+    Returns:
+        str: The hash as a hex string
+    """
+    import hashlib
+    import inspect
+    from importlib import metadata
+    from Downloader import get_content_hash
+    directory = os.path.dirname(os.path.abspath(__file__))
+    filenames = [os.path.join(directory, name + '.py') for name in RENDERING_MODULES]
+    for cls in type(mapObject).__mro__:
+        try:
+            filenames.append(inspect.getsourcefile(cls))
+        except TypeError:
+            # a built-in class such as object
+            pass
+    sha = hashlib.sha256()
+    for filename in sorted(set(filename for filename in filenames if filename is not None and os.path.exists(filename))):
+        sha.update(get_content_hash(filename).encode('utf-8'))
+    for library in RENDERING_LIBRARIES:
+        try:
+            sha.update((library + '=' + metadata.version(library)).encode('utf-8'))
+        except metadata.PackageNotFoundError:
+            sha.update((library + '=None').encode('utf-8'))
+    return sha.hexdigest()
+
+def get_map_fingerprint(mapObject, job):
+    """ Returns the fingerprint of the inputs of the map of a job: the hashes of the data and the geometry, the map
+    options, the attributes of the job and the version of the code. Two runs creating the same fingerprint create the
+    same map. The date of the map is not part of the options, the RKI maps are dated by the day of the run, a map of
+    unchanged data is kept with the date of the run that generated it.
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        job (MapJob): The job
+
+    Returns:
+        dict: The parts of the fingerprint and their hash (fingerprint)
+    """
+    import hashlib
+    import json
+    import dataclasses
+    mapOptions = mapObject.get_default_map_options()
+    options = dataclasses.asdict(mapOptions) if dataclasses.is_dataclass(mapOptions) else dict(vars(mapOptions))
+    # the date changes with every day, the data of the map tells whether it changed
+    options.pop('mapDate', None)
+    fingerprint = dict(mapObject.get_input_fingerprint())
+    fingerprint['options'] = hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    fingerprint['job'] = hashlib.sha256(json.dumps([job.coloredAttribute, job.coloredAttributeAlias]).encode('utf-8')).hexdigest()
+    fingerprint['code'] = get_code_version(mapObject)
+    fingerprint['fingerprint'] = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
+    return fingerprint
+
+def get_map_assets(mapObject, filename):
+    """ Returns the assets referenced by a map whose geometry and data are written as assets next to the HTML file
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        filename (str): The filename of the map
+
+    Returns:
+        list: The URLs of the assets relative to the data directory, empty if the map embeds its geometry and data
+    """
+    if getattr(mapObject.get_default_map_options(), 'splitAssets', False) != True:
+        return []
+    from MapAssets import find_asset_urls
+    with open(filename, encoding='utf-8') as f:
+        return find_asset_urls(f.read())
+
+def is_map_up_to_date(mapObject, job, fingerprint):
+    """ Returns True if the map of a job exists and was generated from inputs of the same fingerprint. The assets 
+    referenced by the map are marked as used, so that they aren't removed as unused by other maps, a map missing an 
+    asset is not up to date
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        job (MapJob): The job
+        fingerprint (dict): The fingerprint of the inputs as returned by get_map_fingerprint
+
+    Returns:
+        bool: True if the map doesn't need to be generated again
+    """
+    import json
+    if not os.path.exists(get_map_filename(mapObject, job)):
+        return False
+    try:
+        with open(get_fingerprint_filename(mapObject, job)) as f:
+            previous = json.load(f)
+        if previous.get('fingerprint') != fingerprint['fingerprint']:
+            return False
+        # raises an OSError if the asset was removed
+        for url in previous.get('assets', []):
+            os.utime(os.path.join(mapObject.get_data_directory(), url))
+        return True
+    except (OSError, ValueError, AttributeError, TypeError):
+        return False
+
+def write_map_fingerprint(mapObject, job, fingerprint):
+    """ Writes the fingerprint of the inputs of a generated map and the assets it references next to the map
+
+    Args:
+        mapObject (CovidFoliumMap): The map object
+        job (MapJob): The job
+        fingerprint (dict): The fingerprint as returned by get_map_fingerprint
+    """
+    import json
+    filename = get_fingerprint_filename(mapObject, job)
+    fingerprint = dict(fingerprint, assets=get_map_assets(mapObject, get_map_filename(mapObject, job)))
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(fingerprint, f, indent=2, sort_keys=True)
+    os.replace(filename + '.tmp', filename)
+
+def get_peak_rss():
+    """ Returns the peak resident set size of this process
+
+    Returns:
+        int: The peak in bytes or None if it is not available on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def run_map_job_with_report(job, mapObject = None, traceMemory = False, force = False):
+    """ Runs a job and measures its time and memory. Errors are reported instead of being raised, so that a failing 
+    job doesn't affect other jobs. The job is skipped if its map exists and the fingerprint of its inputs didn't 
+    change.
+
+    Args:
+        job (MapJob): The job
+        mapObject (CovidFoliumMap, optional): The map object, defaults to the one of the job in _mapObjects
+        traceMemory (bool, optional): True to measure the peak of the memory allocated by the job with tracemalloc,
+                                      that slows the job down by a factor of about four. Defaults to False to report
+                                      the peak resident set size of the process running the job.
+        force (bool, optional): True to generate the map even if its inputs didn't change. Defaults to False.
+
+    Returns:
+        dict: The report holding the name, filename, seconds, peakMemory (bytes), size and previousSize of the HTML 
+              file (bytes, None if it didn't exist), skipped (True if the map was up to date) and error (None if 
+              successful)
+    """
+    import tracemalloc
+    if mapObject is None:
+        mapObject = _mapObjects[job.index]
+    report = {'name': mapObject.get_default_map_options().mapAlias,
+              'filename': None,
+              'seconds': 0.0,
+              'peakMemory': None,
+              'size': None,
+              'previousSize': None,
+              'skipped': False,
+              'error': None}
+    # the size of the map of the last run
+    try:
+        report['previousSize'] = os.path.getsize(get_map_filename(mapObject, job))
+    except OSError:
+        pass
+    if traceMemory == True:
+        # the process pool might run several jobs in a worker one after another
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        fingerprint = get_map_fingerprint(mapObject, job)
+        if force == False and is_map_up_to_date(mapObject, job, fingerprint):
+            report['skipped'] = True
+            report['filename'] = get_map_filename(mapObject, job)
+        else:
+            # an interrupted job must not leave the fingerprint of the last map behind
+            try:
+                os.remove(get_fingerprint_filename(mapObject, job))
+            except OSError:
+                pass
+            report['filename'] = run_map_job(mapObject, job)
+            write_map_fingerprint(mapObject, job, fingerprint)
+        report['size'] = os.path.getsize(report['filename'])
+    except Exception as e:
+        report['error'] = type(e).__name__ + ': ' + str(e)
+    finally:
+        report['seconds'] = time.perf_counter() - start
+        if traceMemory == True:
+            report['peakMemory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            report['peakMemory'] = get_peak_rss()
+    return report
+
+def run_map_jobs(mapObjects, workers = None, traceMemory = False, force = False):
+    """ Generates the maps of the map objects. With more than one worker the jobs run on a process pool. The workers
+    are forked, so they share the loaded data of the map objects. On platforms without fork the jobs run one after 
+    another.
+
+    Args:
+        mapObjects (list): The list of map objects, their data is loaded already
+        workers (int, optional): The number of worker processes, 1 runs the jobs in this process. Defaults to None to
+                                 use one worker per CPU.
+        traceMemory (bool, optional): True to trace the memory allocated by each job, see run_map_job_with_report. 
+                                      Defaults to False.
+        force (bool, optional): True to generate all maps, False to skip the maps whose inputs didn't change. 
+                                Defaults to False.
+
+    Returns:
+        list: The reports of the jobs in the order of the jobs
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    global _mapObjects
+    jobs = get_map_jobs(mapObjects)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [run_map_job_with_report(job, mapObjects[job.index], traceMemory, force) for job in jobs]
+    _mapObjects = mapObjects
+    reports = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = [executor.submit(run_map_job_with_report, job, None, traceMemory, force) for job in jobs]
+            for job, future in zip(jobs, futures):
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    # the worker died
+                    reports.append({'name': mapObjects[job.index].get_default_map_options().mapAlias,
+                                    'filename': None,
+                                    'seconds': 0.0,
+                                    'peakMemory': None,
+                                    'size': None,
+                                    'previousSize': None,
+                                    'skipped': False,
+                                    'error': type(e).__name__ + ': ' + str(e)})
+    finally:
+        _mapObjects = []
+    return reports
+
+def print_map_job_report(reports):
+    """ Prints the time, the memory and the size of the HTML file before and after each job and the errors of the 
+    failed jobs
+
+    Args:
+        reports (list): The reports of run_map_jobs
+    """
+    def megabytes(value):
+        return '' if value is None else '{:.2f}'.format(value / 1e6)
+    print('{:<40} {:>10} {:>12} {:>12} {:>12}  {}'.format('map', 'seconds', 'peak MB', 'HTML MB', 'before MB', 'result'))
+    for report in reports:
+        if report['error'] is not None:
+            result = 'FAILED ' + report['error']
+        else:
+            result = 'unchanged' if report.get('skipped') == True else 'ok'
+        print('{:<40} {:>10.2f} {:>12} {:>12} {:>12}  {}'.format(report['name'], 
+                                                                 report['seconds'], 
+                                                                 megabytes(report['peakMemory']), 
+                                                                 megabytes(report['size']), 
+                                                                 megabytes(report['previousSize']), 
+                                                                 result))
+    failed = [report for report in reports if report['error'] is not None]
+    skipped = [report for report in reports if report.get('skipped') == True]
+    print(str(len(reports) - len(failed) - len(skipped)) + ' maps generated, ' + str(len(skipped)) + ' unchanged, ' + 
+          str(len(failed)) + ' failed')
+    sizes = [report for report in reports if report['size'] is not None and report['previousSize'] is not None]
+    if len(sizes) > 0:
+        print('HTML size ' + megabytes(sum(report['previousSize'] for report in sizes)) + ' MB before, ' + 
+              megabytes(sum(report['size'] for report in sizes)) + ' MB now')
+
+def main(workers = None, traceMemory = False, fullResolution = False, topoJSON = False, splitAssets = False, force = False):
+    """ Generates all maps. The data of all maps is loaded first, afterwards the maps are generated in parallel.
+
+    Args:
+        workers (int, optional): The number of worker processes to generate the maps, 1 generates them one after 
+                                 another in this process. Defaults to None to use one worker per CPU.
+        traceMemory (bool, optional): True to trace the memory allocated by each map, that is much slower. Defaults 
+                                      to False to report the peak memory of the processes.
+        fullResolution (bool, optional): True to embed the borders without simplifying them, e.g. to compare the 
+                                         sizes of the maps. Defaults to False.
+        topoJSON (bool, optional): True to embed the borders as TopoJSON. Defaults to False.
+        splitAssets (bool, optional): True to write the borders and the data as assets next to the maps instead of
+                                      embedding them, the maps have to be served by a web server. Defaults to False.
+        force (bool, optional): True to generate all maps, even those whose data, geometry, options and code didn't
+                                change since the last run. Defaults to False.
+    """
     # the directory for temp. data as well as for the output
     # check if this code is running in jupyter, either local or in colab
     try:
@@ -50,18 +436,21 @@ def main():
     
     # the WHO maps
     if generate.WHO == True:
+        # the WHO, OWID and geo data is loaded once and shared by all WHO maps
+        provider = DatasetProvider(ensure_path_exists(outputDir))
         # world (sometimes the data is delayed due to holidays, adjust numDaysBefore in that case to view previous complete data)
-        mapObjects.append(CovidFoliumMapWHO(Continents.World, outputDir, numDaysBefore = 0))
+        mapObjects.append(CovidFoliumMapWHO(Continents.World, outputDir, numDaysBefore = 0, provider = provider))
         # africa
-        mapObjects.append(CovidFoliumMapWHO(Continents.Africa, outputDir))
+        mapObjects.append(CovidFoliumMapWHO(Continents.Africa, outputDir, provider = provider))
         # oceania
-        mapObjects.append(CovidFoliumMapWHO(Continents.Oceania, outputDir))
+        mapObjects.append(CovidFoliumMapWHO(Continents.Oceania, outputDir, provider = provider))
         # america
-        mapObjects.append(CovidFoliumMapWHO(Continents.America, outputDir))
+        mapObjects.append(CovidFoliumMapWHO(Continents.America, outputDir, provider = provider))
         # asia
-        mapObjects.append(CovidFoliumMapWHO(Continents.Asia, outputDir))
+        mapObjects.append(CovidFoliumMapWHO(Continents.Asia, outputDir, provider = provider))
         # europe
-        mapObjects.append(CovidFoliumMapWHO(Continents.Europe, outputDir))
+        mapObjects.append(CovidFoliumMapWHO(Continents.Europe, outputDir, provider = provider))
+        print('WHO datasets: ' + str(provider.get_stats()))
     
     # the RKI maps via the REST api
     if generate.RKIrest == True:
@@ -77,48 +466,17 @@ def main():
         # de counties per age
         mapObjects.append(CovidFoliumMapDEageAndGenderCounties(outputDir))
     
-    # process the maps
+    # the resolution and the format of the borders
     for mapObject in mapObjects:
-        # check if it is initialized
-        if mapObject.get_geo_df() is None:
-            return
-        # get the data directory
-        dir = mapObject.get_data_directory()
-        # select a basemap
-        basemap = mapObject.get_nice_basemaps()[0]
-        # build the default map
-        if mapObject.get_default_map_options().mapAlias.find('age') > 0:
-            # the maps containing age based information
-            map = mapObject.create_default_map(basemap, 
-                                               coloredAttribute = 'Percent cases by age: 0-14', 
-                                               coloredAttributeAlias = 'Percent cases age 0-14')
-        else:
-            # standard incidence based maps 
-            map = mapObject.create_default_map(basemap)
-        # the filename
-        filename = mapObject.get_default_map_options().mapAlias
-        # save the map
-        if map is not None:
-            map.save(dir + '/' + filename + '.html')  
-        if mapObject.get_default_map_options().mapAlias.find('World') > 0:
-            # the filename
-            filename = mapObject.get_default_map_options().mapAlias
-
-            # reset the bins as we want to generate them again automatically
-            mapObject.get_default_map_options().bins = None
-            # build another map of the world
-            map = mapObject.create_default_map(basemap, 'PercentDeaths', 'Case Fatality Rate (CFR)')
-            # save that as well
-            if map is not None:
-                map.save(dir + '/' + filename + 'CFR.html')  
-
-            # reset the bins as we want to generate them again automatically
-            mapObject.get_default_map_options().bins = None
-            # build another map of the world 
-            map = mapObject.create_default_map(basemap, 'CasesPerMillionPopulation', 'Cases per million population')
-            # save that as well
-            if map is not None:
-                map.save(dir + '/' + filename + 'CasesPerMillionPopulation.html')   
+        mapOptions = mapObject.get_default_map_options()
+        if fullResolution == True:
+            mapOptions.simplifyTolerance = 0.0
+            mapOptions.coordinatePrecision = None
+        mapOptions.topoJSON = topoJSON
+        mapOptions.splitAssets = splitAssets
+    # process the maps
+    reports = run_map_jobs(mapObjects, workers, traceMemory, force)
+    print_map_job_report(reports)
     end = time.time()
     print(str((end - start)) + 's')
     # print finished time
@@ -128,4 +486,18 @@ def main():
     return
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description='Generates the Covid-19 Folium maps')
+    parser.add_argument('--workers', type=int, default=None, 
+                        help='the number of worker processes to generate the maps, 1 generates them one after another')
+    parser.add_argument('--trace-memory', action='store_true', 
+                        help='trace the memory allocated by each map instead of reporting the peak memory of the processes')
+    parser.add_argument('--full-resolution', action='store_true', 
+                        help='embed the borders without simplifying them, the report shows the sizes before and after')
+    parser.add_argument('--topojson', action='store_true', help='embed the borders as TopoJSON')
+    parser.add_argument('--split-assets', action='store_true', 
+                        help='write the borders and the data as assets next to the maps, they are joined in the browser')
+    parser.add_argument('--force', action='store_true', 
+                        help='generate all maps, even if their data, geometry, options and code did not change')
+    args = parser.parse_args()
+    main(args.workers, args.trace_memory, args.full_resolution, args.topojson, args.split_assets, args.force)
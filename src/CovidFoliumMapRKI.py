@@ -2,15 +2,14 @@ import pandas as pd
 import numpy as np
 import math
 import os
-import geopandas as gpd
-import folium
-import requests
 import json
 import datetime
 from datetime import date, timedelta
 from abc import ABC, abstractmethod
 from pathlib import Path
 from CovidFoliumMap import CovidFoliumMap, ensure_path_exists, download_JSON_file
+from GeometryCache import read_geo_file
+from RKIFetcher import fetch_districts, fetch_states, report_failures
 
 """ This classes generate different folium maps based on the data of the RKI using access to the 
     RKI Covid-19 API.
@@ -53,6 +52,8 @@ class CovidFoliumMapDEcounties(CovidFoliumMap):
                                                             mapAlias = 'MapDEcounty',
                                                             mapLocation = [51.3, 10.5],
                                                             mapZoom = 6,
+                                                            simplifyTolerance = 0.001,
+                                                            coordinatePrecision = 4,
                                                             bins = [5, 25, 50, 100, 200, 400, 800, 1200, 1600, 2600],
                                                             mapAttribute = 'Robert Koch-Institut (RKI), dl-de/by-2-0, CMBT 2022',
                                                             tooltipAttributes = ['GeoName', 
@@ -105,8 +106,8 @@ class CovidFoliumMapDEcounties(CovidFoliumMap):
                     print(e)    
         # now the file should exist
         if os.path.exists(targetFilename):
-            # load the file
-            geoDf = gpd.read_file(targetFilename)
+            # load the file, the parsed file is cached
+            geoDf = read_geo_file(targetFilename)
             #print(geoDf.head())
         # finally return the geo df
         return geoDf
@@ -132,20 +133,12 @@ class CovidFoliumMapDEcounties(CovidFoliumMap):
             df = pd.read_csv(targetFilename)
         else:
             print('Downloading data (yy-mm-dd--RKIcounty-db.csv), that might take some time...')
-            # build a result df
-            dfs = []
-            for id in geoDf['RS']:
-                try:
-                    # get the data for the county
-                    df = self.__get_county_data_from_web(id)
-                    # add it to the list
-                    dfs.append(df)
-                except:
-                    msg = 'Error getting the data for ' + str(id) + '!'
-                    print(msg) 
+            # get the data of all counties, the counties that can't be fetched will be reported
+            records, failures = fetch_districts(list(geoDf['RS']))
+            report_failures(failures)
             try:
-                # finally concatenate all dfs together
-                df = pd.concat(dfs)  
+                # build the df of all counties
+                df = self.__get_county_data_frame(records)
                 # save it to file
                 df.to_csv(targetFilename)
                 print('Download finished.')
@@ -160,11 +153,11 @@ class CovidFoliumMapDEcounties(CovidFoliumMap):
         # ...and return df
         return df
     
-    def __get_county_data_from_web(self, county_ID):
-        """ Downloads the covid-19 data for the given county-ID
+    def __get_county_data_frame(self, records):
+        """ Builds the dataframe of the covid-19 data of the counties
 
         Args:
-            county_ID string: the county-ID for which we want the data
+            records list: the data of the counties as returned by the RKI API
 
         Raises:
             ValueError: In case the data is empty
@@ -172,21 +165,10 @@ class CovidFoliumMapDEcounties(CovidFoliumMap):
         Returns:
             dataframe: A dataframe of the county data
         """
-        # the endpoint of the request
-        endpoint = 'https://api.corona-zahlen.org/districts/' + county_ID
-        # contact the server
-        res = requests.get(endpoint)
-        # check if there was a response
-        if res.ok:
-            # get the json
-            res = res.json()
-        else:
-            # raise an exception
-            res.raise_for_status()
         # check if the data is not empty
-        if not bool(res['data']):
-            raise ValueError("Empty response! County ID might be invalid.")
-        df = pd.json_normalize(res['data'])
+        if len(records) == 0:
+            raise ValueError("Empty response! County IDs might be invalid.")
+        df = pd.json_normalize(records)
         df.columns = ['RS', 
                     'GeoName', 
                     'GeoID', 
@@ -269,6 +251,8 @@ class CovidFoliumMapDEstates(CovidFoliumMap):
                                                             mapAlias = 'MapDEstate',
                                                             mapLocation = [51.3, 10.5],
                                                             mapZoom = 6,
+                                                            simplifyTolerance = 0.001,
+                                                            coordinatePrecision = 4,
                                                             bins = [5, 25, 50, 100, 200, 400, 800, 1200, 1600, 2600],
                                                             mapAttribute = 'Robert Koch-Institut (RKI), dl-de/by-2-0, CMBT 2022',
                                                             tooltipAttributes = ['GeoName', 
@@ -339,8 +323,8 @@ class CovidFoliumMapDEstates(CovidFoliumMap):
                     print(e)    
         # now the file should exist
         if os.path.exists(targetFilename):
-            # load the file
-            geoDf = gpd.read_file(targetFilename)
+            # load the file, the parsed file is cached
+            geoDf = read_geo_file(targetFilename)
         # finally return the geo df
         return geoDf
 
@@ -365,20 +349,12 @@ class CovidFoliumMapDEstates(CovidFoliumMap):
             df = pd.read_csv(targetFilename)
         else:
             print('Downloading data (yy-mm-dd-RKIstates-db.csv), that might take some time...')
-            # build a result df
-            dfs = []
-            for id in self.__statelist:
-                try:
-                    # get the data for the county
-                    df = self.__get_state_data_from_web(id[1])
-                    # add it to the list
-                    dfs.append(df)
-                except:
-                    msg = 'Error getting the data for ' + str(id) + '!'
-                    print(msg) 
-            # finally concatenate all dfs together
+            # get the data of all states, the states that can't be fetched will be reported
+            records, failures = fetch_states([state[1] for state in self.__statelist])
+            report_failures(failures)
             try:
-                df = pd.concat(dfs)  
+                # build the df of all states
+                df = self.__get_state_data_frame(records)
                 # save it to file
                 df.to_csv(targetFilename)
                 print('Download finished.')
@@ -394,33 +370,22 @@ class CovidFoliumMapDEstates(CovidFoliumMap):
         # ...and return df
         return df
     
-    def __get_state_data_from_web(self, state_ID):
-        """ Downloads the covid-19 data for the given county-ID
+    def __get_state_data_frame(self, records):
+        """ Builds the dataframe of the covid-19 data of the states
 
         Args:
-            county_ID string: the county-ID for which we want the data
+            records list: the data of the states as returned by the RKI API
 
         Raises:
             ValueError: In case the data is empty
 
         Returns:
-            dataframe: A dataframe of the county data
+            dataframe: A dataframe of the state data
         """
-        # the endpoint of the request
-        endpoint = 'https://api.corona-zahlen.org/states/' + state_ID
-        # contact the server
-        res = requests.get(endpoint)
-        # check if there was a response
-        if res.ok:
-            # get the json
-            res = res.json()
-        else:
-            # raise an exception
-            res.raise_for_status()
         # check if the data is not empty
-        if not bool(res['data']):
-            raise ValueError("Empty response! State ID might be invalid.")
-        df = pd.json_normalize(res['data'])
+        if len(records) == 0:
+            raise ValueError("Empty response! State IDs might be invalid.")
+        df = pd.json_normalize(records)
         # adjust column names
         df.columns = ['AGS_TXT', 
                     'GeoName', 
@@ -2,18 +2,16 @@ import pandas as pd
 import numpy as np
 import math
 import os
-import geopandas as gpd
-import folium
-import requests
 import json
 import datetime
 from datetime import date, timedelta
 from collections import namedtuple
-#!pip install recordclass
-from recordclass import recordclass
 from abc import ABC, abstractmethod
 from pathlib import Path
 from CovidFoliumMap import CovidFoliumMap, ensure_path_exists, download_JSON_file
+from Downloader import download_file
+from GeometryCache import read_geo_file
+from RKICube import RKICube
 
 """ This classes generate different folium maps based on the data of the RKI using access to the 
     RKI Covid-19 master file.
@@ -39,28 +37,39 @@ from CovidFoliumMap import CovidFoliumMap, ensure_path_exists, download_JSON_fil
 """
 
 class DownloadAndPreprocessRKIdata():
-    def __init__(self, dataDirectory = '../data'):
+    # the columns of the RKI master file that are needed and their types
+    COLUMN_TYPES = {'IdBundesland': 'int8',
+                    'IdLandkreis': 'int32',
+                    'Altersgruppe': 'category',
+                    'Geschlecht': 'category',
+                    'AnzahlFall': 'int32',
+                    'NeuerFall': 'int8'}
+
+    def __init__(self, dataDirectory = '../data', chunkSize = 1000000):
         """ Constructor
 
         Args:
             dataDirectory (str, optional): The data directory to be used for cached data. Defaults to '../data'.
+            chunkSize (int, optional): The number of rows of the RKI master file that are processed at once. Defaults 
+            to 1000000.
         """
         # ensure that the data directory exists, meaning to create it if it is not available
         self.__dataDirectory = ensure_path_exists(dataDirectory)
-        # init the result
-        self.__df = None
-        # a mutable, named tuple to hold columnnames, groupID, alias and a datframe
-        Group = recordclass('group', 'column name alias df')
+        self.__chunkSize = chunkSize
+        # init the result, the sums of the cases by (groupColumn, column) as a series indexed by the ID and the group name
+        self.__sums = None
+        # a named tuple to hold columnname, groupID and alias
+        Group = namedtuple('group', 'column name alias')
         self.__groups = []
         # build the list
-        self.__groups.append(Group('Altersgruppe', 'A00-A04', 'age: 0-4', None))
-        self.__groups.append(Group('Altersgruppe', 'A05-A14', 'age: 5-14', None))
-        self.__groups.append(Group('Altersgruppe', 'A15-A34', 'age: 15-34', None))
-        self.__groups.append(Group('Altersgruppe', 'A35-A59', 'age: 35-59', None))
-        self.__groups.append(Group('Altersgruppe', 'A60-A79', 'age: 60-79', None))
-        self.__groups.append(Group('Altersgruppe', 'A80+', 'age: 80+', None))
-        self.__groups.append(Group('Geschlecht', 'W', 'gender: female', None))
-        self.__groups.append(Group('Geschlecht', 'M', 'gender: male', None))
+        self.__groups.append(Group('Altersgruppe', 'A00-A04', 'age: 0-4'))
+        self.__groups.append(Group('Altersgruppe', 'A05-A14', 'age: 5-14'))
+        self.__groups.append(Group('Altersgruppe', 'A15-A34', 'age: 15-34'))
+        self.__groups.append(Group('Altersgruppe', 'A35-A59', 'age: 35-59'))
+        self.__groups.append(Group('Altersgruppe', 'A60-A79', 'age: 60-79'))
+        self.__groups.append(Group('Altersgruppe', 'A80+', 'age: 80+'))
+        self.__groups.append(Group('Geschlecht', 'W', 'gender: female'))
+        self.__groups.append(Group('Geschlecht', 'M', 'gender: male'))
 
     def __download_RKI_master_file(self):
         """ checks if the RKI master file of today exits already and downloads it if not
@@ -69,8 +78,23 @@ class DownloadAndPreprocessRKIdata():
             [bool]: True in case the file is available for pre-processing
         """
         # check if we did all that stuff before
-        if (self.__df is not None) and (self.__groups is not None):
+        if self.__sums is not None:
            return True
+        targetFilename = self.__get_RKI_master_file()
+        if targetFilename is None:
+            return False
+        # sum up the cases by age/gender groups
+        print('Summing up by age/gender groups...')
+        self.__sums = self.__sum_up_RKI_master_file(targetFilename)
+        print('Summing up done...')
+        return True
+
+    def __get_RKI_master_file(self):
+        """ checks if the RKI master file of today exits already and downloads it if not
+
+        Returns:
+            [str]: The filename of the RKI master file or None in case it is not available
+        """
         # get the date
         today = date.today()
         # the prefix of the CSV file is Y-m-d
@@ -88,45 +112,106 @@ class DownloadAndPreprocessRKIdata():
             # https://www.arcgis.com/home/item.html?id=dd4580c810204019a7b8eb3e0b329dd6
             # or: https://www.arcgis.com/home/item.html?id=f10774f1c63e40168479a1feb6c7ca74  
             try:
-                # try to download the file 
-                req = requests.get(endpoint)
-                # get the content
-                content = req.content
-                # open the file
-                csv = open(targetFilename, 'wb')
-                # write the file
-                csv.write(content)
-                # close the file
-                csv.close()
+                # try to download the file, it will be streamed to the disk
+                stateFilename = self.__dataDirectory + '/' + 'RKI_COVID19-download.json'
+                targetFilename = download_file(endpoint, targetFilename, stateFilename)
                 print('Download finished...')
             except Exception as e:
                 if hasattr(e, 'message'):
                     print(e.message)
                 else:
                     print(e)
-                return False
+                return None
         # now the file should exist
-        if os.path.exists(targetFilename):
-            df = pd.read_csv(targetFilename)
-            # drop some columns that we don't need
-            df = df.drop(columns=['NeuGenesen', 
-                                  'AnzahlGenesen', 
-                                  'IstErkrankungsbeginn', 
-                                  'Altersgruppe2', 
-                                  'Refdatum', 
-                                  'NeuerTodesfall', 
-                                  'Datenstand'])
-        # set index to datetime of 'Meldedatum'
-        df = df.set_index('Meldedatum')
-        df.index = pd.to_datetime(df.index)
-        # keep the dataframe
-        self.__df = df
-        # filter age groups
-        print('Filtering by age/gender groups...')
+        if not os.path.exists(targetFilename):
+            return None
+        return targetFilename
+
+    def get_age_and_gender_cube(self):
+        """ Returns the time-resolved cube of the cases by county, reporting date, age group and gender. The cube is 
+        kept in the data directory and updated with the RKI master file of today, it will be rebuilt if a day is 
+        missing.
+
+        Returns:
+            [RKICube]: The cube or None in case something went wrong
+        """
+        targetFilename = self.__get_RKI_master_file()
+        if targetFilename is None:
+            return None
+        return RKICube.update_or_build(self.__dataDirectory + '/' + 'RKI_COVID19_cube.npz', 
+                                       targetFilename, 
+                                       self.__chunkSize)
+
+    def get_age_and_gender_time_series(self, attribute, numDays, byState = False):
+        """ Returns the cases of an age group or gender over the last days by county or state from the cube. The
+        attribute is either one of the data such as 'Cases by age: 80+' holding all cases up to a day or its 7-day
+        variant such as '7-day cases by age: 80+' holding the cases of the 7 days up to a day
+
+        Args:
+            attribute (str): The attribute
+            numDays (int): The number of days
+            byState (bool, optional): True for the states, False for the counties. Defaults to False.
+
+        Returns:
+            [DataFrame]: The values indexed by the reporting date with one column per RS (county) or AGS_TXT (state) or
+            None in case the attribute is unknown or something went wrong
+        """
+        # find the group of the attribute
+        found = None
         for group in self.__groups:
-            group.df = df[df[group.column].str.match(group.name)]
-        print('Filtering done...')
-        return True
+            if attribute == 'Cases by ' + group.alias:
+                found = group, None
+            elif attribute == '7-day cases by ' + group.alias:
+                found = group, 7
+        if found is None:
+            return None
+        group, days = found
+        cube = self.get_age_and_gender_cube()
+        if cube is None:
+            return None
+        if group.column == 'Altersgruppe':
+            df = cube.get_frame(ages=[group.name], byState=byState)
+        else:
+            df = cube.get_frame(genders=[group.name], byState=byState)
+        # all cases up to a day or the cases of the last days up to a day
+        if days is None:
+            df = df.cumsum()
+        else:
+            df = df.rolling(days, min_periods=1).sum()
+        # the IDs as used by the geoJSON
+        df.columns = df.columns.astype(str).str.zfill(2 if byState else 5)
+        return df.iloc[-numDays:]
+
+    def __sum_up_RKI_master_file(self, filename, flagColumn = 'NeuerFall', sumColumn = 'AnzahlFall'):
+        """ Reads the needed columns of the RKI master file in chunks and folds each chunk into the sums of the cases 
+        per state, county, age group and gender in a single groupby. The data in the sumColumn might be invalid 
+        depending on a flag in the flagColumn. The memory needed is bounded by the chunk size and the size of the sums.
+
+        Args:
+            filename (str): the RKI master file
+            flagColumn (str, optional): The column holding the flag if the data is valid or not. -1, 0 or 1 refer to 
+            valid data. Defaults to 'NeuerFall'.
+            sumColumn (str, optional): The column to be summed up. Defaults to 'AnzahlFall'.
+
+        Returns:
+            [Series]: The sums indexed by IdBundesland, IdLandkreis, Altersgruppe and Geschlecht
+        """
+        sums = None
+        groupColumns = ['IdBundesland', 'IdLandkreis', 'Altersgruppe', 'Geschlecht']
+        reader = pd.read_csv(filename, 
+                             usecols=list(DownloadAndPreprocessRKIdata.COLUMN_TYPES.keys()), 
+                             dtype=DownloadAndPreprocessRKIdata.COLUMN_TYPES, 
+                             chunksize=self.__chunkSize)
+        for chunk in reader:
+            # flag column must be in -1, 0, 1 to indicate valid numbers
+            chunk = chunk[chunk[flagColumn].isin((-1, 0, 1))]
+            # the categories might differ from chunk to chunk
+            chunk = chunk.astype({'Altersgruppe': str, 'Geschlecht': str})
+            chunkSums = chunk.groupby(groupColumns)[sumColumn].sum()
+            if sums is not None:
+                chunkSums = pd.concat([sums, chunkSums]).groupby(level=groupColumns).sum()
+            sums = chunkSums
+        return sums
 
     def get_age_and_gender_data_by_county(self):
         """ Pre-processes the RKI master file to generate a csv holding the data per county
@@ -134,73 +219,8 @@ class DownloadAndPreprocessRKIdata():
         Returns:
             [DataFrame]: The data frame holding the data per county or None in case something went wrong
         """
-        # get the date
-        today = date.today()
-        # the prefix of the CSV file is Y-m-d
-        preFix = today.strftime('%Y-%m-%d') + "-RKI_COVID19_age_gender_per_county"
-        # the target filename of the csv to be used/created
-        targetFilename = self.__dataDirectory + '/' + preFix + '-db.csv'
-        if os.path.exists(targetFilename):
-            print('using existing file: ' + targetFilename)
-            # read the file
-            df = pd.read_csv(targetFilename)
-            print(df.head())
-            # ...and return it
-            return df
-        else:
-            # ensure that we have downloaded the RKI master file
-            if self.__df is None:
-                if not self.__download_RKI_master_file():
-                    return None
-        # build the sum of cases
-        print('Building groups and sums...')
-        dfGroupSum = []
-        for group in self.__groups:
-            # getting the sum for the group
-            tmp = self.__group_and_sum_colum(group.df)
-            # change the column name
-            tmp.columns = ['Cases by ' + group.alias]
-            # append it to the list
-            dfGroupSum.append(tmp)
-        # concat them horizontally so that the become columns 
-        dfSums = pd.concat(dfGroupSum, axis=1)
-        # create a data frame and reset its index
-        dfAgeAndGender = pd.DataFrame(dfSums.copy()).reset_index()
-        # convert NaN to 0
-        dfAgeAndGender.fillna(value=0, inplace=True)
         # rename IDLandkreis to RS to match the column name of the geoJSON
-        dfAgeAndGender.rename(columns={'IdLandkreis':'RS'}, inplace=True)
-        print(dfAgeAndGender.head())
-        print('Calculate percentages...')
-        # get the county IDs
-        IDs = dfAgeAndGender['RS'].unique()
-        dfs = []
-        for ID in IDs:
-            # the county data
-            dfSingle = dfAgeAndGender.loc[dfAgeAndGender['RS'] == ID].copy()
-            # all cases of all age groups
-            overallByAge = sum([dfSingle['Cases by age: 0-4'],
-                                dfSingle['Cases by age: 5-14'],
-                                dfSingle['Cases by age: 15-34'],
-                                dfSingle['Cases by age: 35-59'],
-                                dfSingle['Cases by age: 60-79'],
-                                dfSingle['Cases by age: 80+']])
-            # the percentages of some groups
-            percentage = sum([dfSingle['Cases by age: 0-4'], dfSingle['Cases by age: 5-14']]) * 100 / overallByAge
-            dfSingle['Percent cases by age: 0-14'] = percentage
-
-            percentage = sum([dfSingle['Cases by age: 15-34'], dfSingle['Cases by age: 35-59'], dfSingle['Cases by age: 60-79']]) * 100 / overallByAge
-            dfSingle['Percent cases by age: 15-79'] = percentage
-            
-            percentage = dfSingle['Cases by age: 80+'] * 100 / overallByAge
-            dfSingle['Percent cases by age: 80+'] = percentage
-            # put the rows together
-            dfs.append(dfSingle)
-        # concat them
-        df = pd.concat(dfs)
-        # write the result to a csv
-        df.to_csv(targetFilename)
-        return df
+        return self.__get_age_and_gender_data('RKI_COVID19_age_gender_per_county', 'IdLandkreis', 'RS')
 
     def get_age_and_gender_data_by_state(self):
         """ Pre-processes the RKI master file to generate a csv holding the data per state
@@ -208,10 +228,24 @@ class DownloadAndPreprocessRKIdata():
         Returns:
             [DataFrame]: The data frame holding the data per state or None in case something went wrong
         """
+        # rename IdBundesland to AGS_TXT to match the column name of the geoJSON
+        return self.__get_age_and_gender_data('RKI_COVID19_age_gender_per_state', 'IdBundesland', 'AGS_TXT')
+
+    def __get_age_and_gender_data(self, name, groupColumn, idColumn):
+        """ Pre-processes the RKI master file to generate a csv holding the data per county or state
+
+        Args:
+            name (str): the name of the csv file without the date prefix
+            groupColumn (str): The grouping column, either 'IdLandkreis' or 'IdBundesland'
+            idColumn (str): The name of the ID column of the result
+
+        Returns:
+            [DataFrame]: The data frame holding the data per county or state or None in case something went wrong
+        """
         # get the date
         today = date.today()
         # the prefix of the CSV file is Y-m-d
-        preFix = today.strftime('%Y-%m-%d') + "-RKI_COVID19_age_gender_per_state"
+        preFix = today.strftime('%Y-%m-%d') + "-" + name
         # the target filename of the csv to be used/created
         targetFilename = self.__dataDirectory + '/' + preFix + '-db.csv'
         if os.path.exists(targetFilename):
@@ -223,84 +257,68 @@ class DownloadAndPreprocessRKIdata():
             return df
         else:
             # ensure that we have downloaded the RKI master file
-            if self.__df is None:
+            if self.__sums is None:
                 if not self.__download_RKI_master_file():
                     return None
         # build the sum of cases
         print('Building groups and sums...')
-        dfGroupSum = []
-        for group in self.__groups:
-            # getting the sum for the group
-            tmp = self.__group_and_sum_colum(group.df, groupColumn='IdBundesland')
-            # change the column name
-            tmp.columns = ['Cases by ' + group.alias]
-            # append it to the list
-            dfGroupSum.append(tmp)
-        # concat them horizontally so that the become columns 
-        dfSums = pd.concat(dfGroupSum, axis=1)
-        # create a data frame and reset its index
-        dfAgeAndGender = pd.DataFrame(dfSums.copy()).reset_index()
+        dfAgeAndGender = self.__get_group_sums(groupColumn).reset_index()
         # convert NaN to 0
         dfAgeAndGender.fillna(value=0, inplace=True)
-        # rename IdBundesland to AGS_TXT to match the column name of the geoJSON
-        dfAgeAndGender.rename(columns={'IdBundesland':'AGS_TXT'}, inplace=True)
+        dfAgeAndGender.rename(columns={groupColumn:idColumn}, inplace=True)
         print('Calculate percentages...')
-        # get the county IDs
-        IDs = dfAgeAndGender['AGS_TXT'].unique()
-        dfs = []
-        for ID in IDs:
-            # the county data
-            dfSingle = dfAgeAndGender.loc[dfAgeAndGender['AGS_TXT'] == ID].copy()
-            # all cases of all age groups
-            overallByAge = sum([dfSingle['Cases by age: 0-4'],
-                                dfSingle['Cases by age: 5-14'],
-                                dfSingle['Cases by age: 15-34'],
-                                dfSingle['Cases by age: 35-59'],
-                                dfSingle['Cases by age: 60-79'],
-                                dfSingle['Cases by age: 80+']])
-            # the percentages of some groups
-            percentage = sum([dfSingle['Cases by age: 0-4'], dfSingle['Cases by age: 5-14']]) * 100 / overallByAge
-            dfSingle['Percent cases by age: 0-14'] = percentage
-
-            percentage = sum([dfSingle['Cases by age: 15-34'], dfSingle['Cases by age: 35-59'], dfSingle['Cases by age: 60-79']]) * 100 / overallByAge
-            dfSingle['Percent cases by age: 15-79'] = percentage
-            
-            percentage = dfSingle['Cases by age: 80+'] * 100 / overallByAge
-            dfSingle['Percent cases by age: 80+'] = percentage
-            # put the rows together
-            dfs.append(dfSingle)
-        # concat them
-        df = pd.concat(dfs)
+        # all cases of all age groups
+        overallByAge = sum([dfAgeAndGender['Cases by age: 0-4'],
+                            dfAgeAndGender['Cases by age: 5-14'],
+                            dfAgeAndGender['Cases by age: 15-34'],
+                            dfAgeAndGender['Cases by age: 35-59'],
+                            dfAgeAndGender['Cases by age: 60-79'],
+                            dfAgeAndGender['Cases by age: 80+']])
+        # the percentages of some groups
+        percentage = sum([dfAgeAndGender['Cases by age: 0-4'], dfAgeAndGender['Cases by age: 5-14']]) * 100 / overallByAge
+        dfAgeAndGender['Percent cases by age: 0-14'] = percentage
+
+        percentage = sum([dfAgeAndGender['Cases by age: 15-34'], dfAgeAndGender['Cases by age: 35-59'], dfAgeAndGender['Cases by age: 60-79']]) * 100 / overallByAge
+        dfAgeAndGender['Percent cases by age: 15-79'] = percentage
+        
+        percentage = dfAgeAndGender['Cases by age: 80+'] * 100 / overallByAge
+        dfAgeAndGender['Percent cases by age: 80+'] = percentage
         # write the result to a csv
-        df.to_csv(targetFilename)
-        return df
+        dfAgeAndGender.to_csv(targetFilename)
+        return dfAgeAndGender
 
-    def __group_and_sum_colum(self, df, groupColumn = 'IdLandkreis', sumColumn='AnzahlFall', flagColumn='NeuerFall'):
-        """ Groups the data by the groupColumn and builds the sum of the sumColumn. The data in the sumColumn might be 
-        invalid depending on a flag in the flagColumn
+    def __get_group_sums(self, groupColumn = 'IdLandkreis'):
+        """ Returns the sums of the cases of all groups by the groupColumn 
 
         Args:
-            df (DataFrame): the huge df loaded from the RKI master file
             groupColumn (str, optional): The grouping column. Defaults to 'IdLandkreis', can be 'IdBundesland' as well.
-            sumColumn (str, optional): The column to be summed up. Defaults to 'AnzahlFall'.
-            flagColumn (str, optional): The column holding the flag if the data is valid or not. -1, 0 or 1 refer to valid 
-            data. Defaults to 'NeuerFall'.
 
         Returns:
-            [DataFrame]: A data frame holding the values of the group (e.g. IdLandkreis) vertically and the grouped 
-            sums horizontally
-        """
-        # flag column must be in -1, 0, 1 to indicate valid numbers
-        flag = df[flagColumn].isin((-1, 0, 1))
-        # group the flagged rows and build the sum
-        series = df[flag].groupby([groupColumn])[sumColumn].sum().to_frame(name = sumColumn).reset_index()
-        # make an array 
-        #series = series[['IdLandkreis', 'AnzahlFall']]
+            [DataFrame]: A data frame holding the values of the group (e.g. IdLandkreis) vertically and the sums of the
+            groups ('Cases by age: 0-4', ...) horizontally. A sum is NaN if there is no case of the group.
+        """
+        # one pivot table per grouped column (age and gender) having the group names as columns
+        tables = {}
+        for column in set(group.column for group in self.__groups):
+            tables[column] = self.__sums.groupby(level=[groupColumn, column]).sum().unstack(column)
+        columns = []
+        for group in self.__groups:
+            table = tables[group.column]
+            if group.name in table.columns:
+                series = table[group.name]
+            else:
+                series = pd.Series(float('nan'), index=table.index)
+            # keep the sums as integers if there is a case for every ID
+            if not series.isna().any():
+                series = series.astype('int64')
+            columns.append(series.rename('Cases by ' + group.alias))
+        df = pd.concat(columns, axis=1)
+        # only the IDs having a case of any group
+        df = df[df.notna().any(axis=1)].sort_index()
         # the ID is a 5 digit string
-        series[groupColumn] = series[groupColumn].astype(str).str.zfill(5)
-        # set the index
-        series = series.set_index(groupColumn)
-        return series
+        df.index = df.index.astype(str).str.zfill(5)
+        df.index.name = groupColumn
+        return df
 
 class CovidFoliumMapDEageAndGenderCounties(CovidFoliumMap):
     """
@@ -321,6 +339,8 @@ class CovidFoliumMapDEageAndGenderCounties(CovidFoliumMap):
                                                             mapAlias = 'MapDEageAndGenderCounty',
                                                             mapLocation = [51.3, 10.5],
                                                             mapZoom = 6,
+                                                            simplifyTolerance = 0.001,
+                                                            coordinatePrecision = 4,
                                                             bins = None,
                                                             mapAttribute = 'Robert Koch-Institut (RKI), dl-de/by-2-0, CMBT 2022',
                                                             tooltipAttributes = ['GeoName',
@@ -376,11 +396,8 @@ class CovidFoliumMapDEageAndGenderCounties(CovidFoliumMap):
                     print(e)    
         # now the file should exist
         if os.path.exists(targetFilename):
-            # load the file
-            geoDf = gpd.read_file(targetFilename)
-        # sort it by RS (LandreisID), there is a mismatch because of the RKI Berlin approach of having separate data for the districts 
-        # in one table they are sorted into the table, in the other added at the end
-        geoDf = geoDf.sort_values('RS').reset_index()
+            # load the file, the parsed file is cached
+            geoDf = read_geo_file(targetFilename)
         return geoDf
 
     def __get_covid_data(self, dfGeo):
@@ -418,15 +435,10 @@ class CovidFoliumMapDEageAndGenderCounties(CovidFoliumMap):
             return df
         # ensure RS length is 5
         df['RS'] = df['RS'].astype(str).str.zfill(5)
-        # sort it by RS (LandkreisID), there is a mismatch because of the RKI Berlin approach of having separate data for the districts 
-        # in one table they are sorted into the table, in the other added at the end
-        df = df.sort_values('RS').reset_index()
-        # the county name is in the dfgeo
-        dfTmp = pd.DataFrame(dfGeo['county'])
-        dfTmp.columns = ['GeoName']
-        combined = pd.concat([df, dfTmp], axis=1)
-        # some how it should work with a merge but that fails (maybe because the two tables haven't been sorted) TODO
-        # result = df.merge(geoDf['RS', 'county'], on='RS', how='left')
+        # the county name is in the dfgeo, join it by the RS (LandkreisID) as the RKI Berlin approach of having separate data for 
+        # the districts sorts them differently in the two tables
+        dfNames = dfGeo[['RS', 'county']].rename(columns={'county': 'GeoName'})
+        combined = df.merge(dfNames, on='RS', how='left', validate='many_to_one')
         # ...and return df
         return combined
     
@@ -438,6 +450,18 @@ class CovidFoliumMapDEageAndGenderCounties(CovidFoliumMap):
         """
         return self.__dfData
 
+    def get_time_series_df(self, attribute, numDays):
+        """ Returns the values of an attribute over the last days from the cube of the RKI data
+
+        Args:
+            attribute (str): The attribute such as 'Cases by age: 80+' or '7-day cases by age: 80+'
+            numDays (int): The number of days
+
+        Returns:
+            [Dataframe]: The values indexed by the date with one column per RS or None if there is no data
+        """
+        return DownloadAndPreprocessRKIdata(self.__dataDirectory).get_age_and_gender_time_series(attribute, numDays, byState=False)
+
     def get_geo_df(self):
         """ Returns the geoJSON dataframe
 
@@ -495,6 +519,8 @@ class CovidFoliumMapDEageAndGenderStates(CovidFoliumMap):
                                                             mapAlias = 'MapDEageAndGenderState',
                                                             mapLocation = [51.3, 10.5],
                                                             mapZoom = 6,
+                                                            simplifyTolerance = 0.001,
+                                                            coordinatePrecision = 4,
                                                             bins = None,
                                                             mapAttribute = 'Robert Koch-Institut (RKI), dl-de/by-2-0, CMBT 2022',
                                                             tooltipAttributes = ['GeoName',
@@ -549,8 +575,8 @@ class CovidFoliumMapDEageAndGenderStates(CovidFoliumMap):
                     print(e)    
         # now the file should exist
         if os.path.exists(targetFilename):
-            # load the file
-            geoDf = gpd.read_file(targetFilename)
+            # load the file, the parsed file is cached
+            geoDf = read_geo_file(targetFilename)
         # finally return the geo df
         return geoDf
 
@@ -590,12 +616,10 @@ class CovidFoliumMapDEageAndGenderStates(CovidFoliumMap):
         # ensure AGS length is 2
         df['AGS_TXT'] = df['AGS_TXT'].astype(str).str.zfill(2)
         
-        # get the state names from the dfGeo
-        dfTmp = pd.DataFrame(dfGeo['LAN_ew_GEN'])
-        # rename them to fit our wording 
-        dfTmp.columns = ['GeoName']
-        # put them together
-        combined = pd.concat([df, dfTmp], axis=1)
+        # get the state names from the dfGeo and rename them to fit our wording 
+        dfNames = dfGeo[['AGS_TXT', 'LAN_ew_GEN']].rename(columns={'LAN_ew_GEN': 'GeoName'})
+        # join them by the AGS
+        combined = df.merge(dfNames, on='AGS_TXT', how='left', validate='many_to_one')
         # ...and return them
         return combined
    
@@ -607,6 +631,18 @@ class CovidFoliumMapDEageAndGenderStates(CovidFoliumMap):
         """
         return self.__dfData
 
+    def get_time_series_df(self, attribute, numDays):
+        """ Returns the values of an attribute over the last days from the cube of the RKI data
+
+        Args:
+            attribute (str): The attribute such as 'Cases by age: 80+' or '7-day cases by age: 80+'
+            numDays (int): The number of days
+
+        Returns:
+            [Dataframe]: The values indexed by the date with one column per AGS_TXT or None if there is no data
+        """
+        return DownloadAndPreprocessRKIdata(self.__dataDirectory).get_age_and_gender_time_series(attribute, numDays, byState=True)
+
     def get_geo_df(self):
         """ Returns the geoJSON dataframe
 
@@ -2,16 +2,14 @@ import pandas as pd
 import numpy as np
 import math
 import os
-import geopandas as gpd
-import folium
 import datetime
 from datetime import date, timedelta
 from abc import ABC, abstractmethod
 from pathlib import Path
 from CovidCases import CovidCases
-from CovidCasesWHO import CovidCasesWHO
-from CovidCasesOWID import CovidCasesOWID
 from CovidFoliumMap import CovidFoliumMap, ensure_path_exists, this_or_last_weekday, download_JSON_file
+from DatasetProvider import DatasetProvider
+from GeometryCache import read_geo_file
 from enum import Enum
 
 class Continents(Enum):
@@ -35,24 +33,32 @@ class CovidFoliumMapWHO(CovidFoliumMap):
     to map the Taiwan cases as well.
     The class inherits from the CovidFoliumMap class 
     """
-    def __init__(self, continent, dataDirectory = '../data', numDaysBefore = 0):
+    def __init__(self, continent, dataDirectory = '../data', numDaysBefore = 0, provider = None):
         """ Constructor
 
         Args:
             continent (Continent): The continent to create the map for
             dataDirectory (str, optional): The data directory to be used for cached data. Defaults to '../data'.
+            numDaysBefore (int, optional): A delay in days to the current date. Defaults to 0.
+            provider (DatasetProvider, optional): The provider of the WHO, OWID and geo data shared by several maps. 
+            Defaults to None to load the data for this map only.
         """
         # init members
         self.__dataDirectory = dataDirectory + '/'
         self.__dfGeo = None
         self.__dfData = None
+        self.__dfSnapshot = None
         self.__defaultMapOptions = CovidFoliumMapWHO.get_map_options_by_continent(continent)
         # ensure that the data directory exists, meaning to create it if it is not available
         self.__dataDirectory = ensure_path_exists(dataDirectory)
+        # the datasets might be shared with other maps
+        if provider is None:
+            provider = DatasetProvider(self.__dataDirectory)
+        self.__provider = provider
         # check if it really exists
         if self.__dataDirectory != '':
-            # get the geoJSON data frame
-            self.__dfGeo = self.__get_geo_data()
+            # get the geoJSON data frame, it is the same for all continents
+            self.__dfGeo = self.__provider.get('WorldCountriesMedRes.geojson', self.__get_geo_data)
             # get the covid data for all countries in the continent
             if not self.__dfGeo is None:
                 self.__dfData = self.__get_covid_data(continent, numDaysBefore)
@@ -95,8 +101,21 @@ class CovidFoliumMapWHO(CovidFoliumMap):
                     print(e)    
         # now the file should exist
         if os.path.exists(targetFilename):
-            # load the file
-            geoDf = gpd.read_file(targetFilename)
+            # load the file, the renamed columns are cached
+            geoDf = read_geo_file(targetFilename, CovidFoliumMapWHO.__rename_geo_columns, 'WHO')
+        # finally return the geo df
+        return geoDf
+
+    @staticmethod
+    def __rename_geo_columns(geoDf):
+        """ Renames the columns of the geo dataframe of the world
+
+        Args:
+            geoDf (GeoDataFrame): The geo dataframe of the geoJSON file
+
+        Returns:
+            GeoDataFrame: The geo dataframe with the columns Name, ISO-3166-alpha_3, GeoID and geometry
+        """
         # adjust column names
         if 'iso_a3' in geoDf.columns:
             # the low and medium geoJSON contain many not required attributes
@@ -104,7 +123,6 @@ class CovidFoliumMapWHO(CovidFoliumMap):
         else:   
             # the highres file contains only 4 attributes which nor to be renamed 
             geoDf.columns = ['Name', 'ISO-3166-alpha_3', 'GeoID', 'geometry']
-        # finally return the geo df
         return geoDf
 
     def __get_covid_data(self, continent, numDaysBefore = 0):
@@ -120,10 +138,8 @@ class CovidFoliumMapWHO(CovidFoliumMap):
         # init the result
         df = None
         try:
-            # get the latests database file as a CSV
-            dataFile = CovidCasesWHO.download_CSV_file(self.__dataDirectory)
-            # get the data for the countryList
-            whoData = CovidCasesWHO(dataFile)
+            # get the data of the latests database file, it is parsed once for all maps sharing the provider
+            whoData = self.__provider.get_who()
         except Exception as e:
             if hasattr(e, 'message'):
                 print(e.message)
@@ -160,10 +176,8 @@ class CovidFoliumMapWHO(CovidFoliumMap):
         df = whoData.add_incidence_7day_per_100Kpopulation(df)
         if continent == Continents.Asia or continent == Continents.World:
             try:
-                # get the OWID database as well
-                dataFile = CovidCasesOWID.download_CSV_file(self.__dataDirectory)
-                # get the OWID data
-                owidData = CovidCasesOWID(dataFile)
+                # get the OWID data as well
+                owidData = self.__provider.get_owid()
             except Exception as e:
                 if hasattr(e, 'message'):
                     print(e.message)
@@ -185,9 +199,17 @@ class CovidFoliumMapWHO(CovidFoliumMap):
         # take care of weekends as the data is often not available on weekends
         if (today.weekday() == 0) or (today.weekday() == 6):
             last_friday = this_or_last_weekday(date.today(), 4)
-            self.__defaultMapOptions.mapDate = date(last_friday.year, last_friday.month, last_friday.day)
+            mapDate = date(last_friday.year, last_friday.month, last_friday.day)
         else:
-            self.__defaultMapOptions.mapDate = today - timedelta(1)
+            mapDate = today - timedelta(1)
+        # the newest data up to that date, the date of the map doesn't move as long as the WHO data doesn't change
+        dates = df.loc[df['Date'] <= pd.to_datetime(mapDate), 'Date']
+        if len(dates) > 0:
+            mapDate = dates.max().date()
+        self.__defaultMapOptions.mapDate = mapDate
+        # keep the numeric attributes of all dates for the time slider maps
+        attributes = [attribute for attribute in self.__defaultMapOptions.tooltipAttributes if attribute != 'GeoName']
+        self.__dfSnapshot = CovidCases.get_date_indexed_snapshot(df, attributes)
         # get the data for that date
         dfDate = df.loc[df['Date'] == pd.to_datetime(self.__defaultMapOptions.mapDate)]     
         # ...and return df
@@ -201,6 +223,23 @@ class CovidFoliumMapWHO(CovidFoliumMap):
         """
         return self.__dfData
 
+    def get_time_series_df(self, attribute, numDays):
+        """ Returns the values of an attribute over the last days up to the date of the map
+
+        Args:
+            attribute (str): The attribute such as 'Incidence7DayPer100Kpopulation'
+            numDays (int): The number of days
+
+        Returns:
+            [Dataframe]: The values indexed by the date with one column per GeoID or None if there is no data
+        """
+        if (self.__dfSnapshot is None) or (attribute not in self.__dfSnapshot.columns.get_level_values(0)):
+            return None
+        # all countries in one slice of the snapshot
+        dfAttribute = self.__dfSnapshot[attribute]
+        dfAttribute = dfAttribute.loc[:pd.to_datetime(self.__defaultMapOptions.mapDate)]
+        return dfAttribute.iloc[-numDays:]
+
     def get_geo_df(self):
         """ Returns the geoJSON dataframe
 
@@ -256,6 +295,10 @@ class CovidFoliumMapWHO(CovidFoliumMap):
         mo.bins = None
         # the leaflet
         mo.mapAttribute = 'WHO data. Map generated by CMBT, 2022'
+        # simplify the borders to about 1 km and round the coordinates to about 100 m, that's the same for all continents
+        # so that they share the simplified topology
+        mo.simplifyTolerance = 0.01
+        mo.coordinatePrecision = 3
         # all WHO dataframes will include these attributes
         mo.tooltipAttributes = ['GeoName', 
                                 'Cases',
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import pygal
 import os
+import time
 from pygal.maps.world import World
 from pygal.style import Style
 from PIL import Image, ImageDraw, ImageFont
@@ -24,6 +25,90 @@ def date_range(start_date, end_date):
     for n in range(int((end_date - start_date).days)):
         yield start_date + timedelta(n)
 
+# the fonts and the heatmap bar added to the PNG files, loaded once per process
+_decoration = None
+# the map object of a parallel run, kept as a global so that the forked workers of the process pool inherit it and its
+# date index instead of receiving a pickled copy
+_covidMap = None
+
+def _get_decoration():
+    """ Returns the heatmap bar and the fonts of the axis and of the info label, they are loaded once per process
+
+    Returns:
+        tuple: The bar, the font of the axis labels and the font of the info label
+    """
+    global _decoration
+    if _decoration is None:
+        # create the bar
+        bar = Colormap.create_heatmap_bar((1024, 32), (0.1, 0.1, 0.1), 0.1)
+        # fonts for the text output
+        try:
+            fntAxis = ImageFont.truetype("Calibri.ttf", 18)
+            fntInfo = ImageFont.truetype("Calibri.ttf", 12)
+        except OSError:
+            print('Calibri.ttf not found, using the default font')
+            fntAxis = ImageFont.load_default()
+            fntInfo = ImageFont.load_default()
+        _decoration = (bar, fntAxis, fntInfo)
+    return _decoration
+
+def _create_map_for_date(info, the_day):
+    """ Renders the map of a date in a worker of the process pool, errors are returned instead of being raised
+
+    Returns:
+        str: The error or None if successful
+    """
+    try:
+        _covidMap.create_map_for_date(info, the_day)
+        return None
+    except Exception as e:
+        return str(the_day) + ': ' + type(e).__name__ + ': ' + str(e)
+
+def _add_heatmap_bar_to_png(filename):
+    """ Adds the heatmap bar to a PNG file in a worker of the process pool, errors are returned instead of being raised
+
+    Returns:
+        str: The error or None if successful
+    """
+    try:
+        CovidMap.add_heatmap_bar_to_png(filename)
+        return None
+    except Exception as e:
+        return filename + ': ' + type(e).__name__ + ': ' + str(e)
+
+def _run_parallel(function, items, workers):
+    """ Calls a function for each item, with more than one worker on a forked process pool
+
+    Args:
+        function (callable): The function taking the item and returning an error or None
+        items (list): The items, each one a tuple of the arguments of the function
+        workers (int): The number of worker processes, None for one per CPU
+
+    Returns:
+        dict: The number of items (frames), the seconds, the frames per second (framesPerSecond) and the errors
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(items)))
+    start = time.perf_counter()
+    if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        errors = [function(*item) for item in items]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            errors = list(executor.map(function, *zip(*items), chunksize=max(1, len(items) // (workers * 4))))
+    seconds = time.perf_counter() - start
+    report = {'frames': len(items),
+              'seconds': seconds,
+              'framesPerSecond': len(items) / seconds if seconds > 0 else None,
+              'errors': [error for error in errors if error is not None]}
+    print(str(report['frames']) + ' frames in ' + '{:.1f}'.format(seconds) + 's, ' + 
+          '{:.1f}'.format(report['framesPerSecond'] or 0.0) + ' frames per second, ' + str(len(report['errors'])) + ' failed')
+    for error in report['errors']:
+        print(error)
+    return report
+
 @dataclass
 class mapInfo:
     """somehow a struct holding the information about the map that should be generated
@@ -63,49 +148,72 @@ class CovidMap:
         """
         # keep the data frame
         self.__df = df
+        # the rows of each date, built on the first use
+        self.__dateIndex = None
+
+    def __get_date_snapshot(self, pdDate):
+        """returns the rows of a date, the rows of all dates are grouped once
+
+        Args:
+            pdDate (Timestamp): The date
+
+        Returns:
+            DataFrame: The rows of the date, empty if there are none
+        """
+        if self.__dateIndex is None:
+            self.__dateIndex = {key: group for key, group in self.__df.groupby('Date', sort=False)}
+        return self.__dateIndex.get(pdDate, self.__df.iloc[0:0])
+
+    @staticmethod
+    def add_heatmap_bar_to_png(filename):
+        """adds a heatmap bar and some text to a png file
+
+        Args:
+            filename (str): The png file
+        """
+        bar, fntAxis, fntInfo = _get_decoration()
+        # open the file
+        img = Image.open(filename)
+        # place the bar into the image
+        img.paste(bar, (690, 850))
+        # create a drawer
+        draw = ImageDraw.Draw(img)
+        # label on the left of the bar
+        draw.text((690, 850 + 32 + 2), 
+                'Daily minimum', 
+                font=fntAxis, 
+                fill=(255,255,255,0))
+        # label on the right of the bar
+        draw.text((690 + 1024 - 110, 850 + 32 + 2), 
+                'Daily maximum', 
+                font=fntAxis, 
+                fill=(255,255,255,0))
+        # info label
+        draw.text((690 + 240, 850 + 32 + 6), 
+                'Source: ECDC data, More information: http://mb.cmbt.de, GitHub: https://github.com/1c3t3a/Covid-19-analysis', 
+                font=fntInfo, 
+                fill=(255,255,255,0))
+        # save the image
+        img.save(filename)
 
     @staticmethod
-    def add_heatmap_bar_to_all_png(info):
+    def add_heatmap_bar_to_all_png(info, workers = 1):
         """adds a heatmap bar and some text to all png in a given directory
 
         Args:
             info (mapInfo): Information about the graph such as the title of the map
+            workers (int, optional): The number of worker processes, each one loads the fonts and the bar once. None 
+                                     uses one worker per CPU. Defaults to 1.
+
+        Returns:
+            dict: The number of images (frames), the seconds, the frames per second (framesPerSecond) and the errors
         """
-        # create the bar
-        bar = Colormap.create_heatmap_bar((1024, 32), (0.1, 0.1, 0.1), 0.1)
         # the output directory
         directory = info.output_directory + '/' + info.attribute + '/'
-        # fonts for the text output
-        fntAxis = ImageFont.truetype("Calibri.ttf", 18)
-        fntInfo = ImageFont.truetype("Calibri.ttf", 12)
-        for filename in sorted(os.listdir(directory)):
-            if filename.endswith(".png"):
-                # open the file
-                img = Image.open(directory + filename)
-                # place the bar into the image
-                img.paste(bar, (690, 850))
-                # create a drawer
-                draw = ImageDraw.Draw(img)
-                # label on the left of the bar
-                draw.text((690, 850 + 32 + 2), 
-                        'Daily minimum', 
-                        font=fntAxis, 
-                        fill=(255,255,255,0))
-                # label on the right of the bar
-                draw.text((690 + 1024 - 110, 850 + 32 + 2), 
-                        'Daily maximum', 
-                        font=fntAxis, 
-                        fill=(255,255,255,0))
-                # info label
-                draw.text((690 + 240, 850 + 32 + 6), 
-                        'Source: ECDC data, More information: http://mb.cmbt.de, GitHub: https://github.com/1c3t3a/Covid-19-analysis', 
-                        font=fntInfo, 
-                        fill=(255,255,255,0))
-                # img.show()
-                # save the image
-                img.save(directory + filename)
-                print(filename)
-        return
+        filenames = [(directory + filename,) for filename in sorted(os.listdir(directory)) if filename.endswith(".png")]
+        # the workers inherit the fonts and the bar
+        _get_decoration()
+        return _run_parallel(_add_heatmap_bar_to_png, filenames, workers)
 
     def create_map_for_date(self, info, the_day):
         """creates a svg for a date showing a worldmap of the data
@@ -126,16 +234,15 @@ class CovidMap:
         # converted into a pandas date
         pdDate = pd.to_datetime(the_day)
         # get the data for this day
-        dfDate = self.__df.loc[self.__df['Date'] == pdDate]
+        dfDate = self.__get_date_snapshot(pdDate)
         # now get those countries who had at least 1 case
         dfDateNoneZero = dfDate.loc[dfDate['Cases'] != 0]
         
-        # get the heatmap colors
-        hmResult = Colormap.heatmap_from_dataframe(dfDateNoneZero, info.attribute, useLog=True, gain=1.0, offset = 0)
-        # blend them
-        heatmapColors = Colormap.blend_color_values(hmResult.colors, (0.1, 0.1, 0.1), 0.1)
+        # get the heatmap colors, blended by the lookup table
+        hmResult = Colormap.heatmap_from_dataframe(dfDateNoneZero, info.attribute, useLog=True, gain=1.0, offset = 0, 
+                                                   blendValue=(0.1, 0.1, 0.1), blendFactor=0.1)
         # create hex triplets 
-        heatmapColors = Colormap.color_values_to_hex_triplets(heatmapColors)
+        heatmapColors = Colormap.color_values_to_hex_triplets(hmResult.colors)
         # select a custom style for the map
         custom_style = Style(colors=heatmapColors, 
                             font_family='Calibri',
@@ -154,10 +261,10 @@ class CovidMap:
         # set the title
         myMap.title = the_day.strftime("%Y-%m-%d") + ': ' + info.title
 
-        # the list of GeoIDs in the dataframe
-        geoIDs = dfDateNoneZero['GeoID'].unique()
+        # the first value of each GeoID in the dataframe
+        dfCountries = dfDateNoneZero.drop_duplicates(subset='GeoID')
         # show the contries
-        for geoID in geoIDs:
+        for geoID, val in zip(dfCountries['GeoID'], dfCountries[info.attribute]):
             # mapping of ISO and WHO country names
             if geoID == 'UK':
                 myMap.add(geoID, 'gb')
@@ -166,30 +273,36 @@ class CovidMap:
             elif geoID == 'NAM':
                 myMap.add(geoID, 'na')
             else:   
-                # add it to the map      
-                dfc = dfDateNoneZero.loc[dfDateNoneZero['GeoID'] == geoID]
                 # add the value as a tooltip
-                val = dfc[info.attribute].values[0]
                 myMap.add(geoID, {geoID.lower():"{:.4f}".format(val)})
-        # render the map
+        # render the map once and write it
         filename = outputDirectory + '/' + the_day.strftime("%Y-%m-%d") + '-' + info.attribute + '.svg'
-        myMap.render_to_file(filename)
         svg = myMap.render()
+        with open(filename, 'wb') as f:
+            f.write(svg)
         result = mapResult(myMap, svg, hmResult.minimum, hmResult.maximum)
         return result
 
-    def create_map_for_date_range(self, info, start_date, end_date):
+    def create_map_for_date_range(self, info, start_date, end_date, workers = 1):
         """creates the svg's for a date range showing a worldmap of the data
 
         Args:
             info (mapInfo): Information about the graph such as the title of the graph
             start_date (date): The start date
-            end_date ([type]): The end date
+            end_date (date): The end date, the maps are created for all dates < end_date
+            workers (int, optional): The number of worker processes rendering the dates, they are forked and share 
+                                     the date index of this object. None uses one worker per CPU. Defaults to 1.
+
+        Returns:
+            dict: The number of maps (frames), the seconds, the frames per second (framesPerSecond) and the errors
         """
-        # init the result
-        hmResults = []
-        # loop through all dates  
-        for single_date in date_range(start_date, end_date):
-            # create the map for this date
-            res = self.create_map_for_date(info, single_date)
-        return
+        global _covidMap
+        # the workers inherit the index of the dates
+        self.__get_date_snapshot(None)
+        # the output directory is created once
+        os.makedirs(info.output_directory + '/' + info.attribute + '/', exist_ok=True)
+        _covidMap = self
+        try:
+            return _run_parallel(_create_map_for_date, [(info, single_date) for single_date in date_range(start_date, end_date)], workers)
+        finally:
+            _covidMap = None
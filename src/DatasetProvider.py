@@ -0,0 +1,84 @@
+import threading
+from CovidCasesWHO import CovidCasesWHO
+from CovidCasesOWID import CovidCasesOWID
+
+class DatasetProvider:
+    """ A memoizing provider of the datasets used by the map classes. Every dataset is loaded once by the first
+    caller and shared by all later callers, e.g. all continent maps share one parsed WHO database instead of
+    parsing the CSV file again. The class is thread-safe, concurrent callers of the same dataset wait for the
+    first one to finish loading. A failed load is not kept, the next caller will try again.
+    """
+    def __init__(self, dataDirectory = '../data'):
+        """ Constructor
+
+        Args:
+            dataDirectory (str, optional): The data directory to be used for cached data. Defaults to '../data'.
+        """
+        self.__dataDirectory = dataDirectory
+        self.__lock = threading.Lock()
+        # the loaded datasets and a lock per dataset by name
+        self.__datasets = {}
+        self.__locks = {}
+        # the number of loads and of calls served by a loaded dataset
+        self.__loads = 0
+        self.__hits = 0
+
+    def get(self, name, load):
+        """ Returns the dataset of the given name, it will be loaded by calling load if it isn't loaded yet
+
+        Args:
+            name (str): The name of the dataset
+            load (callable): A function without arguments returning the dataset
+
+        Raises:
+            Exception: Any exception raised by load
+
+        Returns:
+            any: The dataset
+        """
+        with self.__lock:
+            if name in self.__datasets:
+                self.__hits += 1
+                return self.__datasets[name]
+            nameLock = self.__locks.setdefault(name, threading.Lock())
+        with nameLock:
+            with self.__lock:
+                # someone else might have loaded it while we were waiting
+                if name in self.__datasets:
+                    self.__hits += 1
+                    return self.__datasets[name]
+            dataset = load()
+            with self.__lock:
+                self.__datasets[name] = dataset
+                self.__loads += 1
+            return dataset
+
+    def get_who(self):
+        """ Returns the WHO data, the latest database file will be downloaded if necessary
+
+        Returns:
+            CovidCasesWHO: The WHO data
+        """
+        return self.get('WHO', lambda: CovidCasesWHO(CovidCasesWHO.download_CSV_file(self.__dataDirectory)))
+
+    def get_owid(self):
+        """ Returns the OWID data, the latest database file will be downloaded if necessary
+
+        Returns:
+            CovidCasesOWID: The OWID data
+        """
+        return self.get('OWID', lambda: CovidCasesOWID(CovidCasesOWID.download_CSV_file(self.__dataDirectory)))
+
+    def get_data_directory(self):
+        """ Returns the data directory
+        """
+        return self.__dataDirectory
+
+    def get_stats(self):
+        """ Returns the number of loads and of calls served by a loaded dataset
+
+        Returns:
+            dict: The counters
+        """
+        with self.__lock:
+            return {'loads': self.__loads, 'hits': self.__hits}
@@ -0,0 +1,330 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+""" A shared downloader for the data files. All downloads use one pooled requests session with separate connect
+    and read timeouts. The response is streamed in chunks to a temporary file that is renamed when it is
+    complete, so a reader never sees a partial file. The ETag and Last-Modified headers of the last download are
+    kept in a small JSON state file and sent with the next request. If the server answers 304 (Not Modified) the
+    content of the previous file is used and nothing is downloaded.
+    Downloaded files are content-addressed: the content is stored once as a blob named by its SHA-256 hash in the 
+    'blobs' sub-directory and the requested (e.g. dated) filename becomes a hard link to the blob. An unchanged 
+    upstream file therefore costs no disk space and keeps its content hash, which can be used as its version.
+    After a download the dated files of older downloads (e.g. '2022-03-01-WHO-db.csv') are rotated and the blobs no 
+    file links to anymore are removed.
+"""
+
+# the timeouts in seconds to establish a connection and to wait for data
+DEFAULT_TIMEOUT = (3.05, 30.0)
+# the size of the chunks written to the file
+CHUNK_SIZE = 1 << 20
+# the maximum number of connections kept per host
+POOL_SIZE = 8
+
+# the name of the directory holding the blobs, relative to the directory of the target file
+BLOB_DIRECTORY = 'blobs'
+# the number of days the dated files of older downloads are kept
+KEEP_DAYS = 7
+# the minimum age in seconds of a blob to be removed, a younger one might be linked by a running download
+BLOB_GRACE_SECONDS = 3600
+
+_logger = logging.getLogger(__name__)
+
+_sessionLock = threading.Lock()
+_session = None
+# the content hashes by (filename, device, inode, size, mtime)
+_hashLock = threading.Lock()
+_hashes = {}
+
+def get_session():
+    """ Returns the requests session shared by all downloads. requests is imported on first use.
+
+    Returns:
+        requests.Session: The session
+    """
+    global _session
+    with _sessionLock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def read_state(stateFilename):
+    """ Reads the state of the last download
+
+    Args:
+        stateFilename (str): The JSON file holding the state
+
+    Returns:
+        dict: The state holding the 'file', 'blob', 'etag', 'lastModified' and 'checked' keys or an empty dict
+    """
+    try:
+        with open(stateFilename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_state(stateFilename, state):
+    """ Writes the state of the last download atomically
+
+    Args:
+        stateFilename (str): The JSON file holding the state
+        state (dict): The state
+    """
+    tmpFilename = stateFilename + '.tmp'
+    with open(tmpFilename, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmpFilename, stateFilename)
+
+def get_blob_directory(targetFilename):
+    """ Returns the directory of the blobs belonging to a target file
+
+    Args:
+        targetFilename (str): The target file
+
+    Returns:
+        str: The directory of the blobs
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(targetFilename)), BLOB_DIRECTORY)
+
+def write_stream_to_blob(response, blobDirectory, extension = '', chunkSize = CHUNK_SIZE):
+    """ Writes the body of a streamed response in chunks to a temporary file and calculates its SHA-256 hash on the 
+    fly. Once it is complete it will be renamed to '<hash><extension>' in the blob directory unless that blob exists 
+    already.
+
+    Args:
+        response (requests.Response): The response, requested with stream=True
+        blobDirectory (str): The directory of the blobs
+        extension (str, optional): The extension of the blob such as '.csv'. Defaults to ''.
+        chunkSize (int, optional): The size of the chunks. Defaults to CHUNK_SIZE.
+
+    Returns:
+        str: The filename of the blob
+    """
+    os.makedirs(blobDirectory, exist_ok=True)
+    fd, tmpFilename = tempfile.mkstemp(dir=blobDirectory, prefix='.download.', suffix='.part')
+    sha256 = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunkSize):
+                if chunk:
+                    f.write(chunk)
+                    sha256.update(chunk)
+        blobFilename = os.path.join(blobDirectory, sha256.hexdigest() + extension)
+        if os.path.exists(blobFilename):
+            # we have it already
+            os.remove(tmpFilename)
+        else:
+            os.replace(tmpFilename, blobFilename)
+    except BaseException:
+        if os.path.exists(tmpFilename):
+            os.remove(tmpFilename)
+        raise
+    return blobFilename
+
+def link_file(sourceFilename, targetFilename):
+    """ Atomically creates or replaces the target as a hard link to the source. If the file system doesn't support 
+    hard links the source will be copied.
+
+    Args:
+        sourceFilename (str): The existing file
+        targetFilename (str): The link to be created
+    """
+    if os.path.exists(targetFilename) and os.path.samefile(sourceFilename, targetFilename):
+        return
+    tmpFilename = targetFilename + '.link'
+    if os.path.exists(tmpFilename):
+        os.remove(tmpFilename)
+    try:
+        os.link(sourceFilename, tmpFilename)
+    except OSError:
+        shutil.copyfile(sourceFilename, tmpFilename)
+    os.replace(tmpFilename, targetFilename)
+
+def rotate_dated_files(targetFilename, keepDays = KEEP_DAYS):
+    """ Removes the files of older downloads next to a target whose name starts with a date, e.g. 
+    '2022-03-01-WHO-db.csv'. The files having the same name but a date more than keepDays before the date of the 
+    target are removed.
+
+    Args:
+        targetFilename (str): The target file
+        keepDays (int, optional): The number of days the older files are kept. Defaults to KEEP_DAYS.
+
+    Returns:
+        list: The removed files
+    """
+    pattern = re.compile(r'(\d{4}-\d{2}-\d{2})(.+)')
+    directory, name = os.path.split(os.path.abspath(targetFilename))
+    match = pattern.fullmatch(name)
+    if match is None:
+        return []
+    try:
+        targetDate = datetime.strptime(match.group(1), '%Y-%m-%d').date()
+    except ValueError:
+        return []
+    removed = []
+    for entry in os.scandir(directory):
+        other = pattern.fullmatch(entry.name)
+        if (other is None) or (other.group(2) != match.group(2)) or (not entry.is_file(follow_symlinks=False)):
+            continue
+        try:
+            otherDate = datetime.strptime(other.group(1), '%Y-%m-%d').date()
+        except ValueError:
+            continue
+        if (targetDate - otherDate).days > keepDays:
+            os.remove(entry.path)
+            removed.append(entry.path)
+    return removed
+
+def prune_blobs(blobDirectory, keep = (), graceSeconds = BLOB_GRACE_SECONDS):
+    """ Removes the blobs no file links to anymore, that is the blobs having no other hard link. Blobs written in the 
+    last graceSeconds are kept as a running download might not have linked them yet.
+
+    Args:
+        blobDirectory (str): The directory of the blobs
+        keep (list, optional): The blobs to be kept in any case, e.g. the one of the last download. Defaults to ().
+        graceSeconds (int, optional): The minimum age of a removed blob. Defaults to BLOB_GRACE_SECONDS.
+
+    Returns:
+        list: The removed blobs
+    """
+    if not os.path.isdir(blobDirectory):
+        return []
+    keep = set(os.path.abspath(filename) for filename in keep if filename is not None)
+    now = time.time()
+    removed = []
+    for entry in os.scandir(blobDirectory):
+        # the temporary files of running downloads start with a '.'
+        if entry.name.startswith('.') or os.path.abspath(entry.path) in keep:
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_nlink == 1 and now - stat.st_mtime > graceSeconds:
+            os.remove(entry.path)
+            removed.append(entry.path)
+    return removed
+
+def get_content_hash(filename):
+    """ Returns the SHA-256 hash of the content of a file. For a link to a blob it is the name of the blob, other 
+    files will be hashed once and the result is kept as long as the file is not modified.
+
+    Args:
+        filename (str): The file
+
+    Returns:
+        str: The hash as a hex string
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _hashLock:
+        if key in _hashes:
+            return _hashes[key]
+    result = None
+    # a link to a blob shares its inode
+    blobDirectory = get_blob_directory(filename)
+    if stat.st_nlink > 1 and os.path.isdir(blobDirectory):
+        for entry in os.scandir(blobDirectory):
+            if entry.name.startswith('.'):
+                continue
+            entryStat = entry.stat()
+            if entryStat.st_ino == stat.st_ino and entryStat.st_dev == stat.st_dev:
+                result = os.path.splitext(entry.name)[0]
+                break
+    if result is None:
+        sha256 = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        result = sha256.hexdigest()
+    with _hashLock:
+        _hashes[key] = result
+    return result
+
+def download_file(url, targetFilename, stateFilename, minCheckInterval = 0, timeout = DEFAULT_TIMEOUT, keepDays = KEEP_DAYS):
+    """ Downloads a file to its blob and links the target to it. If the server reports that the file of the last 
+    download is still up to date the target will be linked to the blob of the last download, if that blob is missing
+    the file is downloaded again. If the last check is less than minCheckInterval seconds ago or if the server can't 
+    be reached or reports an error (5xx) the file of the last download is returned instead of the target. After a 
+    download the dated files older than keepDays and the blobs no file links to anymore are removed.
+
+    Args:
+        url (str): The url of the file
+        targetFilename (str): The file to be written
+        stateFilename (str): The JSON file holding the ETag and Last-Modified headers of the last download
+        minCheckInterval (int, optional): The minimum seconds between two requests. Defaults to 0.
+        timeout (tuple, optional): The connect and read timeouts in seconds. Defaults to DEFAULT_TIMEOUT.
+        keepDays (int, optional): The number of days the dated files of older downloads are kept. Defaults to 
+                                  KEEP_DAYS.
+
+    Raises:
+        FileNotFoundError: In case it couldn't download the file and there is no previous file or the server rejects
+                           the request (4xx)
+
+    Returns:
+        str: The filename of the target or of the previous file
+    """
+    state = read_state(stateFilename)
+    previousFilename = state.get('file')
+    if (previousFilename is None) or (not os.path.exists(previousFilename)):
+        # we can't reuse anything
+        state = {}
+        previousFilename = None
+    if (previousFilename is not None) and (time.time() - state.get('checked', 0) < minCheckInterval):
+        return previousFilename
+    import requests
+    # a conditional request as long as we have the content of the last download
+    conditional = previousFilename is not None
+    try:
+        while True:
+            headers = {}
+            if conditional:
+                if state.get('etag'):
+                    headers['If-None-Match'] = state['etag']
+                if state.get('lastModified'):
+                    headers['If-Modified-Since'] = state['lastModified']
+            with get_session().get(url, headers=headers, timeout=timeout, stream=True) as r:
+                if r.status_code == 304 and conditional:
+                    blobFilename = state.get('blob')
+                    if (blobFilename is None) or (not os.path.exists(blobFilename)):
+                        # the content of the last download is gone, request it again without conditions
+                        _logger.info('not modified, but the blob of ' + previousFilename + ' is missing, downloading it again')
+                        conditional = False
+                        continue
+                    _logger.info('not modified, using existing file: ' + previousFilename)
+                    link_file(blobFilename, targetFilename)
+                elif r.status_code == 200:
+                    blobFilename = write_stream_to_blob(r, get_blob_directory(targetFilename), os.path.splitext(targetFilename)[1])
+                    link_file(blobFilename, targetFilename)
+                    state = {'etag': r.headers.get('ETag'), 'lastModified': r.headers.get('Last-Modified'), 'blob': blobFilename}
+                elif r.status_code >= 500:
+                    # an error of the server is handled like a network error
+                    r.raise_for_status()
+                else:
+                    raise FileNotFoundError('Error getting file ' + url + '. Error code: ' + str(r.status_code))
+            break
+    except requests.RequestException as e:
+        if previousFilename is None:
+            raise FileNotFoundError('Error getting file ' + url + ': ' + str(e))
+        _logger.warning('Error getting file ' + url + ', using existing file ' + previousFilename + ': ' + str(e))
+        return previousFilename
+    state['file'] = targetFilename
+    state['checked'] = time.time()
+    write_state(stateFilename, state)
+    try:
+        # the content of the older downloads is released once no dated file links to it anymore
+        rotate_dated_files(targetFilename, keepDays)
+        prune_blobs(get_blob_directory(targetFilename), [state.get('blob')])
+    except OSError as e:
+        _logger.warning('Error removing older downloads of ' + targetFilename + ': ' + str(e))
+    return targetFilename
@@ -0,0 +1,170 @@
+import os
+import glob
+import time
+from Downloader import get_content_hash
+
+""" A cache of the GeoDataFrames of the GeoJSON files used by the map classes. Parsing a multi-megabyte GeoJSON file
+    is slow, so the normalized frame (after renaming and sorting the columns) is stored in a binary file next to the
+    GeoJSON file. The cache file is keyed by the SHA-256 hash of the GeoJSON file, a changed file will be parsed again.
+    GeoParquet is used if pyarrow is installed, otherwise the frame is pickled. The simplified topologies of the
+    geometries rendered into the maps are cached as well, the ones unused for a week are removed.
+"""
+
+# the sub directory of the data directory holding the cached frames
+GEO_CACHE_DIRECTORY = 'geocache'
+# increase it if the format of the cached frames or the simplification of the topologies changes
+CACHE_VERSION = 2
+# the seconds a cached topology is kept after its last use
+TOPOLOGY_MAX_AGE = 7 * 24 * 3600
+
+def has_parquet():
+    """ Returns True if GeoParquet files can be written and read, meaning pyarrow is installed
+    """
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+def get_cache_filename(geoFilename, variant = ''):
+    """ Returns the filename of the cached frame of a GeoJSON file
+
+    Args:
+        geoFilename (str): The GeoJSON file
+        variant (str, optional): The name of the normalization applied to the frame. Defaults to ''.
+
+    Returns:
+        str: The filename of the cached frame
+    """
+    directory = os.path.join(os.path.dirname(os.path.abspath(geoFilename)), GEO_CACHE_DIRECTORY)
+    name = os.path.splitext(os.path.basename(geoFilename))[0]
+    extension = '.parquet' if has_parquet() else '.pkl'
+    return os.path.join(directory,
+                        name + '-' + variant + '-' + get_content_hash(geoFilename)[:16] + '-v' + str(CACHE_VERSION) + extension)
+
+def _read_cache_file(cacheFilename):
+    """ Reads a cached frame
+    """
+    if cacheFilename.endswith('.parquet'):
+        import geopandas as gpd
+        return gpd.read_parquet(cacheFilename)
+    import pandas as pd
+    return pd.read_pickle(cacheFilename)
+
+def _write_cache_file(geoDf, cacheFilename):
+    """ Writes a cached frame atomically and removes the frames of older versions of the GeoJSON file
+    """
+    directory = os.path.dirname(cacheFilename)
+    os.makedirs(directory, exist_ok=True)
+    tmpFilename = cacheFilename + '.tmp'
+    if cacheFilename.endswith('.parquet'):
+        geoDf.to_parquet(tmpFilename)
+    else:
+        geoDf.to_pickle(tmpFilename)
+    os.replace(tmpFilename, cacheFilename)
+    # the frames of the same file and variant but another hash are outdated
+    prefix = os.path.basename(cacheFilename).rsplit('-', 2)[0] + '-'
+    for filename in glob.glob(os.path.join(glob.escape(directory), glob.escape(prefix) + '*')):
+        if filename != cacheFilename:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+def read_geo_file(geoFilename, normalize = None, variant = ''):
+    """ Returns the GeoDataFrame of a GeoJSON file. It is read from the cache if the GeoJSON file didn't change,
+    otherwise the file is parsed, normalized and stored in the cache.
+
+    Args:
+        geoFilename (str): The GeoJSON file
+        normalize (callable, optional): A function returning the normalized frame of the parsed frame, e.g. renaming
+                                        the columns. Defaults to None.
+        variant (str, optional): The name of the normalization, different normalizations of the same file need
+                                 different names. Defaults to ''.
+
+    Raises:
+        Exception: Any exception raised while parsing the GeoJSON file
+
+    Returns:
+        GeoDataFrame: The normalized frame
+    """
+    cacheFilename = get_cache_filename(geoFilename, variant)
+    if os.path.exists(cacheFilename):
+        try:
+            return _read_cache_file(cacheFilename)
+        except Exception as e:
+            print('Ignoring the cached geo data ' + cacheFilename + ': ' + str(e))
+    import geopandas as gpd
+    # parse the GeoJSON file
+    geoDf = gpd.read_file(geoFilename)
+    if normalize is not None:
+        geoDf = normalize(geoDf)
+    try:
+        _write_cache_file(geoDf, cacheFilename)
+    except Exception as e:
+        # the frame is fine even if it can't be cached
+        print('Unable to cache the geo data in ' + cacheFilename + ': ' + str(e))
+    return geoDf
+
+# the simplified topologies of this process by their cache key
+_topologies = {}
+
+def get_simplified_topology(geometries, tolerance, precision, dataDirectory):
+    """ Returns the topology of the geometries simplified with the tolerance and quantized to the precision. The 
+    topology is kept in memory and in the cache directory of the data directory, keyed by the hash of the geometries
+    and the parameters.
+
+    Args:
+        geometries (GeoSeries): The geometries in degrees
+        tolerance (float): The tolerance of the simplification in degrees, 0 to quantize only
+        precision (int): The number of decimal places of the coordinates, None for 6
+        dataDirectory (str): The data directory
+
+    Returns:
+        Topology: The simplified topology
+    """
+    import hashlib
+    import pickle
+    from Topology import Topology
+    if precision is None:
+        precision = 6
+    sha256 = hashlib.sha256()
+    for wkb in geometries.to_wkb():
+        sha256.update(b'' if wkb is None else wkb)
+    key = sha256.hexdigest()[:16] + '-' + str(float(tolerance)) + '-' + str(precision) + '-v' + str(CACHE_VERSION)
+    if key in _topologies:
+        return _topologies[key]
+    cacheFilename = os.path.join(dataDirectory, GEO_CACHE_DIRECTORY, 'topology-' + key + '.pkl')
+    topology = None
+    if os.path.exists(cacheFilename):
+        try:
+            with open(cacheFilename, 'rb') as f:
+                topology = pickle.load(f)
+            # it is used again
+            os.utime(cacheFilename)
+        except Exception as e:
+            print('Ignoring the cached topology ' + cacheFilename + ': ' + str(e))
+    if topology is None:
+        topology = Topology(geometries, precision)
+        topology.simplify(tolerance)
+        try:
+            os.makedirs(os.path.dirname(cacheFilename), exist_ok=True)
+            with open(cacheFilename + '.tmp', 'wb') as f:
+                pickle.dump(topology, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(cacheFilename + '.tmp', cacheFilename)
+        except Exception as e:
+            print('Unable to cache the topology in ' + cacheFilename + ': ' + str(e))
+        _remove_unused_topologies(os.path.dirname(cacheFilename), cacheFilename)
+    _topologies[key] = topology
+    return topology
+
+def _remove_unused_topologies(directory, keep, maxAge = TOPOLOGY_MAX_AGE):
+    """ Removes the cached topologies of a directory that have not been used for maxAge seconds, except keep
+    """
+    now = time.time()
+    for filename in glob.glob(os.path.join(glob.escape(directory), 'topology-*.pkl')):
+        try:
+            if filename != keep and now - os.path.getmtime(filename) > maxAge:
+                os.remove(filename)
+        except OSError:
+            pass
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """ A thread-safe cache holding a limited number of items. If the cache is full the least recently used item will
+    be dropped. The cache counts its hits and misses.
+    """
+    def __init__(self, maxSize = 128):
+        """ Constructor
+
+        Args:
+            maxSize (int, optional): The maximum number of items in the cache. Defaults to 128.
+        """
+        self.__lock = threading.Lock()
+        self.__maxSize = max(1, maxSize)
+        self.__items = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    def get(self, key, default = None):
+        """ Returns the item of the given key and marks it as recently used
+
+        Args:
+            key (hashable): The key of the item
+            default (any, optional): The value to be returned if the key isn't in the cache. Defaults to None.
+
+        Returns:
+            any: The item or the default
+        """
+        with self.__lock:
+            if key in self.__items:
+                self.__items.move_to_end(key)
+                self.__hits += 1
+                return self.__items[key]
+            self.__misses += 1
+            return default
+
+    def put(self, key, value):
+        """ Adds or replaces an item
+
+        Args:
+            key (hashable): The key of the item
+            value (any): The item
+        """
+        with self.__lock:
+            self.__items[key] = value
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.__maxSize:
+                self.__items.popitem(last=False)
+
+    def clear(self):
+        """ Removes all items, the counters will be kept
+        """
+        with self.__lock:
+            self.__items.clear()
+
+    def get_stats(self):
+        """ Returns the counters of the cache
+
+        Returns:
+            dict: The number of hits, misses and items and the hit ratio (None if there haven't been any requests)
+        """
+        with self.__lock:
+            requests = self.__hits + self.__misses
+            return {'hits': self.__hits,
+                    'misses': self.__misses,
+                    'size': len(self.__items),
+                    'hit_ratio': self.__hits / requests if requests > 0 else None}
@@ -0,0 +1,492 @@
+import os
+import re
+import glob
+import time
+import json
+import hashlib
+from jinja2 import Template
+from branca.element import MacroElement, JavascriptLink
+from branca.utilities import color_brewer
+
+""" Choropleth layers that join the geometry and the data in the browser, so that several layers share one geometry.
+    The geometry and the data are embedded into the map or written as static assets. The geometry asset is written once
+    and versioned, so it can be cached forever, the data of the day is written as a small JSON asset. The HTML file
+    references the assets relative to its own location (assets/...), so the map has to be served by a web server such
+    as the REST-API, browsers don't load the assets of a local file.
+"""
+
+# the sub directory of the data directory holding the assets
+ASSET_DIRECTORY = 'assets'
+# the number of data assets kept per map
+KEEP_DATA_ASSETS = 7
+# the seconds a geometry asset is kept after its last use, geometry assets are shared by the maps of the same 
+# geometry, so they are removed by age instead of by number
+GEOMETRY_ASSET_MAX_AGE = 7 * 24 * 3600
+# the TopoJSON client library, the same as used by folium
+TOPOJSON_URL = 'https://cdnjs.cloudflare.com/ajax/libs/topojson/1.6.9/topojson.min.js'
+
+def write_asset(dataDirectory, name, content, keep = None, maxAge = None):
+    """ Writes an asset named by the hash of its content unless it exists already
+
+    Args:
+        dataDirectory (str): The data directory
+        name (str): The name of the asset, the hash and '.json' will be appended
+        content (str): The JSON content
+        keep (int, optional): The number of assets of the same name to keep, the older ones will be removed. Defaults
+                              to None to keep all.
+        maxAge (float, optional): The seconds an asset of the same name is kept after its last use, the older ones 
+                                  will be removed. Defaults to None to keep all.
+
+    Returns:
+        str: The URL of the asset relative to the data directory
+    """
+    data = content.encode('utf-8')
+    filename = name + '-' + hashlib.sha256(data).hexdigest()[:16] + '.json'
+    directory = os.path.join(dataDirectory, ASSET_DIRECTORY)
+    targetFilename = os.path.join(directory, filename)
+    if not os.path.exists(targetFilename):
+        os.makedirs(directory, exist_ok=True)
+        with open(targetFilename + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(targetFilename + '.tmp', targetFilename)
+    else:
+        # it is used again
+        os.utime(targetFilename)
+    if keep is not None or maxAge is not None:
+        assets = sorted(glob.glob(os.path.join(glob.escape(directory), glob.escape(name) + '-' + '?' * 16 + '.json')),
+                        key=os.path.getmtime, reverse=True)
+        now = time.time()
+        for index, asset in enumerate(assets):
+            try:
+                if (keep is not None and index >= keep) or \
+                   (maxAge is not None and asset != targetFilename and now - os.path.getmtime(asset) > maxAge):
+                    os.remove(asset)
+            except OSError:
+                pass
+    return ASSET_DIRECTORY + '/' + filename
+
+def find_asset_urls(html):
+    """ Returns the URLs of the assets referenced by the HTML of a map
+
+    Args:
+        html (str): The HTML of the map
+
+    Returns:
+        list: The sorted URLs of the assets relative to the data directory
+    """
+    return sorted(set(re.findall(re.escape(ASSET_DIRECTORY) + r'/[\w.-]+-[0-9a-f]{16}\.json', html)))
+
+def to_script(value):
+    """ Returns the JSON of a value that can be embedded into a script element
+
+    Args:
+        value (any): The value, a string is expected to be a JSON document already
+
+    Returns:
+        str: The JSON
+    """
+    text = value if isinstance(value, str) else json.dumps(value, separators=(',', ':'))
+    return text.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+class LayeredChoropleth(MacroElement):
+    """ Choropleth layers sharing one geometry (GeoJSON or TopoJSON), one per colored attribute, that can be switched
+    by a layer control. The geometry and the data records are embedded or loaded from URLs. The records are joined to
+    the features on the merge UID, the features are colored by the bins of the attribute of the layer and show the
+    tooltip attributes when hovering. A legend shows the bins of the visible layer. The legend is a control of its
+    own, not a branca StepColormap as used by folium's Choropleth: the script of a branca colormap draws into the 
+    first legend control of the page, so the legend of several colormaps can't follow the visible layer. The colors
+    of the bins are the same 'YlOrRd' colors as the ones of folium's Choropleth.
+    """
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var uid = {{ this.mergeUID|tojson }};
+                var layers = {{ this.layers|tojson }};
+                var fields = {{ this.tooltipAttributes|tojson }};
+                var map = {{ this._parent.get_name() }};
+                function load(source) {
+                    if (typeof source === 'string') {
+                        return fetch(source).then(function(response) { return response.json(); });
+                    }
+                    return Promise.resolve(source);
+                }
+                function getColor(layer, value) {
+                    if (value === null || value === undefined || isNaN(value)) {
+                        return {{ this.nanColor|tojson }};
+                    }
+                    var index = 0;
+                    while (index < layer.colors.length - 1 && value >= layer.bins[index + 1]) {
+                        index++;
+                    }
+                    return layer.colors[index];
+                }
+                function format(value) {
+                    if (value === null || value === undefined) {
+                        return '';
+                    }
+                    value = (typeof value === 'number') ? value.toLocaleString() : String(value);
+                    return value.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+                }
+                function getTooltip(properties) {
+                    var rows = fields.map(function(field) {
+                        return '<tr><th>' + field + '</th><td>' + format(properties[field]) + '</td></tr>';
+                    });
+                    return '<table>' + rows.join('') + '</table>';
+                }
+                var legend = L.control({position: 'bottomright'});
+                legend.onAdd = function() {
+                    this._div = L.DomUtil.create('div', 'legend');
+                    this._div.style.cssText = 'background: white; padding: 6px 8px; font: 12px sans-serif; opacity: 0.9';
+                    return this._div;
+                };
+                legend.update = function(layer) {
+                    var rows = layer.colors.map(function(color, index) {
+                        return '<div><i style="display: inline-block; width: 18px; height: 12px; margin-right: 6px; ' +
+                               'opacity: {{ this.fillOpacity }}; background: ' + color + '"></i>' + 
+                               format(layer.bins[index]) + ' &ndash; ' + format(layer.bins[index + 1]) + '</div>';
+                    });
+                    this._div.innerHTML = '<b>' + format(layer.name) + '</b>' + rows.join('');
+                };
+                Promise.all([load({{ this.geometry }}), load({{ this.data }})]).then(function(results) {
+                    var geometry = results[0];
+                    if (geometry.type === 'Topology') {
+                        geometry = topojson.feature(geometry, geometry.objects.features);
+                    }
+                    var records = {};
+                    results[1].forEach(function(record) { records[record[uid]] = record; });
+                    geometry.features.forEach(function(feature) {
+                        Object.assign(feature.properties, records[feature.properties[uid]] || {});
+                    });
+                    var baseLayers = {};
+                    layers.forEach(function(options, index) {
+                        var layer = L.geoJson(geometry, {
+                            style: function(feature) {
+                                return {fillColor: getColor(options, feature.properties[options.attribute]), 
+                                        fillOpacity: {{ this.fillOpacity }}, color: 'black', weight: 1, 
+                                        opacity: {{ this.lineOpacity }}};
+                            },
+                            onEachFeature: function(feature, featureLayer) {
+                                featureLayer.bindTooltip(getTooltip(feature.properties), {sticky: true});
+                                featureLayer.on({
+                                    mouseover: function(e) { e.target.setStyle({weight: 3, fillOpacity: {{ this.fillOpacity }} + 0.2}); },
+                                    mouseout: function(e) { layer.resetStyle(e.target); }
+                                });
+                            }
+                        });
+                        layer.layerOptions = options;
+                        baseLayers[options.name] = layer;
+                        if (index === 0) {
+                            layer.addTo(map);
+                        }
+                    });
+                    legend.addTo(map);
+                    legend.update(layers[0]);
+                    if (layers.length > 1) {
+                        L.control.layers(baseLayers, {}, {collapsed: false}).addTo(map);
+                        map.on('baselayerchange', function(e) {
+                            if (e.layer.layerOptions) {
+                                legend.update(e.layer.layerOptions);
+                            }
+                        });
+                    }
+                });
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, geometry, data, mergeUID, layers, tooltipAttributes,
+                 nanColor = '#f5f5f3', fillOpacity = 0.4, lineOpacity = 0.4):
+        """ Constructor
+
+        Args:
+            geometry (str): The JSON of the URL of the geometry or the JSON of the geometry itself, a GeoJSON or a 
+                            TopoJSON with the object 'features'
+            data (str): The JSON of the URL of the data or the JSON of the data itself, a list of records
+            mergeUID (str): The name of the property joining the features and the records
+            layers (list): The layers, dictionaries holding the name, the attribute, the bins and the colors of the
+                           bins
+            tooltipAttributes (list): The attributes shown when hovering
+            nanColor (str, optional): The color of features without a value. Defaults to '#f5f5f3'.
+            fillOpacity (float, optional): The opacity of the features. Defaults to 0.4.
+            lineOpacity (float, optional): The opacity of the borders. Defaults to 0.4.
+        """
+        super().__init__()
+        self._name = 'LayeredChoropleth'
+        self.geometry = geometry
+        self.data = data
+        self.mergeUID = mergeUID
+        self.layers = layers
+        self.tooltipAttributes = tooltipAttributes
+        self.nanColor = nanColor
+        self.fillOpacity = fillOpacity
+        self.lineOpacity = lineOpacity
+
+def add_layered_choropleth(map, geoDf, dataDf, mergeUID, coloredAttributes, coloredAttributeAliases, bins,
+                           tooltipAttributes, topology = None, dataDirectory = None, mapAlias = None):
+    """ Adds choropleth layers sharing one geometry, one for each colored attribute, to the map. The geometry and
+    the data are embedded into the map unless a data directory is given to write them as assets.
+
+    Args:
+        map (folium.Map): The map
+        geoDf (GeoDataFrame): The geometry and the merge UID of the features
+        dataDf (DataFrame): The data with the merge UID, the colored and the tooltip attributes
+        mergeUID (str): The name of the merge UID
+        coloredAttributes (list): The attributes to be colored, one per layer
+        coloredAttributeAliases (list): The names of the layers
+        bins (list): The edges of the bins of each layer
+        tooltipAttributes (list): The attributes shown when hovering
+        topology (Topology, optional): The topology of the geometry to write it as TopoJSON. Defaults to None to
+                                       write GeoJSON.
+        dataDirectory (str, optional): The data directory to write the assets to its assets sub directory. Defaults
+                                       to None to embed the geometry and the data.
+        mapAlias (str, optional): The alias of the map naming the data assets, required with a data directory. 
+                                  Defaults to None.
+
+    Raises:
+        ValueError: If a data directory is given without the alias of the map
+
+    Returns:
+        LayeredChoropleth: The layers
+    """
+    if dataDirectory is not None and not mapAlias:
+        raise ValueError('The alias of the map is required to write the data assets')
+    # the geometry is the same every day and shared by all layers and by all maps using it
+    if topology is not None:
+        properties = [{mergeUID: value} for value in geoDf[mergeUID].tolist()]
+        geometry = json.dumps(topology.to_topojson(properties, 'features'), separators=(',', ':'))
+        map.get_root().header.add_child(JavascriptLink(TOPOJSON_URL), name='topojson')
+    else:
+        geometry = geoDf[[mergeUID, geoDf.geometry.name]].to_json(drop_id=True, separators=(',', ':'))
+    # the data of the day
+    columns = list(dict.fromkeys([mergeUID] + tooltipAttributes + coloredAttributes))
+    data = dataDf[columns].to_json(orient='records')
+    if dataDirectory is not None:
+        geometry = json.dumps(write_asset(dataDirectory, 'geometry', geometry, maxAge=GEOMETRY_ASSET_MAX_AGE))
+        data = json.dumps(write_asset(dataDirectory, mapAlias + '-data', data, KEEP_DATA_ASSETS))
+    layers = [{'name': alias, 
+               'attribute': attribute, 
+               'bins': [float(x) for x in layerBins], 
+               'colors': color_brewer('YlOrRd', n=len(layerBins) - 1)}
+              for attribute, alias, layerBins in zip(coloredAttributes, coloredAttributeAliases, bins)]
+    choropleth = LayeredChoropleth(to_script(geometry), to_script(data), mergeUID, layers, tooltipAttributes)
+    choropleth.add_to(map)
+    return choropleth
+
+class TimeSliderChoropleth(MacroElement):
+    """ A choropleth of one attribute over a range of dates with a slider to select the date and a button to play the
+    dates. The geometry (GeoJSON or TopoJSON) is loaded once, the values are a matrix of one row per date and one 
+    column per merge UID, so switching the date only recolors the features. The legend is the same control as the 
+    one of the LayeredChoropleth.
+    """
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var uid = {{ this.mergeUID|tojson }};
+                var bins = {{ this.bins|tojson }};
+                var colors = {{ this.colors|tojson }};
+                var map = {{ this._parent.get_name() }};
+                function load(source) {
+                    if (typeof source === 'string') {
+                        return fetch(source).then(function(response) { return response.json(); });
+                    }
+                    return Promise.resolve(source);
+                }
+                function getColor(value) {
+                    if (value === null || value === undefined || isNaN(value)) {
+                        return {{ this.nanColor|tojson }};
+                    }
+                    var index = 0;
+                    while (index < colors.length - 1 && value >= bins[index + 1]) {
+                        index++;
+                    }
+                    return colors[index];
+                }
+                function format(value) {
+                    if (value === null || value === undefined) {
+                        return '';
+                    }
+                    value = (typeof value === 'number') ? value.toLocaleString() : String(value);
+                    return value.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+                }
+                var legend = L.control({position: 'bottomright'});
+                legend.onAdd = function() {
+                    var div = L.DomUtil.create('div', 'legend');
+                    div.style.cssText = 'background: white; padding: 6px 8px; font: 12px sans-serif; opacity: 0.9';
+                    var rows = colors.map(function(color, index) {
+                        return '<div><i style="display: inline-block; width: 18px; height: 12px; margin-right: 6px; ' +
+                               'opacity: {{ this.fillOpacity }}; background: ' + color + '"></i>' + 
+                               format(bins[index]) + ' &ndash; ' + format(bins[index + 1]) + '</div>';
+                    });
+                    div.innerHTML = '<b>' + format({{ this.name|tojson }}) + '</b>' + rows.join('');
+                    return div;
+                };
+                Promise.all([load({{ this.geometry }}), load({{ this.series }})]).then(function(results) {
+                    var geometry = results[0];
+                    var series = results[1];
+                    if (geometry.type === 'Topology') {
+                        geometry = topojson.feature(geometry, geometry.objects.features);
+                    }
+                    // the column of each merge UID in the rows of the dates
+                    var columns = {};
+                    series.columns.forEach(function(id, index) { columns[id] = index; });
+                    var step = series.index.length - 1;
+                    function getValue(feature) {
+                        var column = columns[feature.properties[uid]];
+                        return (column === undefined) ? null : series.data[step][column];
+                    }
+                    function style(feature) {
+                        return {fillColor: getColor(getValue(feature)), fillOpacity: {{ this.fillOpacity }}, 
+                                color: 'black', weight: 1, opacity: {{ this.lineOpacity }}};
+                    }
+                    var layer = L.geoJson(geometry, {
+                        style: style,
+                        onEachFeature: function(feature, featureLayer) {
+                            featureLayer.bindTooltip(function() {
+                                var name = feature.properties[{{ this.nameAttribute|tojson }}];
+                                return '<b>' + format((name === undefined || name === null) ? feature.properties[uid] : name) + '</b><br>' + 
+                                       format(series.index[step]) + ': ' + format(getValue(feature));
+                            }, {sticky: true});
+                            featureLayer.on({
+                                mouseover: function(e) { e.target.setStyle({weight: 3, fillOpacity: {{ this.fillOpacity }} + 0.2}); },
+                                mouseout: function(e) { layer.resetStyle(e.target); }
+                            });
+                        }
+                    }).addTo(map);
+                    legend.addTo(map);
+                    var slider = L.control({position: 'topright'});
+                    slider.onAdd = function() {
+                        var div = L.DomUtil.create('div', 'time-slider');
+                        div.style.cssText = 'background: white; padding: 6px 8px; font: 12px sans-serif; opacity: 0.9';
+                        var button = L.DomUtil.create('button', '', div);
+                        var input = L.DomUtil.create('input', '', div);
+                        var label = L.DomUtil.create('span', '', div);
+                        button.textContent = 'Play';
+                        input.type = 'range';
+                        input.min = 0;
+                        input.max = series.index.length - 1;
+                        input.value = step;
+                        label.textContent = series.index[step];
+                        function show(index) {
+                            step = index;
+                            input.value = index;
+                            label.textContent = series.index[index];
+                            layer.setStyle(style);
+                        }
+                        input.addEventListener('input', function() { show(parseInt(input.value, 10)); });
+                        var timer = null;
+                        button.addEventListener('click', function() {
+                            if (timer !== null) {
+                                clearInterval(timer);
+                                timer = null;
+                                button.textContent = 'Play';
+                                return;
+                            }
+                            button.textContent = 'Pause';
+                            timer = setInterval(function() { show((step + 1) % series.index.length); }, 
+                                                {{ this.interval }});
+                        });
+                        L.DomEvent.disableClickPropagation(div);
+                        return div;
+                    };
+                    slider.addTo(map);
+                });
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, geometry, series, mergeUID, name, bins, colors, nameAttribute = 'GeoName', 
+                 nanColor = '#f5f5f3', fillOpacity = 0.4, lineOpacity = 0.4, interval = 250):
+        """ Constructor
+
+        Args:
+            geometry (str): The JSON of the URL of the geometry or the JSON of the geometry itself, a GeoJSON or a 
+                            TopoJSON with the object 'features'
+            series (str): The JSON of the URL of the values or the JSON of the values itself, an object with the 
+                          dates (index), the merge UIDs (columns) and a row of values per date (data)
+            mergeUID (str): The name of the property joining the features and the columns of the values
+            name (str): The name of the attribute shown in the legend
+            bins (list): The edges of the bins
+            colors (list): The colors of the bins
+            nameAttribute (str, optional): The property shown as the name of a feature when hovering. Defaults to 
+                                           'GeoName'.
+            nanColor (str, optional): The color of features without a value. Defaults to '#f5f5f3'.
+            fillOpacity (float, optional): The opacity of the features. Defaults to 0.4.
+            lineOpacity (float, optional): The opacity of the borders. Defaults to 0.4.
+            interval (int, optional): The milliseconds per date when playing the dates. Defaults to 250.
+        """
+        super().__init__()
+        self._name = 'TimeSliderChoropleth'
+        self.geometry = geometry
+        self.series = series
+        self.mergeUID = mergeUID
+        self.name = name
+        self.bins = bins
+        self.colors = colors
+        self.nameAttribute = nameAttribute
+        self.nanColor = nanColor
+        self.fillOpacity = fillOpacity
+        self.lineOpacity = lineOpacity
+        self.interval = interval
+
+def get_time_series_json(dfTimeSeries, decimals = 1):
+    """ Returns the JSON of the values of a time series as used by the TimeSliderChoropleth
+
+    Args:
+        dfTimeSeries (DataFrame): The values indexed by the date with one column per merge UID
+        decimals (int, optional): The number of decimal places of the values. Defaults to 1.
+
+    Returns:
+        str: The JSON object with the dates (index), the merge UIDs (columns) and the rows of values (data)
+    """
+    import pandas as pd
+    df = dfTimeSeries.astype('float64').round(decimals)
+    # the dates without the time
+    df.index = pd.DatetimeIndex(df.index).strftime('%Y-%m-%d')
+    df.columns = [str(column) for column in df.columns]
+    # missing values become null
+    return df.to_json(orient='split', double_precision=max(decimals, 1))
+
+def add_time_slider_choropleth(map, geoDf, dfTimeSeries, mergeUID, coloredAttributeAlias, bins, 
+                               nameAttribute = None, topology = None, dataDirectory = None, mapAlias = None):
+    """ Adds a choropleth with a time slider to the map. The geometry is embedded once and the values of all dates
+    are embedded as one matrix, unless a data directory is given to write them as assets.
+
+    Args:
+        map (folium.Map): The map
+        geoDf (GeoDataFrame): The geometry, the merge UID and the name of the features
+        dfTimeSeries (DataFrame): The values indexed by the date with one column per merge UID
+        mergeUID (str): The name of the merge UID
+        coloredAttributeAlias (str): The name shown in the legend
+        bins (list): The edges of the bins
+        nameAttribute (str, optional): The column of the geo df shown as the name when hovering. Defaults to None.
+        topology (Topology, optional): The topology of the geometry to write it as TopoJSON. Defaults to None to
+                                       write GeoJSON.
+        dataDirectory (str, optional): The data directory to write the assets to its assets sub directory. Defaults
+                                       to None to embed the geometry and the values.
+        mapAlias (str, optional): The alias of the map naming the data asset, required with a data directory. 
+                                  Defaults to None.
+
+    Raises:
+        ValueError: If a data directory is given without the alias of the map
+
+    Returns:
+        TimeSliderChoropleth: The choropleth
+    """
+    if dataDirectory is not None and not mapAlias:
+        raise ValueError('The alias of the map is required to write the data assets')
+    columns = [mergeUID] if nameAttribute is None else [mergeUID, nameAttribute]
+    if topology is not None:
+        properties = json.loads(geoDf[columns].to_json(orient='records'))
+        geometry = json.dumps(topology.to_topojson(properties, 'features'), separators=(',', ':'))
+        map.get_root().header.add_child(JavascriptLink(TOPOJSON_URL), name='topojson')
+    else:
+        geometry = geoDf[columns + [geoDf.geometry.name]].to_json(drop_id=True, separators=(',', ':'))
+    series = get_time_series_json(dfTimeSeries)
+    if dataDirectory is not None:
+        geometry = json.dumps(write_asset(dataDirectory, 'geometry', geometry, maxAge=GEOMETRY_ASSET_MAX_AGE))
+        series = json.dumps(write_asset(dataDirectory, mapAlias + '-series', series, KEEP_DATA_ASSETS))
+    choropleth = TimeSliderChoropleth(to_script(geometry), to_script(series), mergeUID, coloredAttributeAlias, 
+                                      [float(x) for x in bins], color_brewer('YlOrRd', n=len(bins) - 1),
+                                      nameAttribute)
+    choropleth.add_to(map)
+    return choropleth
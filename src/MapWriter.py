@@ -0,0 +1,288 @@
+import re
+import json
+import uuid
+import zlib
+from types import SimpleNamespace
+
+""" Writes folium maps without rendering them into one string. map.save renders the whole HTML, including the embedded
+    GeoJSON, into a string and encodes it again before writing, that takes several times the size of the map. Here the
+    large attributes of the elements (the GeoJSON of the choropleths, the geometry and the data of the layered maps) are
+    rendered as placeholders, the small rest of the HTML is rendered as usual and the attributes are serialized feature
+    by feature into the file or the response body, optionally compressed with gzip on the fly.
+    The placeholders depend on the templates of folium and branca. An element whose template doesn't render the
+    attributes the expected way, e.g. in another version of folium, is rendered as usual.
+"""
+
+# the size of the chunks written or yielded
+CHUNK_SIZE = 1 << 16
+# collections with more items are serialized item by item
+STREAM_THRESHOLD = 64
+
+def get_streamed_attributes(element):
+    """ Returns the large attributes of an element and how they are rendered by its template
+
+    Args:
+        element (Element): The element of the map
+
+    Returns:
+        dict: The rendering ('tojson' or 'raw') by the name of the attribute, empty if nothing is streamed
+    """
+    from folium.features import GeoJson, TopoJson
+    from MapAssets import LayeredChoropleth, TimeSliderChoropleth
+    if isinstance(element, (GeoJson, TopoJson)) and isinstance(element.data, (dict, list)):
+        return {'data': 'tojson'}
+    if isinstance(element, LayeredChoropleth):
+        return {'geometry': 'raw', 'data': 'raw'}
+    if isinstance(element, TimeSliderChoropleth):
+        return {'geometry': 'raw', 'series': 'raw'}
+    return {}
+
+def iter_json(value, sortKeys = False, depth = 0):
+    """ Yields the JSON of a value in chunks. Large lists and dictionaries near the top, such as the features of a
+    GeoJSON or the arcs of a TopoJSON, are serialized item by item, the items in one go. The result is the same as
+    json.dumps(value, sort_keys=sortKeys).
+
+    Args:
+        value (any): The value
+        sortKeys (bool, optional): True to sort the keys of the dictionaries. Defaults to False.
+        depth (int, optional): The depth of the value. Defaults to 0.
+
+    Yields:
+        str: The chunks of the JSON
+    """
+    encoder = json.JSONEncoder(sort_keys=sortKeys)
+    if depth > 3 or not isinstance(value, (dict, list)):
+        yield encoder.encode(value)
+        return
+    if isinstance(value, list):
+        if len(value) <= STREAM_THRESHOLD:
+            yield encoder.encode(value)
+            return
+        yield '['
+        for index, item in enumerate(value):
+            if index > 0:
+                yield ', '
+            yield from iter_json(item, sortKeys, depth + 1)
+        yield ']'
+        return
+    items = sorted(value.items()) if sortKeys else value.items()
+    yield '{'
+    for index, (key, item) in enumerate(items):
+        if index > 0:
+            yield ', '
+        yield encoder.encode(key) + ': '
+        yield from iter_json(item, sortKeys, depth + 1)
+    yield '}'
+
+def _iter_tojson(value, environment):
+    """ Yields the chunks of the tojson filter of jinja, the JSON escaped to be embedded into HTML
+    """
+    policies = environment.policies
+    kwargs = policies.get('json.dumps_kwargs') or {}
+    if policies.get('json.dumps_function') not in (None, json.dumps) or set(kwargs) - {'sort_keys'}:
+        # a custom serialization can't be streamed
+        chunks = [policies['json.dumps_function'](value, **kwargs)]
+    else:
+        chunks = iter_json(value, kwargs.get('sort_keys', False))
+    for chunk in chunks:
+        yield chunk.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026').replace("'", '\\u0027')
+
+def _iter_raw(value):
+    """ Yields the chunks of a string rendered as it is
+    """
+    for start in range(0, len(value), CHUNK_SIZE):
+        yield value[start:start + CHUNK_SIZE]
+
+class _StreamedTemplate:
+    """ The template of an element rendering placeholders instead of the large attributes of the element, the
+    placeholders are kept with the values to be streamed
+    """
+    def __init__(self, template, attributes, placeholders, prefix):
+        """ Constructor
+
+        Args:
+            template (Template): The template of the element
+            attributes (dict): The rendering of the attributes by their names
+            placeholders (dict): The placeholders found in the output and the rendering and the value of each
+            prefix (str): The prefix of the placeholders
+        """
+        self.__template = template
+        self.__attributes = attributes
+        self.__placeholders = placeholders
+        self.__prefix = prefix
+        self.module = SimpleNamespace(**{name: self.__wrap(macro) for name, macro in template.module.__dict__.items()
+                                         if name in ('header', 'html', 'script')})
+
+    def __wrap(self, macro):
+        """ Returns the macro rendering the placeholders
+        """
+        def render(this, kwargs):
+            values = {name: getattr(this, name) for name in self.__attributes}
+            try:
+                for name, rendering in self.__attributes.items():
+                    placeholder = self.__prefix + str(len(self.__placeholders))
+                    # the tojson filter quotes the placeholder string
+                    found = '"' + placeholder + '"' if rendering == 'tojson' else placeholder
+                    self.__placeholders[found] = (rendering, values[name], self.__template.environment)
+                    setattr(this, name, placeholder)
+                return macro(this, kwargs)
+            finally:
+                for name, value in values.items():
+                    setattr(this, name, value)
+        return render
+
+    def render(self, **kwargs):
+        """ Renders the template as it is
+        """
+        return self.__template.render(**kwargs)
+
+def _is_streamable(html, placeholders):
+    """ Returns True if the placeholders are rendered the expected way, the attributes rendered by tojson are quoted
+    strings and the raw attributes are not quoted
+    """
+    for found, (rendering, value, environment) in placeholders.items():
+        placeholder = found.strip('"')
+        quoted = html.count('"' + placeholder + '"')
+        if rendering == 'tojson':
+            if quoted != html.count(placeholder) or not isinstance(getattr(environment, 'policies', None), dict):
+                return False
+        elif quoted > 0:
+            return False
+    return True
+
+def _renders_placeholders(element, attributes, prefix):
+    """ Returns True if the macros of the template of an element render the placeholders of its attributes as 
+    expected. The macros are called with placeholders as a probe, that doesn't render the children of the element
+    """
+    template = getattr(element, '_template', None)
+    if not hasattr(template, 'module'):
+        # the element isn't rendered by the macros of a template
+        return False
+    macros = [macro for name, macro in template.module.__dict__.items() if name in ('header', 'html', 'script')]
+    values = {name: getattr(element, name) for name in attributes}
+    placeholders = {}
+    try:
+        for name, rendering in attributes.items():
+            placeholder = prefix + 'probe' + str(len(placeholders))
+            placeholders['"' + placeholder + '"' if rendering == 'tojson' else placeholder] = (rendering, None, 
+                                                                                               template.environment)
+            setattr(element, name, placeholder)
+        html = ''.join(str(macro(element, {})) for macro in macros)
+    except Exception:
+        return False
+    finally:
+        for name, value in values.items():
+            setattr(element, name, value)
+    return _is_streamable(html, placeholders)
+
+def render_with_placeholders(map):
+    """ Renders the HTML of a map with placeholders instead of the large attributes of its elements
+
+    Args:
+        map (folium.Map): The map
+
+    Returns:
+        tuple: The HTML and the placeholders found in it with the rendering, the value and the template environment
+               of each
+    """
+    root = map.get_root()
+    prefix = '__streamed_' + uuid.uuid4().hex + '_'
+    placeholders = {}
+    patched = []
+    # replace the templates of the elements having large attributes
+    elements = [root]
+    while len(elements) > 0:
+        element = elements.pop()
+        elements.extend(element._children.values())
+        attributes = get_streamed_attributes(element)
+        if len(attributes) > 0 and _renders_placeholders(element, attributes, prefix):
+            patched.append((element, element.__dict__.get('_template')))
+            element._template = _StreamedTemplate(element._template, attributes, placeholders, prefix)
+    try:
+        html = root.render()
+    finally:
+        for element, template in patched:
+            if template is None:
+                del element._template
+            else:
+                element._template = template
+    return html, placeholders
+
+def iter_map(map, compress = False):
+    """ Yields the HTML of a map in chunks, e.g. as the body of a streaming response
+
+    Args:
+        map (folium.Map): The map
+        compress (bool, optional): True to compress the HTML with gzip on the fly. Defaults to False.
+
+    Yields:
+        bytes: The chunks of the HTML or of the gzip stream
+    """
+    html, placeholders = render_with_placeholders(map)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    parts = re.split('(' + '|'.join(re.escape(found) for found in placeholders) + ')', html) if placeholders else [html]
+    html = None
+
+    def iter_text():
+        for part in parts:
+            if part in placeholders:
+                rendering, value, environment = placeholders[part]
+                yield from _iter_tojson(value, environment) if rendering == 'tojson' else _iter_raw(value)
+            else:
+                yield part
+    # collect the small chunks
+    buffer = []
+    bufferSize = 0
+    for text in iter_text():
+        buffer.append(text)
+        bufferSize += len(text)
+        if bufferSize >= CHUNK_SIZE:
+            data = ''.join(buffer).encode('utf-8')
+            buffer = []
+            bufferSize = 0
+            data = compressor.compress(data) if compressor is not None else data
+            if len(data) > 0:
+                yield data
+    data = ''.join(buffer).encode('utf-8')
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if len(data) > 0:
+        yield data
+
+def write_map(map, target, compress = False, traceMemory = False):
+    """ Writes the HTML of a map to a file without rendering it into one string
+
+    Args:
+        map (folium.Map): The map
+        target (str or file): The filename or a binary file object
+        compress (bool, optional): True to write a gzip file. Defaults to False.
+        traceMemory (bool, optional): True to trace the memory allocated while writing, that is slower. Defaults to
+                                      False.
+
+    Returns:
+        dict: The report with the number of bytes written (size) and the peak memory allocated while writing in
+              bytes (peakMemory) or None if the memory isn't traced
+    """
+    import tracemalloc
+    startTracing = traceMemory and not tracemalloc.is_tracing()
+    if startTracing:
+        tracemalloc.start()
+    if traceMemory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    size = 0
+    try:
+        if isinstance(target, str):
+            with open(target, 'wb') as f:
+                for data in iter_map(map, compress):
+                    f.write(data)
+                    size += len(data)
+        else:
+            for data in iter_map(map, compress):
+                target.write(data)
+                size += len(data)
+        peakMemory = tracemalloc.get_traced_memory()[1] - baseline if traceMemory else None
+    finally:
+        if startTracing:
+            tracemalloc.stop()
+    return {'size': size, 'peakMemory': peakMemory}
@@ -0,0 +1,220 @@
+import sys
+import threading
+from Tracing import LatencyHistogram, DEFAULT_BUCKETS
+
+""" Metrics in the Prometheus text exposition format (version 0.0.4) without the need of the prometheus_client package
+    or an external server. A MetricsRegistry holds a list of collectors, each of them being a function that returns
+    the text of one or more metric families built by the format_* functions of this module.
+"""
+
+# the content type of the Prometheus text format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def escape_label_value(value):
+    """ Escapes a label value as required by the Prometheus text format
+
+    Args:
+        value (any): The value of the label, it will be converted to a string
+
+    Returns:
+        str: The escaped value
+    """
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels):
+    """ Formats a dictionary of labels
+
+    Args:
+        labels (dict): The labels by name
+
+    Returns:
+        str: The labels in the form '{name="value",...}' or an empty string if there are no labels
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, escape_label_value(value)) for name, value in labels.items()) + '}'
+
+def format_value(value):
+    """ Formats a sample value
+
+    Args:
+        value (float): The value
+
+    Returns:
+        str: The value as a string, infinite values become '+Inf' or '-Inf'
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+def format_metric(name, help, metricType, samples):
+    """ Formats a counter or gauge metric family
+
+    Args:
+        name (str): The name of the metric such as 'covid_http_requests_total'
+        help (str): The help text
+        metricType (str): Either 'counter' or 'gauge'
+        samples (list): A list of (labels dict, value) tuples
+
+    Returns:
+        str: The metric family in the text format
+    """
+    lines = ['# HELP {} {}'.format(name, help), '# TYPE {} {}'.format(name, metricType)]
+    for labels, value in samples:
+        lines.append(name + format_labels(labels) + ' ' + format_value(value))
+    return '\n'.join(lines)
+
+def format_histogram(name, help, series):
+    """ Formats a histogram metric family
+
+    Args:
+        name (str): The name of the metric such as 'covid_http_request_duration_seconds'
+        help (str): The help text
+        series (list): A list of (labels dict, LatencyHistogram) tuples
+
+    Returns:
+        str: The metric family in the text format
+    """
+    lines = ['# HELP {} {}'.format(name, help), '# TYPE {} histogram'.format(name)]
+    for labels, histogram in series:
+        for bound, count in histogram.get_buckets():
+            bucketLabels = dict(labels)
+            bucketLabels['le'] = format_value(bound)
+            lines.append(name + '_bucket' + format_labels(bucketLabels) + ' ' + str(count))
+        lines.append(name + '_sum' + format_labels(labels) + ' ' + format_value(histogram.get_sum()))
+        lines.append(name + '_count' + format_labels(labels) + ' ' + str(histogram.get_count()))
+    return '\n'.join(lines)
+
+def get_process_rss_bytes():
+    """ Returns the resident set size of the current process
+
+    Returns:
+        int: The RSS in bytes or None if it can't be determined
+    """
+    try:
+        # Linux
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        # the peak RSS is the best we can get on other unix systems
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux kB
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except (ImportError, OSError):
+        return None
+
+class Counter:
+    """ A thread-safe counter with labels
+    """
+    def __init__(self, labelNames = ()):
+        """ Constructor
+
+        Args:
+            labelNames (tuple, optional): The names of the labels. Defaults to ().
+        """
+        self.__lock = threading.Lock()
+        self.__labelNames = tuple(labelNames)
+        self.__values = {}
+
+    def inc(self, labelValues = (), value = 1):
+        """ Increments the counter of the given label values
+
+        Args:
+            labelValues (tuple, optional): The values of the labels in the order of the label names. Defaults to ().
+            value (int, optional): The increment. Defaults to 1.
+        """
+        labelValues = tuple(labelValues)
+        with self.__lock:
+            self.__values[labelValues] = self.__values.get(labelValues, 0) + value
+
+    def get(self, labelValues = ()):
+        """ Returns the value of the counter of the given label values
+        """
+        with self.__lock:
+            return self.__values.get(tuple(labelValues), 0)
+
+    def get_samples(self):
+        """ Returns the samples of the counter
+
+        Returns:
+            list: A list of (labels dict, value) tuples
+        """
+        with self.__lock:
+            items = sorted(self.__values.items(), key=lambda item: [str(v) for v in item[0]])
+        return [(dict(zip(self.__labelNames, labelValues)), value) for labelValues, value in items]
+
+class Histogram:
+    """ A thread-safe latency histogram with labels
+    """
+    def __init__(self, labelNames = (), buckets = DEFAULT_BUCKETS):
+        """ Constructor
+
+        Args:
+            labelNames (tuple, optional): The names of the labels. Defaults to ().
+            buckets (tuple, optional): The upper bounds of the buckets in seconds. Defaults to DEFAULT_BUCKETS.
+        """
+        self.__lock = threading.Lock()
+        self.__labelNames = tuple(labelNames)
+        self.__buckets = buckets
+        self.__histograms = {}
+
+    def observe(self, seconds, labelValues = ()):
+        """ Adds a sample to the histogram of the given label values
+        """
+        labelValues = tuple(labelValues)
+        with self.__lock:
+            histogram = self.__histograms.get(labelValues)
+            if histogram is None:
+                histogram = LatencyHistogram(self.__buckets)
+                self.__histograms[labelValues] = histogram
+        histogram.observe(seconds)
+
+    def get_series(self):
+        """ Returns the series of the histogram
+
+        Returns:
+            list: A list of (labels dict, LatencyHistogram) tuples
+        """
+        with self.__lock:
+            items = sorted(self.__histograms.items(), key=lambda item: [str(v) for v in item[0]])
+        return [(dict(zip(self.__labelNames, labelValues)), histogram) for labelValues, histogram in items]
+
+class MetricsRegistry:
+    """ A list of collectors that together render all metrics in the Prometheus text format
+    """
+    def __init__(self):
+        """ Constructor
+        """
+        self.__lock = threading.Lock()
+        self.__collectors = []
+
+    def add_collector(self, collector):
+        """ Adds a collector
+
+        Args:
+            collector (callable): A function without arguments returning the text of one or more metric families
+        """
+        with self.__lock:
+            self.__collectors.append(collector)
+
+    def render(self):
+        """ Renders all metrics
+
+        Returns:
+            str: The metrics in the Prometheus text format
+        """
+        with self.__lock:
+            collectors = list(self.__collectors)
+        texts = [collector() for collector in collectors]
+        return '\n'.join(text for text in texts if text) + '\n'
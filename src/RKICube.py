@@ -0,0 +1,302 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+""" A time-resolved cube of the RKI Covid-19 cases: county x reporting date (Meldedatum) x age group x gender holding
+    int32 counts in a dense numpy array. The cube is built in one streaming pass over the RKI master file and stored
+    as a compressed npz file (one array per axis plus the counts). The master file of a day contains the changes to
+    the previous day (NeuerFall -1: removed, 1: new), so the cube of the previous day can be updated incrementally
+    instead of being rebuilt from scratch.
+"""
+
+# the age groups and genders of the RKI master file, other values are counted as 'unbekannt'
+AGES = ['A00-A04', 'A05-A14', 'A15-A34', 'A35-A59', 'A60-A79', 'A80+', 'unbekannt']
+GENDERS = ['M', 'W', 'unbekannt']
+# the columns of the RKI master file that are needed and their types
+COLUMN_TYPES = {'IdLandkreis': 'int32',
+                'Altersgruppe': 'category',
+                'Geschlecht': 'category',
+                'Meldedatum': 'str',
+                'AnzahlFall': 'int32',
+                'NeuerFall': 'int8'}
+
+def read_data_date(masterFilename):
+    """ Returns the date of the data (Datenstand) of a RKI master file
+
+    Args:
+        masterFilename (str): The RKI master file
+
+    Returns:
+        date: The date of the data
+    """
+    value = pd.read_csv(masterFilename, usecols=['Datenstand'], nrows=1)['Datenstand'].iloc[0]
+    # the format is '01.02.2022, 00:00 Uhr'
+    return datetime.strptime(str(value)[:10], '%d.%m.%Y').date()
+
+class RKICube:
+    """ The cube of the case counts by county, reporting date, age group and gender
+    """
+    def __init__(self, counts, counties, firstDay, dataDate = None):
+        """ Constructor
+
+        Args:
+            counts (ndarray): The int32 counts of the shape (counties, days, ages, genders)
+            counties (ndarray): The sorted IDs of the counties (IdLandkreis)
+            firstDay (datetime64[D]): The reporting date of the first day
+            dataDate (date, optional): The date of the data (Datenstand) of the last master file. Defaults to None.
+        """
+        self.__counts = counts
+        self.__counties = np.asarray(counties, dtype='int32')
+        self.__firstDay = np.datetime64(firstDay, 'D')
+        self.__dataDate = dataDate
+
+    @staticmethod
+    def __read_sums(masterFilename, flags, chunkSize):
+        """ Reads the master file in chunks and sums up the cases of the rows flagged with one of the flags by
+        county, reporting date, age group and gender
+
+        Returns:
+            Series: The sums indexed by IdLandkreis, day (days since 1970-01-01), age index and gender index
+        """
+        sums = None
+        groupColumns = ['IdLandkreis', 'Day', 'Age', 'Gender']
+        reader = pd.read_csv(masterFilename, usecols=list(COLUMN_TYPES.keys()), dtype=COLUMN_TYPES, chunksize=chunkSize)
+        for chunk in reader:
+            chunk = chunk[chunk['NeuerFall'].isin(flags)]
+            days = pd.to_datetime(chunk['Meldedatum'].str[:10].str.replace('/', '-'), format='%Y-%m-%d')
+            chunk = pd.DataFrame({'IdLandkreis': chunk['IdLandkreis'].to_numpy(),
+                                  'Day': days.to_numpy().astype('datetime64[D]').astype('int64'),
+                                  'Age': RKICube.__get_codes(chunk['Altersgruppe'], AGES),
+                                  'Gender': RKICube.__get_codes(chunk['Geschlecht'], GENDERS),
+                                  'AnzahlFall': chunk['AnzahlFall'].to_numpy()})
+            chunkSums = chunk.groupby(groupColumns)['AnzahlFall'].sum()
+            if sums is not None:
+                chunkSums = pd.concat([sums, chunkSums]).groupby(level=groupColumns).sum()
+            sums = chunkSums
+        return sums
+
+    @staticmethod
+    def __get_codes(column, values):
+        """ Returns the index of each value of the column in values, unknown values get the index of the last value
+        """
+        codes = pd.Categorical(column.astype(str), categories=values).codes.astype('int8')
+        codes[codes < 0] = len(values) - 1
+        return codes
+
+    @staticmethod
+    def build(masterFilename, chunkSize = 1000000):
+        """ Builds the cube of a RKI master file in one streaming pass. The current cases are the rows flagged with
+        NeuerFall 0 or 1.
+
+        Args:
+            masterFilename (str): The RKI master file
+            chunkSize (int, optional): The number of rows processed at once. Defaults to 1000000.
+
+        Returns:
+            RKICube: The cube
+        """
+        cube = RKICube(np.zeros((0, 0, len(AGES), len(GENDERS)), dtype='int32'), [], np.datetime64(0, 'D'))
+        cube.__add(RKICube.__read_sums(masterFilename, (0, 1), chunkSize))
+        cube.__dataDate = read_data_date(masterFilename)
+        return cube
+
+    def update(self, masterFilename, chunkSize = 1000000):
+        """ Applies the changes of the master file of the next day (the rows flagged with NeuerFall -1 or 1)
+
+        Args:
+            masterFilename (str): The RKI master file of the day after the data date of the cube
+            chunkSize (int, optional): The number of rows processed at once. Defaults to 1000000.
+
+        Raises:
+            ValueError: In case the master file is not the one of the next day
+        """
+        dataDate = read_data_date(masterFilename)
+        if (self.__dataDate is None) or (dataDate != self.__dataDate + timedelta(days=1)):
+            raise ValueError('The data of ' + str(dataDate) + ' is not the next day of the cube (' + str(self.__dataDate) + ')')
+        self.__add(RKICube.__read_sums(masterFilename, (-1, 1), chunkSize))
+        self.__dataDate = dataDate
+
+    def __add(self, sums):
+        """ Adds the sums to the counts, the axes of the counties and dates will be extended if necessary
+        """
+        if sums is None or len(sums) == 0:
+            return
+        counties = sums.index.get_level_values(0).to_numpy()
+        days = sums.index.get_level_values(1).to_numpy()
+        # extend the axes
+        allCounties = np.union1d(self.__counties, counties).astype('int32')
+        if self.__counts.shape[1] == 0:
+            firstDay, lastDay = days.min(), days.max()
+        else:
+            oldFirstDay = self.__firstDay.astype('int64')
+            firstDay = min(days.min(), oldFirstDay)
+            lastDay = max(days.max(), oldFirstDay + self.__counts.shape[1] - 1)
+        counts = np.zeros((len(allCounties), lastDay - firstDay + 1, len(AGES), len(GENDERS)), dtype='int32')
+        if self.__counts.size > 0:
+            offset = self.__firstDay.astype('int64') - firstDay
+            counts[np.searchsorted(allCounties, self.__counties), offset:offset + self.__counts.shape[1]] = self.__counts
+        np.add.at(counts,
+                  (np.searchsorted(allCounties, counties),
+                   days - firstDay,
+                   sums.index.get_level_values(2).to_numpy(),
+                   sums.index.get_level_values(3).to_numpy()),
+                  sums.to_numpy().astype('int32'))
+        self.__counts = counts
+        self.__counties = allCounties
+        self.__firstDay = np.datetime64(int(firstDay), 'D')
+
+    @staticmethod
+    def update_or_build(cubeFilename, masterFilename, chunkSize = 1000000):
+        """ Loads the cube of a file and updates it with the master file. If the cube doesn't exist or if it can't be
+        updated because days are missing it will be built from scratch. The result is saved to the cube file.
+
+        Args:
+            cubeFilename (str): The npz file of the cube
+            masterFilename (str): The RKI master file
+            chunkSize (int, optional): The number of rows processed at once. Defaults to 1000000.
+
+        Returns:
+            RKICube: The cube
+        """
+        cube = None
+        if os.path.exists(cubeFilename):
+            try:
+                cube = RKICube.load(cubeFilename)
+            except Exception as e:
+                print('Ignoring cube ' + cubeFilename + ': ' + str(e))
+        dataDate = read_data_date(masterFilename)
+        if cube is not None and cube.get_data_date() == dataDate:
+            return cube
+        if cube is not None and cube.get_data_date() is not None and cube.get_data_date() + timedelta(days=1) == dataDate:
+            print('Updating cube ' + cubeFilename + '...')
+            cube.update(masterFilename, chunkSize)
+        else:
+            print('Building cube ' + cubeFilename + ', that might take some time...')
+            cube = RKICube.build(masterFilename, chunkSize)
+        cube.save(cubeFilename)
+        return cube
+
+    def save(self, filename):
+        """ Saves the cube atomically as a compressed npz file
+
+        Args:
+            filename (str): The file, it should end with '.npz'
+        """
+        tmpFilename = filename + '.tmp.npz'
+        np.savez_compressed(tmpFilename,
+                            counts=self.__counts,
+                            counties=self.__counties,
+                            firstDay=np.array([self.__firstDay.astype('int64')]),
+                            dataDate=np.array([-1 if self.__dataDate is None else np.datetime64(self.__dataDate, 'D').astype('int64')]),
+                            ages=np.array(AGES),
+                            genders=np.array(GENDERS))
+        os.replace(tmpFilename, filename)
+
+    @staticmethod
+    def load(filename):
+        """ Loads a cube saved by save
+
+        Args:
+            filename (str): The npz file
+
+        Raises:
+            ValueError: In case the age groups or genders of the file don't match
+
+        Returns:
+            RKICube: The cube
+        """
+        with np.load(filename) as npz:
+            if list(npz['ages']) != AGES or list(npz['genders']) != GENDERS:
+                raise ValueError('The age groups or genders of ' + filename + ' do not match')
+            dataDate = int(npz['dataDate'][0])
+            return RKICube(npz['counts'],
+                           npz['counties'],
+                           np.datetime64(int(npz['firstDay'][0]), 'D'),
+                           None if dataDate < 0 else np.datetime64(dataDate, 'D').astype(object))
+
+    def get_data_date(self):
+        """ Returns the date of the data (Datenstand) of the last master file
+        """
+        return self.__dataDate
+
+    def get_counties(self):
+        """ Returns the IDs of the counties (IdLandkreis)
+        """
+        return self.__counties.copy()
+
+    def get_dates(self):
+        """ Returns the reporting dates as a DatetimeIndex
+        """
+        return pd.date_range(str(self.__firstDay), periods=self.__counts.shape[1], freq='D')
+
+    def get_counts(self):
+        """ Returns the counts of the shape (counties, days, ages, genders)
+        """
+        return self.__counts
+
+    def get_series(self, counties = None, state = None, ages = None, genders = None, lastDays = None):
+        """ Returns the daily cases of a slice of the cube summed over the selected counties, age groups and genders
+
+        Args:
+            counties (list, optional): The IDs of the counties (IdLandkreis). Defaults to None (all).
+            state (int, optional): The ID of a state (IdBundesland) to select its counties. Defaults to None.
+            ages (list, optional): The age groups such as ['A80+']. Defaults to None (all).
+            genders (list, optional): The genders such as ['W']. Defaults to None (all).
+            lastDays (int, optional): Only the last n days. Defaults to None (all).
+
+        Returns:
+            Series: The cases indexed by the reporting date
+        """
+        countyMask = np.ones(len(self.__counties), dtype=bool)
+        if counties is not None:
+            countyMask &= np.isin(self.__counties, counties)
+        if state is not None:
+            countyMask &= (self.__counties // 1000) == state
+        ageIndex = slice(None) if ages is None else [AGES.index(age) for age in ages]
+        genderIndex = slice(None) if genders is None else [GENDERS.index(gender) for gender in genders]
+        start = 0 if lastDays is None else max(0, self.__counts.shape[1] - lastDays)
+        counts = self.__counts[countyMask, start:][:, :, ageIndex][:, :, :, genderIndex]
+        values = counts.sum(axis=(0, 2, 3), dtype='int64')
+        return pd.Series(values, index=self.get_dates()[start:], name='Cases')
+
+    def get_frame(self, ages = None, genders = None, byState = False):
+        """ Returns the daily cases of the selected age groups and genders by county or by state
+
+        Args:
+            ages (list, optional): The age groups such as ['A80+']. Defaults to None (all).
+            genders (list, optional): The genders such as ['W']. Defaults to None (all).
+            byState (bool, optional): True to sum up the counties of each state (IdBundesland). Defaults to False.
+
+        Returns:
+            DataFrame: The cases indexed by the reporting date with one column per IdLandkreis or IdBundesland
+        """
+        ageIndex = slice(None) if ages is None else [AGES.index(age) for age in ages]
+        genderIndex = slice(None) if genders is None else [GENDERS.index(gender) for gender in genders]
+        # the cases of the shape (counties, days)
+        counts = self.__counts[:, :, ageIndex][:, :, :, genderIndex].sum(axis=(2, 3), dtype='int64')
+        df = pd.DataFrame(counts.T, index=self.get_dates(), columns=self.__counties)
+        if byState:
+            df = df.T.groupby(self.__counties // 1000).sum().T
+        return df
+
+    def get_incidence(self, population, days = 7, lastDays = None, **selection):
+        """ Returns the incidence (cases in the last days per 100.000 population) of a slice of the cube, e.g. the
+        7-day incidence of the age group 80+ in Bavaria over the last 90 days:
+            cube.get_incidence(population, state=9, ages=['A80+'], lastDays=90)
+
+        Args:
+            population (int): The population of the slice
+            days (int, optional): The number of days. Defaults to 7.
+            lastDays (int, optional): Only the last n days. Defaults to None (all).
+            selection: The selection of the slice, see get_series
+
+        Returns:
+            Series: The incidence indexed by the reporting date
+        """
+        # the days before the first returned day are needed for the rolling sum
+        series = self.get_series(lastDays=None if lastDays is None else lastDays + days - 1, **selection)
+        incidence = series.rolling(days, min_periods=1).sum() * 100000 / population
+        if lastDays is not None:
+            incidence = incidence.iloc[-lastDays:]
+        return incidence.rename('Incidence' + str(days) + 'DayPer100Kpopulation')
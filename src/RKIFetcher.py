@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from Downloader import get_session
+
+""" Fetches the data of German counties (districts) and states from the RKI Covid-19 API (https://api.corona-zahlen.org).
+    The bulk endpoints ('/districts', '/states') return all regions with a single request. If the bulk request fails
+    the regions are requested one by one by a thread pool with a bounded number of workers. All requests share the
+    pooled session of the Downloader and use a connect and a read timeout. Regions that can't be fetched are reported
+    instead of failing the whole download.
+"""
+
+# the base url of the API
+RKI_API = 'https://api.corona-zahlen.org'
+# the timeouts in seconds to establish a connection and to wait for data
+DEFAULT_TIMEOUT = (3.05, 10.0)
+# the maximum number of requests in flight
+DEFAULT_WORKERS = 8
+
+def get_json(endpoint, timeout = DEFAULT_TIMEOUT):
+    """ Requests a JSON document of the API
+
+    Args:
+        endpoint (str): The full url
+        timeout (tuple, optional): The connect and read timeouts in seconds. Defaults to DEFAULT_TIMEOUT.
+
+    Raises:
+        requests.HTTPError: In case the server doesn't answer with 200
+        ValueError: In case the data is empty
+
+    Returns:
+        dict: The 'data' object of the response, the data of each region by its ID
+    """
+    res = get_session().get(endpoint, timeout=timeout)
+    res.raise_for_status()
+    data = res.json().get('data')
+    if not bool(data):
+        raise ValueError('Empty response from ' + endpoint + '!')
+    return data
+
+def fetch_concurrently(ids, fetch, maxWorkers = DEFAULT_WORKERS):
+    """ Calls fetch for every ID using a thread pool
+
+    Args:
+        ids (list): The IDs
+        fetch (callable): A function taking an ID and returning its result
+        maxWorkers (int, optional): The maximum number of concurrent calls. Defaults to DEFAULT_WORKERS.
+
+    Returns:
+        tuple: A dictionary of the results by ID and a dictionary of the error messages by ID of the failed calls
+    """
+    results = {}
+    failures = {}
+    if len(ids) == 0:
+        return results, failures
+    with ThreadPoolExecutor(max_workers=max(1, min(maxWorkers, len(ids)))) as executor:
+        futures = {id: executor.submit(fetch, id) for id in ids}
+        for id, future in futures.items():
+            try:
+                results[id] = future.result()
+            except Exception as e:
+                failures[id] = str(e)
+    return results, failures
+
+def fetch_regions(kind, ids, baseUrl = RKI_API, useBulk = True, maxWorkers = DEFAULT_WORKERS, timeout = DEFAULT_TIMEOUT):
+    """ Fetches the data of the given regions
+
+    Args:
+        kind (str): Either 'districts' or 'states'
+        ids (list): The IDs of the regions such as '01001' for districts or 'SH' for states
+        baseUrl (str, optional): The base url of the API. Defaults to RKI_API.
+        useBulk (bool, optional): Try the bulk endpoint first. Defaults to True.
+        maxWorkers (int, optional): The maximum number of concurrent requests. Defaults to DEFAULT_WORKERS.
+        timeout (tuple, optional): The connect and read timeouts in seconds. Defaults to DEFAULT_TIMEOUT.
+
+    Returns:
+        tuple: A list of the data of the regions (dictionaries in the order of the IDs) and a dictionary of the error
+               messages by ID of the regions that couldn't be fetched
+    """
+    ids = [str(id) for id in ids]
+    if useBulk:
+        try:
+            data = get_json(baseUrl + '/' + kind, timeout)
+            records = [data[id] for id in ids if id in data]
+            failures = {id: 'missing in the bulk response' for id in ids if id not in data}
+            return records, failures
+        except Exception as e:
+            print('Bulk request of ' + kind + ' failed, requesting them one by one: ' + str(e))
+    def fetch(id):
+        # the response holds one region
+        return list(get_json(baseUrl + '/' + kind + '/' + id, timeout).values())[0]
+    results, failures = fetch_concurrently(ids, fetch, maxWorkers)
+    return [results[id] for id in ids if id in results], failures
+
+def fetch_districts(ids, **kwargs):
+    """ Fetches the data of German counties (districts), see fetch_regions
+    """
+    return fetch_regions('districts', ids, **kwargs)
+
+def fetch_states(ids, **kwargs):
+    """ Fetches the data of German states, see fetch_regions
+    """
+    return fetch_regions('states', ids, **kwargs)
+
+def report_failures(failures):
+    """ Prints the regions that couldn't be fetched
+
+    Args:
+        failures (dict): The error messages by ID
+    """
+    for id, msg in failures.items():
+        print('Error getting the data for ' + str(id) + '! ' + msg)
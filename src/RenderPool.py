@@ -0,0 +1,56 @@
+import threading
+
+class RenderPool:
+    """ Limits the number of threads rendering at the same time. matplotlib's pyplot keeps global state and is not
+    thread-safe, so by default only one plot will be drawn at the same time. The pool counts the threads that are
+    waiting for a free slot (the queue depth) and the threads that are rendering.
+    Use it as a context manager:
+        with pool:
+            draw()
+    """
+    def __init__(self, size = 1):
+        """ Constructor
+
+        Args:
+            size (int, optional): The number of threads allowed to render at the same time. Defaults to 1.
+        """
+        self.__size = max(1, size)
+        self.__slots = threading.BoundedSemaphore(self.__size)
+        self.__lock = threading.Lock()
+        self.__waiting = 0
+        self.__active = 0
+
+    def __enter__(self):
+        with self.__lock:
+            self.__waiting += 1
+        try:
+            self.__slots.acquire()
+        finally:
+            with self.__lock:
+                self.__waiting -= 1
+        with self.__lock:
+            self.__active += 1
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        with self.__lock:
+            self.__active -= 1
+        self.__slots.release()
+        return False
+
+    def get_size(self):
+        """ Returns the number of slots of the pool
+        """
+        return self.__size
+
+    def get_queue_depth(self):
+        """ Returns the number of threads waiting for a free slot
+        """
+        with self.__lock:
+            return self.__waiting
+
+    def get_active(self):
+        """ Returns the number of threads rendering right now
+        """
+        with self.__lock:
+            return self.__active
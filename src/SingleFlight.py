@@ -0,0 +1,106 @@
+import threading
+
+class _Call:
+    """ somehow a struct holding the state of one in-flight computation
+    """
+    def __init__(self):
+        # set as soon as the computation has finished
+        self.event = threading.Event()
+        # the result of the computation
+        self.result = None
+        # the exception raised by the computation
+        self.error = None
+        # the number of callers waiting for this computation
+        self.waiters = 0
+
+class SingleFlight:
+    """ A class that coalesces concurrent calls sharing the same key. The first caller (the leader) runs the
+    computation, every other caller that arrives with the same key while the computation is in flight waits
+    for it and receives the same result (or the same exception). Once the computation has finished the key is
+    released, so the next call will run the computation again. The class is thread-safe and counts the number
+    of unique and coalesced computations.
+    """
+    def __init__(self):
+        """ Constructor
+        """
+        # protects the in-flight calls and the counters
+        self.__lock = threading.Lock()
+        # the in-flight calls by key
+        self.__calls = {}
+        # the number of computations that really have been executed
+        self.__unique = 0
+        # the number of calls that have been served by an in-flight computation
+        self.__coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """ Runs fn(*args, **kwargs) unless a computation for the same key is already in flight. In that case
+        the call waits for the in-flight computation and returns its result.
+
+        Args:
+            key (hashable): The normalized key of the computation
+            fn (callable): The computation to be executed
+
+        Raises:
+            Exception: Any exception raised by the computation, re-raised for every waiting caller
+
+        Returns:
+            any: The result of the computation
+        """
+        return self.execute(key, fn, *args, **kwargs)[0]
+
+    def execute(self, key, fn, *args, **kwargs):
+        """ Same as do, but it also tells the caller whether the result has been shared with another caller.
+
+        Args:
+            key (hashable): The normalized key of the computation
+            fn (callable): The computation to be executed
+
+        Raises:
+            Exception: Any exception raised by the computation, re-raised for every waiting caller
+
+        Returns:
+            tuple: The result of the computation and True if the call has been coalesced with an in-flight 
+                   computation
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            if call is None:
+                # we are the leader
+                call = _Call()
+                self.__calls[key] = call
+                self.__unique += 1
+                leader = True
+            else:
+                # someone else computes it already
+                call.waiters += 1
+                self.__coalesced += 1
+                leader = False
+        if not leader:
+            # wait for the leader and share its result
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # release the key before waking up the waiting callers
+            with self.__lock:
+                del self.__calls[key]
+            call.event.set()
+        return call.result, False
+
+    def get_stats(self):
+        """ Returns the counters of the object
+
+        Returns:
+            dict: A dictionary holding the number of unique and coalesced computations and the number of
+                  computations that are in flight right now
+        """
+        with self.__lock:
+            return {'unique': self.__unique,
+                    'coalesced': self.__coalesced,
+                    'inflight': len(self.__calls)}
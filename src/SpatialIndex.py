@@ -0,0 +1,113 @@
+import math
+import threading
+import numpy as np
+
+""" A spatial index of the regions of several levels, e.g. the countries of the world, the German states and the
+    German counties. Each level keeps its polygons in an STRtree, so finding the regions containing a point tests only
+    the few polygons whose bounding box contains it. A batch of points is located by one query per level.
+"""
+
+def _get_clean_value(value):
+    """ Returns a value that can be serialized to JSON, NaN is None and numpy scalars are Python scalars
+    """
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class SpatialIndex:
+    """ The regions of several levels and their properties, indexed for point lookups. The levels are built once
+    and shared by all requests, the lookups are thread-safe.
+    """
+    def __init__(self):
+        """ Constructor
+        """
+        self.__lock = threading.Lock()
+        # the tree, the geometries and the properties by the name of the level
+        self.__levels = {}
+
+    def add_level(self, name, geometries, properties):
+        """ Adds a level of regions, a level of the same name is replaced
+
+        Args:
+            name (str): The name of the level, e.g. 'countries'
+            geometries (GeoSeries): The polygons in longitude/latitude (EPSG:4326)
+            properties (list): The properties of each polygon as a dictionary
+        """
+        import shapely
+        # a copy, preparing the geometries must not change the ones of the caller, e.g. of the shared geo cache
+        geometries = shapely.from_wkb(shapely.to_wkb(np.asarray(geometries, dtype=object)))
+        if len(geometries) != len(properties):
+            raise ValueError('The level ' + name + ' has ' + str(len(geometries)) + ' geometries but ' +
+                             str(len(properties)) + ' properties')
+        # the properties as they are returned
+        properties = [{key: _get_clean_value(value) for key, value in item.items()} for item in properties]
+        tree = shapely.STRtree(geometries)
+        # prepared polygons speed up the containment test of the candidates
+        shapely.prepare(geometries)
+        with self.__lock:
+            self.__levels[name] = (tree, geometries, properties)
+
+    def add_map(self, name, mapObject):
+        """ Adds the regions of a CovidFoliumMap object as a level. The full resolution geometry of its geo df is
+        indexed, the properties are the attributes of its data df joined on the merge UID
+
+        Args:
+            name (str): The name of the level, e.g. 'counties'
+            mapObject (CovidFoliumMap): The map object having loaded the geo and data df
+        """
+        joined, _ = mapObject.get_joined_df()
+        if joined is None:
+            print('The map ' + name + ' has no data, the level is not indexed')
+            return
+        dfGeo = mapObject.get_geo_df()
+        # the joined df keeps the rows of the geo df in their order
+        properties = joined.drop(columns=joined.geometry.name).to_dict('records')
+        self.add_level(name, dfGeo.geometry.values, properties)
+
+    def get_levels(self):
+        """ Returns the names of the levels
+        """
+        with self.__lock:
+            return list(self.__levels.keys())
+
+    def locate(self, lat, lon):
+        """ Returns the regions containing a point at every level
+
+        Args:
+            lat (float): The latitude
+            lon (float): The longitude
+
+        Returns:
+            dict: The properties of the region containing the point or None by the name of the level
+        """
+        return self.locate_many([lat], [lon])[0]
+
+    def locate_many(self, lats, lons, levels = None):
+        """ Returns the regions containing each point at every level. Each level is queried once for all points. A
+        point on the border of two regions is located in the first of them
+
+        Args:
+            lats (list): The latitudes
+            lons (list): The longitudes
+            levels (list, optional): The names of the levels to be queried. Defaults to None (all).
+
+        Returns:
+            list: The regions of each point as returned by locate
+        """
+        import shapely
+        points = shapely.points(np.asarray(lons, dtype='float64'), np.asarray(lats, dtype='float64'))
+        with self.__lock:
+            items = [(name, level) for name, level in self.__levels.items() if (levels is None) or (name in levels)]
+        results = [{} for _ in range(len(points))]
+        for name, (tree, geometries, properties) in items:
+            # the indices of the points and of the regions containing them
+            pointIndices, regionIndices = tree.query(points, predicate='intersects')
+            found = np.full(len(points), -1, dtype='int64')
+            # the first region of each point wins
+            order = np.lexsort((regionIndices, pointIndices))[::-1]
+            found[pointIndices[order]] = regionIndices[order]
+            for result, index in zip(results, found.tolist()):
+                result[name] = properties[index] if index >= 0 else None
+        return results
@@ -0,0 +1,234 @@
+import numpy as np
+
+""" A topology of the polygons of a geo dataframe as used by TopoJSON: the coordinates are quantized to a fixed grid
+    and the borders are cut into arcs at the points where countries or counties meet. Neighbours share the arc of their
+    common border, so the arcs can be simplified without opening gaps or overlaps between them. The simplified
+    topology can be converted back to shapely geometries or written as a TopoJSON object.
+"""
+
+class Topology:
+    """ The arcs of the polygons of a geo series and the references of each feature to its arcs
+    """
+    def __init__(self, geometries, precision = 6):
+        """ Constructor, builds the topology of the polygons and multi polygons. Other geometries are kept as None.
+
+        Args:
+            geometries (GeoSeries): The geometries in degrees
+            precision (int, optional): The number of decimal places of the quantized coordinates. Defaults to 6.
+        """
+        self.__scale = 10.0 ** -precision
+        self.__precision = precision
+        bounds = geometries.total_bounds
+        # the origin of the grid
+        self.__translate = (np.floor(bounds[0] / self.__scale) * self.__scale,
+                            np.floor(bounds[1] / self.__scale) * self.__scale)
+        # the quantized rings of the polygons of each feature, a polygon is a list of rings
+        features = [self.__quantize(geometry) for geometry in geometries]
+        junctions = Topology.__find_junctions([ring for polygons in features if polygons is not None 
+                                               for polygon in polygons for ring in polygon])
+        self.__arcs = []
+        self.__arcIndex = {}
+        # the arc indices of each ring, ~index refers to the reversed arc
+        self.__features = [[[self.__cut_ring(ring, junctions) for ring in polygon] for polygon in polygons]
+                           if polygons is not None else None for polygons in features]
+        self.__arcIndex = None
+
+    def __quantize(self, geometry):
+        """ Returns the polygons of a geometry as lists of quantized rings without repeated points
+        """
+        if geometry is None or geometry.is_empty or geometry.geom_type not in ('Polygon', 'MultiPolygon'):
+            return None
+        polygons = [geometry] if geometry.geom_type == 'Polygon' else list(geometry.geoms)
+        result = []
+        for polygon in polygons:
+            rings = []
+            for ring in [polygon.exterior] + list(polygon.interiors):
+                coords = np.asarray(ring.coords)[:, :2]
+                points = np.round((coords - self.__translate) / self.__scale).astype('int64')
+                # remove repeated points
+                keep = np.ones(len(points), dtype=bool)
+                keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+                points = points[keep]
+                if len(points) >= 4 and (points[0] == points[-1]).all():
+                    rings.append(points)
+                elif len(rings) == 0:
+                    # the exterior collapsed
+                    break
+            if len(rings) > 0:
+                result.append(rings)
+        return result
+
+    @staticmethod
+    def __get_keys(points):
+        """ Returns a unique int64 key of each point
+        """
+        return (points[:, 0] << 32) | (points[:, 1] & 0xffffffff)
+
+    @staticmethod
+    def __find_junctions(rings):
+        """ Returns the keys of the points having different neighbours in different rings, that is where borders meet
+        """
+        if len(rings) == 0:
+            return set()
+        keys, neighbours = [], []
+        for ring in rings:
+            ringKeys = Topology.__get_keys(ring[:-1])
+            previous = np.roll(ringKeys, 1)
+            following = np.roll(ringKeys, -1)
+            keys.append(ringKeys)
+            # the neighbours don't depend on the direction of the ring
+            neighbours.append(np.stack([np.minimum(previous, following), np.maximum(previous, following)], axis=1))
+        keys = np.concatenate(keys)
+        neighbours = np.concatenate(neighbours)
+        # sort by key and neighbours to find keys with more than one pair of neighbours
+        order = np.lexsort((neighbours[:, 1], neighbours[:, 0], keys))
+        keys, neighbours = keys[order], neighbours[order]
+        sameKey = keys[1:] == keys[:-1]
+        otherNeighbours = np.any(neighbours[1:] != neighbours[:-1], axis=1)
+        return set(keys[1:][sameKey & otherNeighbours].tolist())
+
+    def __cut_ring(self, ring, junctions):
+        """ Cuts a ring into arcs at the junctions and returns the indices of the arcs
+        """
+        keys = Topology.__get_keys(ring[:-1])
+        cuts = [index for index, key in enumerate(keys.tolist()) if key in junctions]
+        if len(cuts) == 0:
+            # start a ring without junctions at its smallest point, so that the same ring of a neighbour is found
+            start = int(np.lexsort((ring[:-1, 1], ring[:-1, 0]))[0])
+            points = np.concatenate([ring[start:-1], ring[:start + 1]])
+            return [self.__add_arc(points)]
+        # start at the first junction
+        points = np.concatenate([ring[cuts[0]:-1], ring[:cuts[0] + 1]])
+        cuts = [cut - cuts[0] for cut in cuts] + [len(points) - 1]
+        return [self.__add_arc(points[cuts[i]:cuts[i + 1] + 1]) for i in range(len(cuts) - 1)]
+
+    def __add_arc(self, points):
+        """ Adds an arc unless it or its reversed arc exists already and returns its index
+        """
+        key = points.tobytes()
+        if key in self.__arcIndex:
+            return self.__arcIndex[key]
+        reversedKey = points[::-1].tobytes()
+        if reversedKey in self.__arcIndex:
+            return ~self.__arcIndex[reversedKey]
+        self.__arcIndex[key] = len(self.__arcs)
+        self.__arcs.append(points)
+        return len(self.__arcs) - 1
+
+    def get_arc_count(self):
+        """ Returns the number of arcs
+        """
+        return len(self.__arcs)
+
+    def get_point_count(self):
+        """ Returns the number of points of all arcs
+        """
+        return sum(len(arc) for arc in self.__arcs)
+
+    def get_feature_count(self):
+        """ Returns the number of features, including the ones without polygons
+        """
+        return len(self.__features)
+
+    def simplify(self, tolerance):
+        """ Simplifies each arc with the Douglas-Peucker algorithm preserving its topology. The end points of an arc 
+        are kept, so neighbours still share their borders. Closed arcs that would collapse are kept. Different arcs 
+        might cross each other after the simplification and small features might vanish, the arcs of such a feature 
+        are restored.
+
+        Args:
+            tolerance (float): The tolerance in degrees
+        """
+        import shapely
+        tolerance = tolerance / self.__scale
+        if tolerance <= 0:
+            return
+        original = list(self.__arcs)
+        lines = np.array([shapely.LineString(arc.astype('float64')) for arc in self.__arcs], dtype=object)
+        simplified = shapely.simplify(lines, tolerance, preserve_topology=True)
+        for index, line in enumerate(simplified):
+            points = np.round(shapely.get_coordinates(line)).astype('int64')
+            arc = self.__arcs[index]
+            if (arc[0] == arc[-1]).all() and len(points) < 4:
+                continue
+            self.__arcs[index] = points
+        # the features having polygons
+        polygonal = np.array([polygons is not None for polygons in self.__features], dtype=bool)
+        while True:
+            # the simplified arcs of the features that became invalid or vanished, restoring them might invalidate a 
+            # neighbour
+            geometries = np.array(self.to_geometries(), dtype=object)
+            missing = shapely.is_missing(geometries)
+            invalid = np.flatnonzero((~shapely.is_valid(geometries) & ~missing) | (missing & polygonal))
+            arcs = set(index if index >= 0 else ~index 
+                       for feature in invalid for polygon in self.__features[feature] for ring in polygon for index in ring)
+            arcs = [index for index in arcs if self.__arcs[index] is not original[index]]
+            if len(arcs) == 0:
+                break
+            for index in arcs:
+                self.__arcs[index] = original[index]
+
+    def __get_ring(self, arcs):
+        """ Returns the quantized points of a ring made of arcs
+        """
+        parts = []
+        for index in arcs:
+            arc = self.__arcs[index] if index >= 0 else self.__arcs[~index][::-1]
+            parts.append(arc if len(parts) == 0 else arc[1:])
+        return np.concatenate(parts)
+
+    def to_geometries(self):
+        """ Returns the shapely geometries of the features, polygons of simplified rings having no area are dropped
+
+        Returns:
+            list: The polygons, multi polygons or None for each feature
+        """
+        from shapely.geometry import Polygon, MultiPolygon
+        result = []
+        for polygons in self.__features:
+            if polygons is None:
+                result.append(None)
+                continue
+            shapes = []
+            for polygon in polygons:
+                rings = [self.__get_ring(arcs) * self.__scale + self.__translate for arcs in polygon]
+                rings = [np.round(ring, self.__precision) for ring in rings if len(ring) >= 4]
+                if len(rings) == 0 or len(rings[0]) < 4:
+                    continue
+                shape = Polygon(rings[0], rings[1:])
+                if shape.area > 0:
+                    shapes.append(shape)
+            if len(shapes) == 0:
+                result.append(None)
+            elif len(shapes) == 1 and len(polygons) == 1:
+                result.append(shapes[0])
+            else:
+                result.append(MultiPolygon(shapes))
+        return result
+
+    def to_topojson(self, properties = None, objectName = 'features'):
+        """ Returns the topology as a TopoJSON object with delta encoded arcs
+
+        Args:
+            properties (list, optional): A dictionary of properties for each feature. Defaults to None.
+            objectName (str, optional): The name of the geometry collection. Defaults to 'features'.
+
+        Returns:
+            dict: The TopoJSON object
+        """
+        geometries = []
+        for index, polygons in enumerate(self.__features):
+            if polygons is None:
+                geometry = {'type': None}
+            elif len(polygons) == 1:
+                geometry = {'type': 'Polygon', 'arcs': polygons[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'arcs': polygons}
+            if properties is not None:
+                geometry['properties'] = properties[index]
+            geometries.append(geometry)
+        arcs = [np.concatenate([arc[:1], np.diff(arc, axis=0)]).tolist() for arc in self.__arcs]
+        return {'type': 'Topology',
+                'transform': {'scale': [self.__scale, self.__scale], 'translate': list(self.__translate)},
+                'objects': {objectName: {'type': 'GeometryCollection', 'geometries': geometries}},
+                'arcs': arcs}
@@ -0,0 +1,213 @@
+import threading
+import time
+import bisect
+from collections import deque
+from contextlib import contextmanager
+
+""" A lightweight tracing layer to measure the latency of the stages of a computation (e.g. the stages of generating
+    a plot in the REST-API) and of whole requests. Every measurement is kept in a histogram with fixed buckets (as used
+    by Prometheus) and in a rolling window of the latest samples to calculate percentiles.
+"""
+
+# the default upper bounds of the histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class LatencyHistogram:
+    """ A thread-safe histogram of latencies in seconds. Beside the cumulative bucket counts it keeps a rolling window
+    of the latest samples to calculate percentiles of the recent latency.
+    """
+    def __init__(self, buckets = DEFAULT_BUCKETS, windowSize = 1024):
+        """ Constructor
+
+        Args:
+            buckets (tuple, optional): The sorted upper bounds of the buckets in seconds. Defaults to DEFAULT_BUCKETS.
+            windowSize (int, optional): The number of samples in the rolling window. Defaults to 1024.
+        """
+        self.__lock = threading.Lock()
+        self.__buckets = tuple(buckets)
+        # one additional bucket for +Inf
+        self.__counts = [0] * (len(self.__buckets) + 1)
+        self.__sum = 0.0
+        self.__count = 0
+        self.__window = deque(maxlen=windowSize)
+
+    def observe(self, seconds):
+        """ Adds a sample to the histogram
+
+        Args:
+            seconds (float): The latency in seconds
+        """
+        index = bisect.bisect_left(self.__buckets, seconds)
+        with self.__lock:
+            self.__counts[index] += 1
+            self.__sum += seconds
+            self.__count += 1
+            self.__window.append(seconds)
+
+    def get_buckets(self):
+        """ Returns the cumulative bucket counts as used by Prometheus
+
+        Returns:
+            list: A list of (upper bound, cumulative count) tuples, the last upper bound is float('inf')
+        """
+        with self.__lock:
+            counts = list(self.__counts)
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.__buckets + (float('inf'),), counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+    def get_sum(self):
+        """ Returns the sum of all samples in seconds
+        """
+        with self.__lock:
+            return self.__sum
+
+    def get_count(self):
+        """ Returns the number of all samples
+        """
+        with self.__lock:
+            return self.__count
+
+    def get_percentile(self, percent):
+        """ Returns a percentile of the samples in the rolling window
+
+        Args:
+            percent (float): The percentile ranging from 0 to 100
+
+        Returns:
+            float: The percentile in seconds or None if there are no samples
+        """
+        with self.__lock:
+            window = sorted(self.__window)
+        if len(window) == 0:
+            return None
+        index = min(len(window) - 1, int(round(percent / 100.0 * (len(window) - 1))))
+        return window[index]
+
+    def get_stats(self):
+        """ Returns a summary of the histogram
+
+        Returns:
+            dict: The count, the sum and the percentiles 50, 95 and 99 of the rolling window in milliseconds
+        """
+        def to_ms(value):
+            return None if value is None else round(value * 1000.0, 3)
+        return {'count': self.get_count(),
+                'sum_ms': to_ms(self.get_sum()),
+                'p50_ms': to_ms(self.get_percentile(50)),
+                'p95_ms': to_ms(self.get_percentile(95)),
+                'p99_ms': to_ms(self.get_percentile(99))}
+
+class Tracer:
+    """ Keeps a latency histogram per stage and per endpoint
+    """
+    def __init__(self):
+        """ Constructor
+        """
+        self.__lock = threading.Lock()
+        self.__stages = {}
+        self.__endpoints = {}
+
+    @staticmethod
+    def __get_histogram(histograms, lock, name):
+        with lock:
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = LatencyHistogram()
+                histograms[name] = histogram
+            return histogram
+
+    def observe_stage(self, name, seconds):
+        """ Adds a sample to the histogram of a stage
+
+        Args:
+            name (str): The name of the stage, e.g. 'pivot'
+            seconds (float): The latency in seconds
+        """
+        Tracer.__get_histogram(self.__stages, self.__lock, name).observe(seconds)
+
+    def observe_endpoint(self, name, seconds):
+        """ Adds a sample to the histogram of an endpoint
+
+        Args:
+            name (str): The name of the endpoint, e.g. 'get_data'
+            seconds (float): The latency in seconds
+        """
+        Tracer.__get_histogram(self.__endpoints, self.__lock, name).observe(seconds)
+
+    def get_stage_histograms(self):
+        """ Returns a copy of the dictionary of the stage histograms by name
+        """
+        with self.__lock:
+            return dict(self.__stages)
+
+    def get_endpoint_histograms(self):
+        """ Returns a copy of the dictionary of the endpoint histograms by name
+        """
+        with self.__lock:
+            return dict(self.__endpoints)
+
+    def get_stats(self):
+        """ Returns a summary of all histograms
+
+        Returns:
+            dict: A dictionary holding the summaries of the stages and the endpoints
+        """
+        return {'stages': {name: h.get_stats() for name, h in self.get_stage_histograms().items()},
+                'endpoints': {name: h.get_stats() for name, h in self.get_endpoint_histograms().items()}}
+
+class Trace:
+    """ The trace of a single computation. It collects the duration of its stages in the order they have been executed
+    and reports them to a tracer (if given).
+    """
+    def __init__(self, tracer = None):
+        """ Constructor
+
+        Args:
+            tracer (Tracer, optional): The tracer the stages should be reported to. Defaults to None.
+        """
+        self.__tracer = tracer
+        self.__stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """ A context manager measuring the duration of a stage
+
+        Args:
+            name (str): The name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        """ Adds the duration of a stage
+
+        Args:
+            name (str): The name of the stage
+            seconds (float): The duration in seconds
+        """
+        self.__stages.append((name, seconds))
+        if self.__tracer is not None:
+            self.__tracer.observe_stage(name, seconds)
+
+    def get_stages(self):
+        """ Returns the stages
+
+        Returns:
+            list: A list of (name, seconds) tuples
+        """
+        return list(self.__stages)
+
+    def server_timing(self):
+        """ Returns the stages formatted as the value of a 'Server-Timing' HTTP header
+
+        Returns:
+            str: The header value such as 'pivot;dur=1.2, draw;dur=25.3' (durations in milliseconds)
+        """
+        return ', '.join('{};dur={:.1f}'.format(name, seconds * 1000.0) for name, seconds in self.__stages)
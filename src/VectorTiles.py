@@ -0,0 +1,287 @@
+import math
+import struct
+import threading
+import numpy as np
+
+""" Mapbox Vector Tiles (MVT, version 2) of the polygons of a GeoJSON file, e.g. the countries of the world or the
+    German counties. A client fetches only the tiles on its screen, each holding the borders clipped to the tile,
+    simplified to the resolution of its zoom level and the properties of the features. The protobuf messages of the
+    tiles are small, so they are encoded here without a protobuf library:
+        https://github.com/mapbox/vector-tile-spec/tree/master/2.1
+"""
+
+# the number of units of a tile in both directions
+EXTENT = 4096
+# the units around a tile included in the tile, so that the borders of the polygons don't show at the tile edges
+BUFFER = 64
+# the maximum zoom level
+MAX_ZOOM = 14
+# the tiles of the zoom levels up to this one are encoded when the layer is built
+PRECOMPUTED_ZOOM = 4
+# the media type of the tiles
+MEDIA_TYPE = 'application/vnd.mapbox-vector-tile'
+# the radius of the spherical web mercator projection (EPSG:3857)
+EARTH_RADIUS = 6378137.0
+# the half size of the projected world
+ORIGIN_SHIFT = math.pi * EARTH_RADIUS
+# the maximum latitude of the projection
+MAX_LATITUDE = 85.0511287798066
+
+def _get_varint(value):
+    """ Returns the bytes of an unsigned varint
+    """
+    result = bytearray()
+    while value > 0x7f:
+        result.append((value & 0x7f) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+def _get_packed_varints(values):
+    """ Returns the bytes of a list of unsigned varints
+    """
+    result = bytearray()
+    for value in values:
+        while value > 0x7f:
+            result.append((value & 0x7f) | 0x80)
+            value >>= 7
+        result.append(value)
+    return bytes(result)
+
+def _get_field(number, data):
+    """ Returns a length delimited field (wire type 2) such as a string, an embedded message or packed varints
+    """
+    return _get_varint((number << 3) | 2) + _get_varint(len(data)) + data
+
+def _get_value(value):
+    """ Returns the Value message of a property value
+    """
+    if isinstance(value, (bool, np.bool_)):
+        # bool_value
+        return _get_varint((7 << 3) | 0) + _get_varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        value = int(value)
+        # sint_value, zigzag encoded
+        return _get_varint((6 << 3) | 0) + _get_varint((value << 1) ^ (value >> 63))
+    if isinstance(value, (float, np.floating)):
+        # double_value (wire type 1)
+        return _get_varint((3 << 3) | 1) + struct.pack('<d', float(value))
+    # string_value
+    return _get_field(1, str(value).encode('utf-8'))
+
+def _get_command(command, count):
+    """ Returns the command integer of the geometry
+    """
+    return (command & 0x7) | (count << 3)
+
+def _to_mercator(coords):
+    """ Projects longitude/latitude to web mercator meters
+    """
+    lon = coords[:, 0]
+    lat = np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE)
+    x = lon * ORIGIN_SHIFT / 180.0
+    y = np.log(np.tan((90.0 + lat) * math.pi / 360.0)) * EARTH_RADIUS
+    return np.stack([x, y], axis=1)
+
+def get_tile_bounds(z, x, y):
+    """ Returns the bounds of a tile in web mercator meters
+
+    Args:
+        z (int): The zoom level
+        x (int): The column of the tile
+        y (int): The row of the tile, 0 is the north
+
+    Returns:
+        tuple: The minimum x, minimum y, maximum x and maximum y
+    """
+    size = 2.0 * ORIGIN_SHIFT / (1 << z)
+    minX = -ORIGIN_SHIFT + x * size
+    maxY = ORIGIN_SHIFT - y * size
+    return minX, maxY - size, minX + size, maxY
+
+def encode_polygon(geometry, minX, maxY, scale):
+    """ Returns the geometry commands of the polygons of a geometry in tile units. The exterior rings are clockwise,
+    the interior rings counter clockwise, rings collapsing to less than three points are dropped.
+
+    Args:
+        geometry (Geometry): The (multi) polygon in web mercator meters, other parts are ignored
+        minX (float): The left edge of the tile
+        maxY (float): The top edge of the tile
+        scale (float): The tile units per meter
+
+    Returns:
+        list: The commands and parameters
+    """
+    import shapely
+    commands = []
+    cursor = np.zeros(2, dtype='int64')
+    for part in shapely.get_parts(geometry):
+        if part.geom_type != 'Polygon':
+            continue
+        for index, ring in enumerate([part.exterior] + list(part.interiors)):
+            coords = np.asarray(ring.coords)[:, :2]
+            points = np.empty((len(coords), 2), dtype='int64')
+            points[:, 0] = np.round((coords[:, 0] - minX) * scale)
+            points[:, 1] = np.round((maxY - coords[:, 1]) * scale)
+            # remove repeated points and the closing point
+            keep = np.ones(len(points), dtype=bool)
+            keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+            points = points[keep]
+            if len(points) > 1 and (points[0] == points[-1]).all():
+                points = points[:-1]
+            if len(points) < 3:
+                if index == 0:
+                    # the exterior collapsed, so the interiors are dropped as well
+                    break
+                continue
+            # the surveyor's formula, positive for clockwise rings as the y axis points down
+            area = np.sum(points[:, 0] * np.roll(points[:, 1], -1) - np.roll(points[:, 0], -1) * points[:, 1])
+            if area == 0:
+                if index == 0:
+                    break
+                continue
+            if (area > 0) != (index == 0):
+                points = points[::-1]
+            deltas = np.diff(np.concatenate([cursor[np.newaxis], points]), axis=0)
+            cursor = points[-1]
+            # zigzag encoding of the deltas
+            parameters = ((deltas << 1) ^ (deltas >> 63)).ravel().tolist()
+            commands.append(_get_command(1, 1))
+            commands.extend(parameters[:2])
+            commands.append(_get_command(2, len(points) - 1))
+            commands.extend(parameters[2:])
+            commands.append(_get_command(7, 1))
+    return commands
+
+def encode_layer(name, features, extent = EXTENT):
+    """ Returns a Tile message holding one layer
+
+    Args:
+        name (str): The name of the layer
+        features (list): The features, tuples of the id, the geometry commands and the properties (dict)
+        extent (int, optional): The units of the tile. Defaults to EXTENT.
+
+    Returns:
+        bytes: The tile, empty if there are no features
+    """
+    if len(features) == 0:
+        return b''
+    keys = {}
+    values = {}
+    encodedFeatures = []
+    for id, commands, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, (float, np.floating)) and math.isnan(value)):
+                continue
+            if key not in keys:
+                keys[key] = len(keys)
+            # the type is part of the key, 1 and 1.0 are different values
+            valueKey = (type(value).__name__, value)
+            if valueKey not in values:
+                values[valueKey] = (len(values), _get_value(value))
+            tags.extend([keys[key], values[valueKey][0]])
+        feature = _get_varint((1 << 3) | 0) + _get_varint(id)
+        if len(tags) > 0:
+            feature += _get_field(2, _get_packed_varints(tags))
+        # the type is POLYGON
+        feature += _get_varint((3 << 3) | 0) + _get_varint(3)
+        feature += _get_field(4, _get_packed_varints(commands))
+        encodedFeatures.append(_get_field(2, feature))
+    layer = bytearray(_get_varint((15 << 3) | 0) + _get_varint(2))
+    layer += _get_field(1, name.encode('utf-8'))
+    for feature in encodedFeatures:
+        layer += feature
+    for key in keys:
+        layer += _get_field(3, key.encode('utf-8'))
+    for index, value in sorted(values.values()):
+        layer += _get_field(4, value)
+    layer += _get_varint((5 << 3) | 0) + _get_varint(extent)
+    return _get_field(3, bytes(layer))
+
+class TileLayer:
+    """ The vector tiles of the polygons of a geo series and the properties of each polygon. The tiles of the low zoom
+    levels are encoded when the layer is built, the others on request.
+    """
+    def __init__(self, name, geometries, properties, precomputedZoom = PRECOMPUTED_ZOOM):
+        """ Constructor
+
+        Args:
+            name (str): The name of the layer in the tiles
+            geometries (GeoSeries): The polygons in longitude/latitude (EPSG:4326)
+            properties (list): The properties of each polygon as a dictionary
+            precomputedZoom (int, optional): The tiles up to this zoom level are encoded in advance. Defaults to
+                                             PRECOMPUTED_ZOOM.
+        """
+        import shapely
+        self.__name = name
+        self.__properties = properties
+        self.__lock = threading.Lock()
+        # the geometries in web mercator meters
+        self.__geometries = shapely.transform(np.asarray(geometries, dtype=object), _to_mercator)
+        self.__tree = shapely.STRtree(self.__geometries)
+        # the geometries simplified for each zoom level
+        self.__simplified = {}
+        self.__precomputedZoom = precomputedZoom
+        self.__precomputed = {}
+        for z in range(precomputedZoom + 1):
+            for x in range(1 << z):
+                for y in range(1 << z):
+                    self.__precomputed[(z, x, y)] = self.__encode_tile(z, x, y)
+
+    def __get_simplified(self, z):
+        """ Returns the geometries simplified to about one unit of a tile of the zoom level
+        """
+        import shapely
+        with self.__lock:
+            if z not in self.__simplified:
+                tolerance = 2.0 * ORIGIN_SHIFT / (1 << z) / EXTENT
+                self.__simplified[z] = shapely.simplify(self.__geometries, tolerance, preserve_topology=True)
+            return self.__simplified[z]
+
+    def __encode_tile(self, z, x, y):
+        """ Returns the tile of the layer
+        """
+        import shapely
+        minX, minY, maxX, maxY = get_tile_bounds(z, x, y)
+        scale = EXTENT / (maxX - minX)
+        buffer = BUFFER / scale
+        indices = self.__tree.query(shapely.box(minX - buffer, minY - buffer, maxX + buffer, maxY + buffer))
+        if len(indices) == 0:
+            return b''
+        indices = np.sort(indices)
+        clipped = shapely.clip_by_rect(self.__get_simplified(z)[indices],
+                                       minX - buffer, minY - buffer, maxX + buffer, maxY + buffer)
+        features = []
+        for index, geometry in zip(indices.tolist(), clipped):
+            if geometry is None or geometry.is_empty:
+                continue
+            commands = encode_polygon(geometry, minX, maxY, scale)
+            if len(commands) > 0:
+                features.append((index + 1, commands, self.__properties[index]))
+        return encode_layer(self.__name, features)
+
+    def get_tile(self, z, x, y):
+        """ Returns a tile
+
+        Args:
+            z (int): The zoom level from 0 to MAX_ZOOM
+            x (int): The column of the tile
+            y (int): The row of the tile, 0 is the north
+
+        Raises:
+            ValueError: If the tile doesn't exist
+
+        Returns:
+            bytes: The tile, empty if there are no polygons in it
+        """
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError('Invalid tile ' + str(z) + '/' + str(x) + '/' + str(y))
+        if z <= self.__precomputedZoom:
+            return self.__precomputed[(z, x, y)]
+        return self.__encode_tile(z, x, y)
+
+    def get_precomputed_size(self):
+        """ Returns the number of bytes of the precomputed tiles
+        """
+        return sum(len(tile) for tile in self.__precomputed.values())
@@ -2,24 +2,34 @@ import sys
 import os
 # append the src directory to the sys path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from CovidCasesECDC import CovidCasesECDC
-from CovidCasesOWID import CovidCasesOWID
-from PlotterBuilder import PlotterBuilder
-from CovidCasesWHO import CovidCasesWHO
-from CovidCases import CovidCases
-from typing import Optional
-from collections import namedtuple
+# the data loaders, pandas and matplotlib are imported where they are used to keep the startup time of the app short
+# matplotlib uses the agg backend (agg is not interactive and it can't be interactive) once it is imported, it is
+# selected here without importing matplotlib
+os.environ['MPLBACKEND'] = 'agg'
+if 'matplotlib' in sys.modules:
+    # too late for the environment variable
+    sys.modules['matplotlib'].use('agg')
+from SingleFlight import SingleFlight
+from Tracing import Trace, Tracer
+from LRUCache import LRUCache
+from RenderPool import RenderPool
+from Downloader import get_content_hash
+import Metrics
+from typing import Optional, List, Tuple
+from pydantic import BaseModel
 import re
-import pandas as pd
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import matplotlib
 import io
-import requests
-from datetime import date, timedelta
+import time
+import threading
+import pickle
+import hashlib
+import contextlib
+from datetime import date
 from starlette.responses import StreamingResponse
 from starlette.responses import FileResponse
-from fastapi import FastAPI, HTTPException
+from starlette.responses import Response
+from starlette.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Query
 from enum import Enum
 
 class Maps(Enum):
@@ -36,6 +46,19 @@ class Maps(Enum):
     MapDEcounty = 'MapDEcounty'
     MapDEState = 'MapDEstate'
 
+class TileLayers(Enum):
+    """ Enumeration of the layers of the vector tiles
+    """
+    countries = 'countries'
+    states = 'states'
+    counties = 'counties'
+
+class LocateRequest(BaseModel):
+    """ The points of a batch lookup as pairs of latitude and longitude and optionally the layers to look up
+    """
+    points: List[Tuple[float, float]]
+    layers: Optional[List[TileLayers]] = None
+
 class Attributes(Enum):
     """
     Enumeration of all available plotable attributes.
@@ -112,68 +135,291 @@ class Rest_API:
                 COVID_DATA: "your_directory"
     """
 
+    # the seconds a client should wait before retrying a request while the data is loading
+    RETRY_AFTER_SECONDS = 30
+    # the minimum seconds between two checks for newer data
+    CHECK_INTERVAL_SECONDS = 60
+    # the maps change every day, browsers and proxies have to revalidate them
+    MAP_CACHE_CONTROL = 'no-cache'
+    # the names of the assets of the maps contain the hash of their content
+    ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    # increase it if the layout of the snapshots changes
+    SNAPSHOT_FORMAT = 1
+    # the modules of the pickled data classes, a snapshot of other code is discarded
+    SNAPSHOT_MODULES = ['CovidCases.py', 'CovidCasesWHO.py', 'CovidCasesOWID.py']
+    # the vector tiles change with the data, but not within an hour
+    TILE_CACHE_CONTROL = 'public, max-age=3600'
+    # the GeoJSON file, the merge UID, the name and the attributes of the GeoJSON file of each layer of the vector 
+    # tiles, the attributes of the countries are taken from the WHO data
+    TILE_SOURCES = {TileLayers.countries: ('WorldCountriesMedRes.geojson', 'iso_a2', 'admin', []),
+                    TileLayers.states: ('RKI_Corona_Bundeslaender.geojson', 'AGS_TXT', 'LAN_ew_GEN', 
+                                        ['Fallzahl', 'Death', 'cases7_bl_per_100k', 'LAN_ew_EWZ']),
+                    TileLayers.counties: ('RKI_Corona_Landkreise.geojson', 'RS', 'county', 
+                                          ['cases', 'deaths', 'cases7_per_100k', 'EWZ'])}
+    # the maximum number of points of a batch lookup
+    MAX_LOCATE_POINTS = 10000
+    # the attributes of the WHO data in the tiles of the countries
+    TILE_ATTRIBUTES = ['Cases', 'Deaths', 'CasesPerMillionPopulation', 'DeathsPerMillionPopulation', 'PercentDeaths']
+
     def __init__(self):
         print ('constructor called')
-        # get the date
-        today = date.today() - timedelta(days=1)
-        # the prefix of the CSV file is Y-m-d
-        self.__ymd = today.strftime('%Y-%m-%d')
         # an array holding the data for the data sources
         self.__data = []
         # 0 is WHO
         self.__data.append(None)
         # 1 is OWID
         self.__data.append(None)
-        # initialise date tracking
-        self.__get_latest_data()
+        # information about the loaded data such as the version, one dictionary per data source
+        self.__dataInfo = [None, None]
+        # serializes the checks for newer data
+        self.__dataLock = threading.Lock()
+        # coalesces concurrent requests for the same plot
+        self.__singleFlight = SingleFlight()
+        # the latest plots as PNG by data version and plot key
+        self.__plotCache = LRUCache(maxSize=256)
+        # the layers of the vector tiles by their name, each one with the version of its data
+        self.__tileLayers = {}
+        # coalesces concurrent builds of the same layer
+        self.__tileFlight = SingleFlight()
+        # the vector tiles of the zoom levels that are not precomputed by layer, version and tile
+        self.__tileCache = LRUCache(maxSize=4096)
+        # the spatial index of the layers, created on the first lookup, and the version of each indexed layer
+        self.__spatialIndex = None
+        self.__indexedVersions = {}
+        self.__indexLock = threading.Lock()
+        # counts if the checks for newer data could use the loaded data or had to load it
+        self.__dataCache = Metrics.Counter(('source', 'result'))
+        # limits the number of threads drawing plots at the same time
+        try:
+            renderWorkers = int(os.environ.get('COVID_RENDER_WORKERS', '1'))
+        except ValueError:
+            renderWorkers = 1
+        self.__renderPool = RenderPool(renderWorkers)
+        # latency histograms of the plot stages and the endpoints
+        self.__tracer = Tracer()
+        # the requests by route, attribute and status and their latency
+        self.__requestCount = Metrics.Counter(('route', 'attribute', 'status'))
+        self.__requestLatency = Metrics.Histogram(('route', 'attribute'))
+        # the metrics of the REST-API
+        self.__metrics = Metrics.MetricsRegistry()
+        self.__metrics.add_collector(self.__collect_metrics)
+        # the thread loading the data in the background, the data is loaded lazily so that the app can start serving
+        # immediately
+        self.__loaderLock = threading.Lock()
+        self.__loader = None
+        # the time (time.monotonic) of the next check for newer data
+        self.__nextCheck = 0.0
+        # the last error of the background loader
+        self.__loadError = None
 
-    def __get_latest_data(self):  
-        # the data directory
+    @staticmethod
+    def __get_data_directory():
+        """ Returns the data directory defined by the COVID_DATA environment variable including a tailing '/'
+        """
         try:
             prefix = os.environ['COVID_DATA'] + '/'
         except:
             print('missing environment variable, switching to default directory')
-            prefix = '../data'
+            prefix = '../data/'
+        return prefix
+
+    def start_loading(self):
+        """ Starts loading the data in a background thread. If there is a snapshot of the last run it will be loaded 
+        first, afterwards the latest CSV files are downloaded if necessary and loaded if they are newer than the
+        loaded data. Calling it while the thread is running has no effect.
+        """
+        with self.__loaderLock:
+            if self.__loader is not None and self.__loader.is_alive():
+                return
+            self.__loader = threading.Thread(target=self.__load_in_background, name='covid-data-loader', daemon=True)
+            self.__loader.start()
+
+    def __load_in_background(self):
+        try:
+            if not self.is_ready():
+                # use the data of the last run to be ready as soon as possible
+                self.__load_snapshots()
+            self.__get_latest_data()
+            self.__loadError = None
+        except Exception as e:
+            self.__loadError = str(e)
+            print('Loading data failed: ' + self.__loadError)
+        finally:
+            self.__nextCheck = time.monotonic() + Rest_API.CHECK_INTERVAL_SECONDS
+
+    def is_ready(self):
+        """ Returns True as soon as the data of all data sources is available
+
+        Returns:
+            bool: True if the data is loaded
+        """
+        return all(data is not None for data in self.__data)
+
+    def get_readiness(self):
+        """ Returns information about the loaded data
+
+        Returns:
+            dict: The readiness, the versions of the data sources and the last error of the background loader
+        """
+        return {'ready': self.is_ready(),
+                'loading': self.__loader is not None and self.__loader.is_alive(),
+                'versions': {source.value: version for source, version in zip(DataSource, self.get_data_version())},
+                'error': self.__loadError}
+
+    def __check_for_newer_data(self):
+        """ Starts the background loader from time to time to check for newer data. Until the data is available it
+        raises a HTTP 503 error asking the client to retry later.
+
+        Raises:
+            HTTPException: 503 in case the data is not loaded yet
+        """
+        if time.monotonic() >= self.__nextCheck:
+            self.start_loading()
+        if not self.is_ready():
+            raise HTTPException(status_code=503, 
+                                detail='The data is loading, please try again later',
+                                headers={'Retry-After': str(Rest_API.RETRY_AFTER_SECONDS)})
+
+    def __get_latest_data(self):  
+        from CovidCasesWHO import CovidCasesWHO
+        from CovidCasesOWID import CovidCasesOWID
+        # the data directory
+        prefix = Rest_API.__get_data_directory()
 
         # the calls to download_CSV_file will report if the files already exist
-        
-        # get the latest WHO file name and download it, if necessary
-        csv_file = CovidCasesWHO.download_CSV_file(prefix)
-        # check if it is the file of the last call
-        if csv_file.find(self.__ymd) == -1:
-            # it's from a different data
-            self.__data[0] = CovidCasesWHO(csv_file)
-            print('Updated WHO data')
-
-        # get the latest OWID file name and download it, if necessary
-        csv_file = CovidCasesOWID.download_CSV_file(prefix)
-        # check if it is the file of the last call
-        if csv_file.find(self.__ymd) == -1:
-            # it's from a different data
-            self.__data[1] = CovidCasesOWID(csv_file)
-            print('Updated OWID data')
-
-        # get the date and keep it
-        today = date.today()
-        # the prefix of the CSV file is Y-m-d
-        self.__ymd = today.strftime('%Y-%m-%d')
-
-    def generate_plot(self, geo_ids, wanted_attrib, data_source, log=False, last_n=-1, since_n=-1, bar=False):
-        """ Generates a plot for given GeoIds and returns it in form of a byteIO stream
+        with self.__dataLock:
+            # get the latest WHO file name and download it, if necessary
+            csv_file = CovidCasesWHO.download_CSV_file(prefix)
+            # check if it is the file of the last call
+            if not self.__is_loaded(0, csv_file):
+                # it's from a different data
+                self.__load_data(0, CovidCasesWHO, csv_file)
+                print('Updated WHO data')
+            else:
+                self.__dataCache.inc((DataSource.WHO.value, 'hit'))
+
+            # get the latest OWID file name and download it, if necessary
+            csv_file = CovidCasesOWID.download_CSV_file(prefix)
+            # check if it is the file of the last call
+            if not self.__is_loaded(1, csv_file):
+                # it's from a different data
+                self.__load_data(1, CovidCasesOWID, csv_file)
+                print('Updated OWID data')
+            else:
+                self.__dataCache.inc((DataSource.OWID.value, 'hit'))
+
+    def __is_loaded(self, index, csv_file):
+        """ Checks if the content of the given file is the one that has been loaded for the data source
+        """
+        info = self.__dataInfo[index]
+        return (self.__data[index] is not None) and (info is not None) and (info['version'] == get_content_hash(csv_file))
+
+    def __load_data(self, index, dataClass, csv_file):
+        """ Loads a CSV file using the given CovidCases sub-class, keeps some information about it and saves a 
+        snapshot to be used by the next run
 
         Args:
-            geo_ids (String): countries that should be plotted
-            wanted_attrib (String): the field you want to plot, e.g. Cases
-            data_source (DataSource): Source of the data defined by the enum. Note! If vaccination data is selected and another
-                                       source than OWID is selected this will implicitly switch!
-            log (bool, optional): should the plot be logarithmic
-            last_n (int, optional): plot the last n days, if not further specified all available data is plotted
-            since_n (int, optional): plot since the nth case, if not further specified all available data is plotted
+            index (int): the index of the data source, 0 is WHO, 1 is OWID
+            dataClass (class): the sub-class of CovidCases to load the file
+            csv_file (str): the file to be loaded
+        """
+        start = time.perf_counter()
+        data = dataClass(csv_file)
+        loadSeconds = time.perf_counter() - start
+        # the version is the hash of the content, so an unchanged file of a different day will not be loaded again
+        info = {'version': get_content_hash(csv_file),
+                'file': csv_file,
+                'loadSeconds': loadSeconds,
+                'rows': data.get_number_of_rows()}
+        self.__set_data(index, data, info)
+        self.__dataCache.inc((data.get_data_source_info()[1], 'miss'))
+        self.__save_snapshot(index)
+
+    def __set_data(self, index, data, info):
+        # the plots of the old data are useless now
+        self.__data[index] = data
+        self.__dataInfo[index] = info
+        self.__plotCache.clear()
+
+    def __get_snapshot_filename(self, index):
+        """ Returns the filename of the binary snapshot of a data source
+        """
+        return Rest_API.__get_data_directory() + list(DataSource)[index].value + '-snapshot.pkl'
+
+    @staticmethod
+    def __get_snapshot_version():
+        """ Returns the format and the hash of the source code of the data classes a snapshot is written with
+        """
+        directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        sha = hashlib.sha256()
+        for module in Rest_API.SNAPSHOT_MODULES:
+            sha.update(get_content_hash(os.path.join(directory, module)).encode('utf-8'))
+        return {'format': Rest_API.SNAPSHOT_FORMAT, 'code': sha.hexdigest()}
+
+    def __save_snapshot(self, index):
+        """ Saves the loaded data of a data source as a binary snapshot (pickle) that can be loaded much faster than 
+        the CSV file. The file is written to a temporary file first and renamed afterwards so that a reader will never 
+        see a partial file. The version of the snapshot is written in front of the data, so that it can be checked 
+        without unpickling the data.
+        """
+        filename = self.__get_snapshot_filename(index)
+        tmpFilename = filename + '.tmp'
+        try:
+            with open(tmpFilename, 'wb') as f:
+                pickle.dump(Rest_API.__get_snapshot_version(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump({'info': self.__dataInfo[index], 'data': self.__data[index]}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpFilename, filename)
+        except Exception as e:
+            print('Error writing snapshot ' + filename + ': ' + str(e))
+            if os.path.exists(tmpFilename):
+                os.remove(tmpFilename)
+
+    def __load_snapshots(self):
+        """ Loads the binary snapshots of the last run if they exist. A snapshot that can't be loaded or was written 
+        by another format or another version of the data classes is ignored.
+        """
+        for index in range(len(self.__data)):
+            filename = self.__get_snapshot_filename(index)
+            if (self.__data[index] is not None) or (not os.path.exists(filename)):
+                continue
+            start = time.perf_counter()
+            try:
+                with open(filename, 'rb') as f:
+                    version = pickle.load(f)
+                    if version != Rest_API.__get_snapshot_version():
+                        print('Ignoring snapshot ' + filename + ' of another version')
+                        continue
+                    snapshot = pickle.load(f)
+            except Exception as e:
+                print('Ignoring snapshot ' + filename + ': ' + str(e))
+                continue
+            info = dict(snapshot['info'])
+            info['loadSeconds'] = time.perf_counter() - start
+            with self.__dataLock:
+                self.__set_data(index, snapshot['data'], info)
+            print('Using snapshot ' + filename + ' of ' + os.path.basename(info['file']))
+
+    def get_data_version(self):
+        """ Returns the version of the loaded data of all data sources. The version is the SHA-256 hash of the 
+        content of the CSV file, it changes whenever new data is loaded
+
+        Returns:
+            tuple: The versions of the WHO and OWID data
+        """
+        return tuple(info['version'] if info is not None else None for info in self.__dataInfo)
+
+    @staticmethod
+    def effective_data_source(wanted_attrib, data_source):
+        """ Returns the data source that is really used for the given attribute. Vaccination data is only available
+        with OWID, so requesting it from another source will implicitly switch to OWID.
+
+        Args:
+            wanted_attrib (Attributes): the field you want to plot, e.g. Cases
+            data_source (DataSource): Source of the data as requested
+
+        Returns:
+            DataSource: The data source to be used
         """
-        # check if a newer database is available (hopefully no one is calling that during European nights 
-        # as they are updated in the morning)
-        self.__get_latest_data()
-        # vaccination data is only available with OWID
         if data_source != DataSource.OWID: 
             if (wanted_attrib == Attributes.VaccineDosesAdministered) or (wanted_attrib == Attributes.DailyVaccineDosesAdministered7DayAverage):
                 data_source = DataSource.OWID
@@ -188,11 +434,207 @@ class Rest_API:
                 data_source = DataSource.OWID
             case (_, _): pass
         """
+        return data_source
+
+    @staticmethod
+    def normalize_plot_key(geo_ids, wanted_attrib, data_source, log=False, last_n=-1, since_n=-1, bar=False):
+        """ Returns a key that is identical for all requests that will generate the same plot. The GeoIDs are 
+        de-duplicated and sorted as the plot sorts the countries by name anyway, the data source is the one that
+        is really used and the optional arguments are mapped to their effective values.
+
+        Args:
+            see generate_plot
+
+        Returns:
+            tuple: A hashable key identifying the plot
+        """
+        return (tuple(sorted(set(geo_ids))),
+                wanted_attrib,
+                Rest_API.effective_data_source(wanted_attrib, data_source),
+                bool(log),
+                last_n if last_n > 0 else -1,
+                since_n,
+                bool(bar))
+
+    def generate_plot_coalesced(self, geo_ids, wanted_attrib, data_source, log=False, last_n=-1, since_n=-1, bar=False, trace=None):
+        """ Same as generate_plot, but concurrent calls for the same plot will await one computation and share 
+        its result. Returns the plot in form of a byteIO stream owned by the caller.
+
+        Args:
+            see generate_plot
+            trace (Trace, optional): receives the stages of the computation. If the call has been coalesced it
+                                     receives a 'coalesced' stage holding the waiting time followed by the stages of
+                                     the shared computation. If the plot has been taken from the cache it receives a
+                                     'cache' stage
+        """
+        if trace is None:
+            trace = Trace()
+        # check for newer data before looking into the cache
+        with trace.stage('latest_data'):
+            self.__check_for_newer_data()
+        # the data and its version are taken once, so the plot is computed, shared and cached for exactly this data
+        # even if newer data is loaded in the meantime
+        version, data = self.__get_data_and_version()
+        key = (version, Rest_API.normalize_plot_key(geo_ids, wanted_attrib, data_source, log, last_n, since_n, bar))
+        def compute():
+            # the stages of the computation, reported to the tracer only once
+            computeTrace = Trace(self.__tracer)
+            png = self.generate_plot(geo_ids, wanted_attrib, data_source, log, last_n, since_n, bar, 
+                                     trace=computeTrace, refresh=False, data=data).getvalue()
+            return png, computeTrace.get_stages()
+        png = self.__plotCache.get(key)
+        if png is not None:
+            trace.add('cache', 0.0)
+            return io.BytesIO(png)
+        start = time.perf_counter()
+        (png, stages), coalesced = self.__singleFlight.execute(key, compute)
+        if coalesced:
+            trace.add('coalesced', time.perf_counter() - start)
+        for name, seconds in stages:
+            trace.add(name, seconds)
+        self.__plotCache.put(key, png)
+        return io.BytesIO(png)
+
+    def __get_data_and_version(self):
+        """ Returns the version of the loaded data and the data of all data sources. The version is read first, as 
+        the data is replaced before its version, a plot of newer data might be kept under the older version but 
+        never the other way round
+        """
+        version = self.get_data_version()
+        return version, list(self.__data)
+
+    def get_coalescing_stats(self):
+        """ Returns the number of unique and coalesced plot computations
+
+        Returns:
+            dict: A dictionary holding the counters
+        """
+        return self.__singleFlight.get_stats()
+
+    def get_latency_stats(self):
+        """ Returns the latency summaries of the stages of generate_plot and of the endpoints
+
+        Returns:
+            dict: A dictionary holding the summaries
+        """
+        return self.__tracer.get_stats()
+
+    def __collect_metrics(self):
+        """ Returns the metrics of the REST-API in the Prometheus text format
+        """
+        texts = []
+        texts.append(Metrics.format_metric('covid_http_requests_total', 
+                                           'Number of HTTP requests by route, attribute and status code.', 
+                                           'counter', 
+                                           self.__requestCount.get_samples()))
+        texts.append(Metrics.format_histogram('covid_http_request_duration_seconds', 
+                                              'Latency of HTTP requests by route and attribute.', 
+                                              self.__requestLatency.get_series()))
+        texts.append(Metrics.format_histogram('covid_plot_stage_duration_seconds', 
+                                              'Latency of the stages of generating a plot.', 
+                                              [({'stage': name}, h) for name, h in sorted(self.__tracer.get_stage_histograms().items())]))
+        coalescing = self.get_coalescing_stats()
+        texts.append(Metrics.format_metric('covid_plot_computations_total', 
+                                           'Number of plot computations, coalesced ones have been served by an in-flight computation.', 
+                                           'counter', 
+                                           [({'kind': 'unique'}, coalescing['unique']), ({'kind': 'coalesced'}, coalescing['coalesced'])]))
+        texts.append(Metrics.format_metric('covid_plot_computations_inflight', 
+                                           'Number of plot computations in flight.', 
+                                           'gauge', 
+                                           [({}, coalescing['inflight'])]))
+        # the caches
+        plotCache = self.__plotCache.get_stats()
+        cacheSamples = [({'cache': 'plot', 'result': 'hit'}, plotCache['hits']), 
+                        ({'cache': 'plot', 'result': 'miss'}, plotCache['misses'])]
+        ratioSamples = [({'cache': 'plot'}, plotCache['hit_ratio'] if plotCache['hit_ratio'] is not None else 0.0)]
+        tileCache = self.__tileCache.get_stats()
+        cacheSamples.append(({'cache': 'tile', 'result': 'hit'}, tileCache['hits']))
+        cacheSamples.append(({'cache': 'tile', 'result': 'miss'}, tileCache['misses']))
+        ratioSamples.append(({'cache': 'tile'}, tileCache['hit_ratio'] if tileCache['hit_ratio'] is not None else 0.0))
+        for source in DataSource:
+            hits = self.__dataCache.get((source.value, 'hit'))
+            misses = self.__dataCache.get((source.value, 'miss'))
+            cacheSamples.append(({'cache': 'dataset_' + source.value, 'result': 'hit'}, hits))
+            cacheSamples.append(({'cache': 'dataset_' + source.value, 'result': 'miss'}, misses))
+            ratioSamples.append(({'cache': 'dataset_' + source.value}, hits / (hits + misses) if hits + misses > 0 else 0.0))
+        texts.append(Metrics.format_metric('covid_cache_requests_total', 'Number of cache lookups by cache and result.', 'counter', cacheSamples))
+        texts.append(Metrics.format_metric('covid_cache_hit_ratio', 'Ratio of cache hits to all cache lookups.', 'gauge', ratioSamples))
+        # the datasets
+        versionSamples = []
+        ageSamples = []
+        loadSamples = []
+        rowSamples = []
+        for source, info in zip(DataSource, self.__dataInfo):
+            if info is None:
+                continue
+            versionSamples.append(({'source': source.value, 'version': info['version']}, 1))
+            try:
+                ageSamples.append(({'source': source.value}, max(0.0, time.time() - os.path.getmtime(info['file']))))
+            except OSError:
+                pass
+            loadSamples.append(({'source': source.value}, info['loadSeconds']))
+            rowSamples.append(({'source': source.value}, info['rows']))
+        texts.append(Metrics.format_metric('covid_dataset_info', 'The version of the loaded dataset by source.', 'gauge', versionSamples))
+        texts.append(Metrics.format_metric('covid_dataset_age_seconds', 'Time since the dataset file has been written.', 'gauge', ageSamples))
+        texts.append(Metrics.format_metric('covid_dataset_load_duration_seconds', 'Time it took to load the dataset.', 'gauge', loadSamples))
+        texts.append(Metrics.format_metric('covid_dataset_rows', 'Number of rows of the dataset by source.', 'gauge', rowSamples))
+        texts.append(Metrics.format_metric('covid_ready', 'Whether the data of all sources is loaded.', 'gauge', [({}, self.is_ready())]))
+        # the process
+        rss = Metrics.get_process_rss_bytes()
+        if rss is not None:
+            texts.append(Metrics.format_metric('covid_process_resident_memory_bytes', 'Resident memory size of the process.', 'gauge', [({}, rss)]))
+        texts.append(Metrics.format_metric('covid_render_pool_queue_depth', 'Number of plots waiting for a free slot of the render pool.', 'gauge', 
+                                           [({}, self.__renderPool.get_queue_depth())]))
+        texts.append(Metrics.format_metric('covid_render_pool_active', 'Number of plots being rendered.', 'gauge', 
+                                           [({}, self.__renderPool.get_active())]))
+        texts.append(Metrics.format_metric('covid_render_pool_size', 'Number of slots of the render pool.', 'gauge', 
+                                           [({}, self.__renderPool.get_size())]))
+        return '\n'.join(texts)
+
+    def get_metrics(self):
+        """ Returns all metrics of the REST-API in the Prometheus text format
+
+        Returns:
+            str: The metrics
+        """
+        return self.__metrics.render()
+
+    def generate_plot(self, geo_ids, wanted_attrib, data_source, log=False, last_n=-1, since_n=-1, bar=False, trace=None, refresh=True, data=None):
+        """ Generates a plot for given GeoIds and returns it in form of a byteIO stream
+
+        Args:
+            geo_ids (String): countries that should be plotted
+            wanted_attrib (String): the field you want to plot, e.g. Cases
+            data_source (DataSource): Source of the data defined by the enum. Note! If vaccination data is selected and another
+                                       source than OWID is selected this will implicitly switch!
+            log (bool, optional): should the plot be logarithmic
+            last_n (int, optional): plot the last n days, if not further specified all available data is plotted
+            since_n (int, optional): plot since the nth case, if not further specified all available data is plotted
+            trace (Trace, optional): the trace collecting the duration of the stages. If not given a new trace reporting 
+                                     to the tracer of the REST-API is used
+            refresh (bool, optional): check for newer data before generating the plot
+            data (list, optional): the data of the WHO and OWID source to be used. Defaults to None to use the 
+                                   loaded data
+
+        Raises:
+            HTTPException: 503 in case the data is not loaded yet, 400 in case the data can't be collected
+        """
+        if trace is None:
+            trace = Trace(self.__tracer)
+        # check if a newer database is available (hopefully no one is calling that during European nights 
+        # as they are updated in the morning), it will be loaded in the background
+        if refresh:
+            with trace.stage('latest_data'):
+                self.__check_for_newer_data()
+        # vaccination data is only available with OWID
+        data_source = Rest_API.effective_data_source(wanted_attrib, data_source)
+        if data is None:
+            data = self.__data
         # use the actual data source
         if data_source == DataSource.WHO:
-            requestedData = self.__data[0]
+            requestedData = data[0]
         else:
-            requestedData = self.__data[1] 
+            requestedData = data[1] 
         """ 
         Alternatively in latest Python version
         match data_source:
@@ -203,68 +645,328 @@ class Rest_API:
         """
         # try to collect the data for given geoIds, if a wrong geoId is passed, the operation will abort with a 400
         # bad request error
-        try:
-            df = requestedData.get_data_by_geoid_list(geo_ids, lastNdays=last_n, sinceNcases=since_n)
-        except IndexError:
-            raise HTTPException(
-                status_code=400, detail="Couldn't load data")
+        with trace.stage('select'):
+            try:
+                df = requestedData.get_data_by_geoid_list(geo_ids, lastNdays=last_n, sinceNcases=since_n)
+            except IndexError:
+                raise HTTPException(
+                    status_code=400, detail="Couldn't load data")
 
         # if the wanted attribute is one that need to be calculated, calculate it
-        if wanted_attrib == Attributes.R or Attributes.R7:
-            df = requestedData.add_r0(df)
-        if wanted_attrib == Attributes.R7:
-            df = requestedData.add_lowpass_filter_for_attribute(df, 'R', 7)
-        if wanted_attrib == Attributes.DailyCases7:
-            df = requestedData.add_lowpass_filter_for_attribute(
-                df, 'DailyCases', 7)
-        if wanted_attrib == Attributes.DailyDeaths7:
-            df = requestedData.add_lowpass_filter_for_attribute(
-                df, 'DailyDeaths', 7)
-        if wanted_attrib == Attributes.DoublingTime7:
-            df = requestedData.add_lowpass_filter_for_attribute(
-                df, 'DoublingTime', 7)
-        if wanted_attrib == Attributes.Incidence7DayPer100Kpopulation:
-            df = requestedData.add_incidence_7day_per_100Kpopulation(df)
+        with trace.stage('attributes'):
+            if wanted_attrib == Attributes.R or Attributes.R7:
+                df = requestedData.add_r0(df)
+            if wanted_attrib == Attributes.R7:
+                df = requestedData.add_lowpass_filter_for_attribute(df, 'R', 7)
+            if wanted_attrib == Attributes.DailyCases7:
+                df = requestedData.add_lowpass_filter_for_attribute(
+                    df, 'DailyCases', 7)
+            if wanted_attrib == Attributes.DailyDeaths7:
+                df = requestedData.add_lowpass_filter_for_attribute(
+                    df, 'DailyDeaths', 7)
+            if wanted_attrib == Attributes.DoublingTime7:
+                df = requestedData.add_lowpass_filter_for_attribute(
+                    df, 'DoublingTime', 7)
+            if wanted_attrib == Attributes.Incidence7DayPer100Kpopulation:
+                df = requestedData.add_incidence_7day_per_100Kpopulation(df)
 
         # create pivot table with all needed values, if the x-axis shows a timedelta with days since the nth case the index
         # has to change
-        pldf = df.pivot_table(values=wanted_attrib.name, index='Date', columns='GeoName') if since_n == -1 \
-            else df.pivot_table(values=wanted_attrib.name, index=df.index, columns='GeoName')
-
-        # use the PlotterBuilder to set up the plot
-        builder = (PlotterBuilder(wanted_attrib)
-                   # .set_title(re.sub(r"([a-z])([A-Z])", r"\g<1> \g<2>", wanted_attrib.name))
-                   .set_title(AttributeTitles[wanted_attrib.value].value)
-                   .set_grid())
-        if log:
-            builder.set_log()
-        if since_n != -1:
-            # if the plot has a timedelta on the x-axis, the label has to be reset
-            builder.set_axis_labels(
-                xlabel="Days since case " + str(since_n))
-            builder.set_xaxis_index()
-        # take care of the y-axis format
-        if wanted_attrib == Attributes.R or wanted_attrib == Attributes.R7:
-            builder.set_yaxis_formatter(mpl.ticker.StrMethodFormatter('{x:,.2f}'))
-        if wanted_attrib == Attributes.PercentPeopleReceivedAllDoses or wanted_attrib == Attributes.PercentPeopleReceivedFirstDose:
-            builder.set_yaxis_formatter(mpl.ticker.PercentFormatter())
-        if wanted_attrib == Attributes.PercentDeaths:
-            builder.set_yaxis_formatter(mpl.ticker.PercentFormatter())
-        if wanted_attrib == Attributes.Incidence7DayPer100Kpopulation:
-            builder.set_yaxis_formatter(mpl.ticker.StrMethodFormatter('{x:,.2f}'))
-        # generate plot
-        fig, ax = builder.build()
-        if bar:
-            pldf.plot(ax=ax, kind='bar')
-        else:
-            pldf.plot(ax=ax)
-            ax.grid()
-        # write image to io stream
-        byte_io = io.BytesIO()
-        plt.savefig(byte_io, dpi=fig.dpi)
-        byte_io.seek(0)
+        with trace.stage('pivot'):
+            pldf = df.pivot_table(values=wanted_attrib.name, index='Date', columns='GeoName') if since_n == -1 \
+                else df.pivot_table(values=wanted_attrib.name, index=df.index, columns='GeoName')
+
+        # wait for a free slot of the render pool, pyplot isn't thread-safe
+        queueStart = time.perf_counter()
+        with self.__renderPool:
+            trace.add('queue', time.perf_counter() - queueStart)
+            byte_io = self.__render_plot(pldf, wanted_attrib, log, since_n, bar, trace)
+        return byte_io
+
+    def __render_plot(self, pldf, wanted_attrib, log, since_n, bar, trace):
+        """ Draws the pivot table of a plot and encodes it as PNG
+
+        Returns:
+            BytesIO: the PNG as a stream
+        """
+        # the backend is selected by MPLBACKEND at the import of this module
+        import matplotlib
+        import matplotlib.pyplot as plt
+        from PlotterBuilder import PlotterBuilder
+        # the figure is released in any case, pyplot would keep it alive otherwise
+        fig = None
+        try:
+            with trace.stage('draw'):
+                # use the PlotterBuilder to set up the plot
+                builder = (PlotterBuilder(wanted_attrib)
+                           # .set_title(re.sub(r"([a-z])([A-Z])", r"\g<1> \g<2>", wanted_attrib.name))
+                           .set_title(AttributeTitles[wanted_attrib.value].value)
+                           .set_grid())
+                if log:
+                    builder.set_log()
+                if since_n != -1:
+                    # if the plot has a timedelta on the x-axis, the label has to be reset
+                    builder.set_axis_labels(
+                        xlabel="Days since case " + str(since_n))
+                    builder.set_xaxis_index()
+                # take care of the y-axis format
+                if wanted_attrib == Attributes.R or wanted_attrib == Attributes.R7:
+                    builder.set_yaxis_formatter(matplotlib.ticker.StrMethodFormatter('{x:,.2f}'))
+                if wanted_attrib == Attributes.PercentPeopleReceivedAllDoses or wanted_attrib == Attributes.PercentPeopleReceivedFirstDose:
+                    builder.set_yaxis_formatter(matplotlib.ticker.PercentFormatter())
+                if wanted_attrib == Attributes.PercentDeaths:
+                    builder.set_yaxis_formatter(matplotlib.ticker.PercentFormatter())
+                if wanted_attrib == Attributes.Incidence7DayPer100Kpopulation:
+                    builder.set_yaxis_formatter(matplotlib.ticker.StrMethodFormatter('{x:,.2f}'))
+                # generate plot
+                fig, ax = builder.build()
+                if bar:
+                    pldf.plot(ax=ax, kind='bar')
+                else:
+                    pldf.plot(ax=ax)
+                    ax.grid()
+            # write image to io stream
+            with trace.stage('encode'):
+                byte_io = io.BytesIO()
+                fig.savefig(byte_io, dpi=fig.dpi)
+                byte_io.seek(0)
+        finally:
+            if fig is not None:
+                plt.close(fig)
         return byte_io
 
+    @staticmethod
+    def file_response(request, filename, cacheControl, media_type = None):
+        """ Returns a file with an ETag and a Cache-Control header or 304 (Not Modified) if the ETag of the request 
+        matches
+
+        Args:
+            request (Request): The request
+            filename (str): The file
+            cacheControl (str): The value of the Cache-Control header
+            media_type (str, optional): The media type. Defaults to None to guess it from the filename.
+
+        Raises:
+            HTTPException: 404 if the file doesn't exist
+
+        Returns:
+            Response: The response
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            raise HTTPException(status_code=404, detail='File not found')
+        etag = '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+        headers = {'ETag': etag, 'Cache-Control': cacheControl}
+        if Rest_API.is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(filename, headers=headers, media_type=media_type)
+
+    @staticmethod
+    def is_not_modified(request, etag):
+        """ Returns True if the If-None-Match header of the request matches the ETag
+
+        Args:
+            request (Request): The request
+            etag (str): The ETag of the response including the quotes
+
+        Returns:
+            bool: True if the client has the response already
+        """
+        ifNoneMatch = request.headers.get('If-None-Match')
+        if ifNoneMatch is None:
+            return False
+        etags = [tag.strip() for tag in ifNoneMatch.split(',')]
+        return '*' in etags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+
+    @staticmethod
+    def __find_geo_file(filename):
+        """ Returns the GeoJSON file in the data directory or in the data directory of the repository, None if it 
+        exists in neither of them
+        """
+        repositoryData = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'data')
+        for directory in [Rest_API.__get_data_directory(), repositoryData]:
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def __get_country_values(self):
+        """ Returns the latest values of the WHO data by GeoID, taken from a date-indexed snapshot of all countries. 
+        The counts are kept as integers, float32 isn't precise enough for them
+        """
+        import math
+        import pandas as pd
+        from CovidCases import CovidCases
+        data = self.__data[0]
+        df = data.get_all_data()
+        snapshot = CovidCases.get_date_indexed_snapshot(df, Rest_API.TILE_ATTRIBUTES + ['DailyCases', 'Population'], dtype=None)
+        # the last known value of each country
+        latest = {attribute: snapshot[attribute].ffill().iloc[-1] for attribute in Rest_API.TILE_ATTRIBUTES}
+        # the 7-day incidence of all countries in one go
+        incidence = snapshot['DailyCases'].rolling(7, min_periods=1).sum() * 100000 / snapshot['Population']
+        latest['Incidence7DayPer100Kpopulation'] = incidence.ffill().iloc[-1]
+        # the attributes holding counts
+        counts = [attribute for attribute in latest if attribute in df.columns and pd.api.types.is_integer_dtype(df[attribute])]
+        names = df.drop_duplicates(subset='GeoID', keep='last').set_index('GeoID')['GeoName']
+        values = {}
+        for geoID in snapshot.columns.get_level_values(1).unique():
+            properties = {'GeoName': names.get(geoID)}
+            for attribute, series in latest.items():
+                value = float(series[geoID])
+                if attribute in counts and not math.isnan(value):
+                    properties[attribute] = int(series[geoID])
+                else:
+                    properties[attribute] = round(value, 2)
+            values[geoID] = properties
+        return values
+
+    def __get_layer_version(self, layer):
+        """ Returns the GeoJSON file of a layer and the version of its geometry and values, the version of the 
+        countries includes the version of the WHO data
+
+        Raises:
+            HTTPException: 503 in case the data of the countries is not loaded yet
+
+        Returns:
+            tuple: The filename and the version, (None, None) if the GeoJSON file is missing
+        """
+        filename = Rest_API.__find_geo_file(Rest_API.TILE_SOURCES[layer][0])
+        if filename is None:
+            return None, None
+        version = get_content_hash(filename)[:16]
+        if layer == TileLayers.countries:
+            self.__check_for_newer_data()
+            version += '-' + self.get_data_version()[0][:16]
+        return filename, version
+
+    def __get_layer_source(self, layer, filename):
+        """ Returns the geometries of a layer and the properties of each one, the id, the name and the latest values
+        """
+        from GeometryCache import read_geo_file
+        _, uidColumn, nameColumn, attributes = Rest_API.TILE_SOURCES[layer]
+        geoDf = read_geo_file(filename)
+        values = self.__get_country_values() if layer == TileLayers.countries else {}
+        attributes = [attribute for attribute in attributes if attribute in geoDf.columns]
+        properties = []
+        for row in geoDf[[uidColumn, nameColumn] + attributes].itertuples(index=False):
+            uid = row[0]
+            item = {'id': uid, 'name': row[1]}
+            for attribute, value in zip(attributes, row[2:]):
+                item[attribute] = value.item() if hasattr(value, 'item') else value
+            item.update(values.get(uid, {}))
+            properties.append(item)
+        return geoDf.geometry, properties
+
+    def __build_tile_layer(self, layer, filename, version):
+        """ Builds the vector tiles of a layer, the tiles of the low zoom levels are encoded in advance
+        """
+        from VectorTiles import TileLayer
+        geometries, properties = self.__get_layer_source(layer, filename)
+        start = time.perf_counter()
+        tileLayer = TileLayer(layer.value, geometries, properties)
+        print('Built the vector tiles of ' + layer.value + ' in ' + '{:.1f}'.format(time.perf_counter() - start) + 's')
+        self.__tileLayers[layer] = (version, tileLayer)
+        return version, tileLayer
+
+    def get_tile(self, layer, z, x, y):
+        """ Returns a vector tile (MVT) of a layer. The tiles are built from the local GeoJSON files, the values of 
+        the countries from the loaded WHO data. The tiles of the low zoom levels are encoded when the layer is built,
+        the others on request and kept in a LRU cache.
+
+        Args:
+            layer (TileLayers): The layer
+            z (int): The zoom level
+            x (int): The column of the tile
+            y (int): The row of the tile, 0 is the north
+
+        Raises:
+            HTTPException: 404 if the GeoJSON of the layer is missing or the tile doesn't exist, 503 if the data is
+                           loading
+
+        Returns:
+            tuple: The tile and its version
+        """
+        from VectorTiles import MAX_ZOOM, PRECOMPUTED_ZOOM
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise HTTPException(status_code=404, detail='Unknown tile')
+        filename, version = self.__get_layer_version(layer)
+        if filename is None:
+            raise HTTPException(status_code=404, detail='The geometry of the layer is not available')
+        current = self.__tileLayers.get(layer)
+        if current is None or current[0] != version:
+            current = self.__tileFlight.do((layer, version), self.__build_tile_layer, layer, filename, version)
+        version, tileLayer = current
+        if z <= PRECOMPUTED_ZOOM:
+            return tileLayer.get_tile(z, x, y), version
+        cacheKey = (layer, version, z, x, y)
+        tile = self.__tileCache.get(cacheKey)
+        if tile is None:
+            tile = tileLayer.get_tile(z, x, y)
+            self.__tileCache.put(cacheKey, tile)
+        return tile, version
+
+    def __get_spatial_index(self):
+        """ Returns the spatial index of the layers, it is created on the first call
+        """
+        with self.__indexLock:
+            if self.__spatialIndex is None:
+                from SpatialIndex import SpatialIndex
+                self.__spatialIndex = SpatialIndex()
+            return self.__spatialIndex
+
+    def __index_layer(self, layer, filename, version):
+        """ Adds a layer to the spatial index or replaces the one of an older version
+        """
+        start = time.perf_counter()
+        geometries, properties = self.__get_layer_source(layer, filename)
+        self.__get_spatial_index().add_level(layer.value, geometries, properties)
+        self.__indexedVersions[layer] = version
+        print('Built the spatial index of ' + layer.value + ' in ' + '{:.1f}'.format(time.perf_counter() - start) + 's')
+
+    def locate(self, lats, lons, layers = None):
+        """ Returns the regions containing each point at the layers of the vector tiles and their latest values. 
+        Each layer is indexed once and indexed again only when its GeoJSON file or, for the countries, the data 
+        changes. A layer without GeoJSON file is left out. Only the countries need the WHO data, so a lookup of the 
+        German layers is served while it is loading.
+
+        Args:
+            lats (list): The latitudes
+            lons (list): The longitudes
+            layers (list, optional): The layers (TileLayers). Defaults to None (all).
+
+        Raises:
+            HTTPException: 422 if a coordinate is out of range, 503 if the countries are requested and the data is 
+                           loading
+
+        Returns:
+            list: The properties of the region or None by layer for each point
+        """
+        for lat, lon in zip(lats, lons):
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                raise HTTPException(status_code=422, detail='Invalid coordinate ' + str(lat) + ', ' + str(lon))
+        names = []
+        for layer in TileLayers:
+            if (layers is not None) and (layer not in layers):
+                continue
+            filename, version = self.__get_layer_version(layer)
+            if filename is None:
+                continue
+            if self.__indexedVersions.get(layer) != version:
+                self.__tileFlight.do(('locate', layer, version), self.__index_layer, layer, filename, version)
+            names.append(layer.value)
+        return self.__get_spatial_index().locate_many(lats, lons, names)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app: FastAPI):
+        """ The lifespan of the app, it starts loading the data in the background as soon as the app is serving
+
+        Args:
+            app (FastAPI): the API
+        """
+        self.start_loading()
+        yield
+
     def setup_routes(self, app: FastAPI):
         """ Setup of the route. The url has to be in the form:
             /api/data/<country codes comma separated>/<attribute to be plotted>
@@ -274,6 +976,56 @@ class Rest_API:
             app (FastAPI): the API
         """
 
+        @app.middleware('http')
+        async def time_request(request: Request, call_next):
+            """ Measures the latency of every request, keeps it in the histogram of the endpoint and adds it as the
+            'total' metric to the Server-Timing header
+            """
+            start = time.perf_counter()
+            response = await call_next(request)
+            seconds = time.perf_counter() - start
+            # the name of the endpoint function handling the request
+            endpoint = request.scope.get('endpoint')
+            self.__tracer.observe_endpoint(endpoint.__name__ if endpoint is not None else 'unmatched', seconds)
+            # the route template and the plotted attribute (if any) as labels of the metrics
+            route = request.scope.get('route')
+            routeName = route.path if route is not None else 'unmatched'
+            attribute = request.scope.get('path_params', {}).get('wanted_attrib', '')
+            # only valid attributes become labels, otherwise any client could create unlimited series
+            if attribute != '' and attribute not in Attributes.__members__:
+                attribute = 'invalid'
+            self.__requestCount.inc((routeName, attribute, str(response.status_code)))
+            self.__requestLatency.observe(seconds, (routeName, attribute))
+            total = 'total;dur={:.1f}'.format(seconds * 1000.0)
+            serverTiming = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = total if not serverTiming else serverTiming + ', ' + total
+            return response
+
+        @app.get('/healthz')
+        def get_health():
+            """ Liveness probe, returns 200 as long as the app is serving
+
+            Returns:
+                _type_: a JSON document
+            """
+            return {'status': 'ok'}
+
+        @app.get('/readyz')
+        def get_readiness():
+            """ Readiness probe, returns 200 as soon as the data is loaded and 503 (with a Retry-After header) 
+            before
+
+            Returns:
+                _type_: a JSON document
+            """
+            if self.__nextCheck == 0.0:
+                # nobody started the loader so far
+                self.start_loading()
+            readiness = self.get_readiness()
+            if readiness['ready']:
+                return readiness
+            return JSONResponse(readiness, status_code=503, headers={'Retry-After': str(Rest_API.RETRY_AFTER_SECONDS)})
+
         # setting up routes and implement methods
         @app.get('/api/data/{countries}/{wanted_attrib}')
         def get_data(countries: str, wanted_attrib: Attributes, dataSource: Optional[DataSource] = DataSource.WHO, sinceN: Optional[int] = None, lastN: Optional[int] = None, log: Optional[bool] = None, bar: Optional[bool] = None):
@@ -290,15 +1042,42 @@ class Rest_API:
             countries = countries.replace('EL', 'GR')
             countries = countries.replace('NA', 'NAM')
             geo_ids = re.split(r",\s*", countries)
-            file = self.generate_plot(geo_ids, wanted_attrib,
-                                      dataSource, last_n=lastN if lastN != None else -1, log=log, since_n=sinceN if sinceN != None else -1, bar=bar)
+            # collects the stages of the plot
+            trace = Trace()
+            file = self.generate_plot_coalesced(geo_ids, wanted_attrib,
+                                                dataSource, last_n=lastN if lastN != None else -1, log=log, since_n=sinceN if sinceN != None else -1, bar=bar, 
+                                                trace=trace)
 
             # return the created stream as png image
-            return StreamingResponse(file, media_type="image/png")
+            return StreamingResponse(file, media_type="image/png", headers={'Server-Timing': trace.server_timing()})
+
+        @app.get('/api/stats')
+        def get_stats():
+            """ Returns some statistics of the REST-API such as the number of unique and coalesced plot computations
+            and the latency of the plot stages and the endpoints
+
+            Returns:
+                _type_: a JSON document
+            """
+            result = {'coalescing': self.get_coalescing_stats(),
+                      'plotCache': self.__plotCache.get_stats(),
+                      'tileCache': self.__tileCache.get_stats()}
+            result.update(self.get_latency_stats())
+            return result
+
+        @app.get('/metrics')
+        def get_metrics():
+            """ Returns the metrics of the REST-API in the Prometheus text format
+
+            Returns:
+                _type_: a text document
+            """
+            return Response(self.get_metrics(), media_type=Metrics.CONTENT_TYPE)
 
         @app.get('/api/maps/{wanted_map}')
-        def get_map(wanted_map: Maps):
-            """ Returns a map in form of a interactive HTML document that can be shown in a browser
+        def get_map(wanted_map: Maps, request: Request):
+            """ Returns a map in form of a interactive HTML document that can be shown in a browser. The browser has 
+            to revalidate the map, it changes every day.
 
             Args:
                 wanted_map (Maps): Any of the support maps as a string
@@ -313,7 +1092,85 @@ class Rest_API:
                 print ('missing COVID_DATA environment variable')
                 return 'Data directory not found'
             # return the HTML file
-            return FileResponse(prefix + '/' + wanted_map.name + '.html')
+            return Rest_API.file_response(request, prefix + '/' + wanted_map.name + '.html', Rest_API.MAP_CACHE_CONTROL)
+
+        @app.get('/api/maps/assets/{asset}')
+        def get_map_asset(asset: str, request: Request):
+            """ Returns an asset of a map that doesn't embed its geometry and data, that is the geometry or the data of
+            a day as JSON. The name of an asset contains the hash of its content, so it can be cached forever.
+
+            Args:
+                asset (str): The filename of the asset
+
+            Returns:
+                _type_: a JSON file
+            """
+            # the prefix of the fileserver
+            try:
+                prefix = os.environ['COVID_DATA']
+            except:
+                print ('missing COVID_DATA environment variable')
+                return 'Data directory not found'
+            if not re.fullmatch(r'[A-Za-z0-9_-]+-[0-9a-f]{16}\.json', asset):
+                raise HTTPException(status_code=404, detail='Unknown asset')
+            filename = prefix + '/assets/' + asset
+            if not os.path.exists(filename):
+                raise HTTPException(status_code=404, detail='Unknown asset')
+            return Rest_API.file_response(request, filename, Rest_API.ASSET_CACHE_CONTROL, media_type='application/json')
+
+        @app.get('/api/tiles/{layer}/{z}/{x}/{y}.pbf')
+        def get_vector_tile(layer: TileLayers, z: int, x: int, y: int, request: Request):
+            """ Returns a Mapbox Vector Tile of the countries, the German states or the German counties with the 
+            latest values of each feature. A client such as MapLibre fetches only the tiles on its screen.
+
+            Args:
+                layer (TileLayers): The layer
+                z (int): The zoom level
+                x (int): The column of the tile
+                y (int): The row of the tile
+
+            Returns:
+                _type_: a protobuf document
+            """
+            from VectorTiles import MEDIA_TYPE
+            tile, version = self.get_tile(layer, z, x, y)
+            headers = {'ETag': '"' + version + '"', 'Cache-Control': Rest_API.TILE_CACHE_CONTROL}
+            if Rest_API.is_not_modified(request, headers['ETag']):
+                return Response(status_code=304, headers=headers)
+            return Response(tile, media_type=MEDIA_TYPE, headers=headers)
+
+        @app.get('/api/locate')
+        def locate(lat: float, lon: float, layers: Optional[List[TileLayers]] = Query(None)):
+            """ Returns the country, the German state and the German county containing a point with their latest 
+            values, None for the layers not containing it
+
+            Args:
+                lat (float): The latitude
+                lon (float): The longitude
+                layers (list, optional): The layers to look up, e.g. ?layers=states&layers=counties. Defaults to 
+                                         all layers.
+
+            Returns:
+                _type_: a JSON document
+            """
+            return {'lat': lat, 'lon': lon, 'regions': self.locate([lat], [lon], layers)[0]}
+
+        @app.post('/api/locate')
+        def locate_batch(body: LocateRequest):
+            """ Returns the regions of many points in one request, the points are pairs of latitude and longitude
+
+            Args:
+                body (LocateRequest): The points
+
+            Returns:
+                _type_: a JSON document with the regions of each point in the order of the points
+            """
+            if len(body.points) > Rest_API.MAX_LOCATE_POINTS:
+                raise HTTPException(status_code=413, 
+                                    detail='At most ' + str(Rest_API.MAX_LOCATE_POINTS) + ' points per request')
+            lats = [point[0] for point in body.points]
+            lons = [point[1] for point in body.points]
+            return {'regions': self.locate(lats, lons, body.layers)}
 
         @app.get('/api/csv/')
         def get_csv():
@@ -341,9 +1198,8 @@ class Rest_API:
                 print (msg)
                 return msg
 
-# change matplotlib backend to agg (agg is not interactive and it can't be interactive)
-matplotlib.use('agg')
 # create the REST API
-app = FastAPI()
+api = Rest_API()
+app = FastAPI(lifespan=api.lifespan)
 # define the routes (functions)
-Rest_API().setup_routes(app)
+api.setup_routes(app)
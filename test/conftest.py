@@ -0,0 +1,4 @@
+import os
+import sys
+# the modules of the src directory import each other without a package prefix, the tests import them the same way
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
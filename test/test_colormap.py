@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from Colormap import Colormap
+
+
+def test_lookup_table_matches_the_heatmap():
+    values = np.linspace(-10.0, 110.0, 2001)
+    colors = Colormap.heatmap_from_array(values, 0.0, 100.0)
+    expected = np.array([Colormap.heatmap_from_value(value, 0.0, 100.0) for value in values])
+    # one step of the table at most
+    assert np.abs(colors - expected).max() <= 4.0 / (len(Colormap.get_lut()) - 2)
+    assert Colormap.color_values_to_hex_triplets(colors[[0, -1]]) == ['#0000ff', '#ff0000']
+
+
+def test_blended_log_heatmap_of_a_dataframe():
+    df = pd.DataFrame({'Cases': [1.0, 100.0, np.nan]})
+    result = Colormap.heatmap_from_dataframe(df, 'Cases', useLog=True, blendValue=(0.0, 0.0, 0.0), blendFactor=0.5)
+    # NaN is white and blended like the other colors
+    assert Colormap.color_values_to_hex_triplets(result.colors) == ['#000080', '#800000', '#808080']
+    unblended = Colormap.heatmap_from_dataframe(df, 'Cases', useLog=True)
+    assert np.allclose(Colormap.blend_color_values(unblended.colors, (0.0, 0.0, 0.0), 0.5), result.colors)
+
+
+def test_heatmap_bar():
+    bar = Colormap.create_heatmap_bar((64, 4))
+    assert bar.size == (64, 4)
+    assert bar.getpixel((0, 3)) == (0, 0, 255)
+    assert bar.getpixel((63, 0)) == (255, 0, 0)
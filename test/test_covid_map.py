@@ -0,0 +1,34 @@
+import os
+import pandas as pd
+from datetime import date
+from PIL import Image
+from CovidMap import CovidMap, mapInfo
+
+
+def test_date_range_is_rendered_in_parallel(tmp_path):
+    df = pd.DataFrame({'Date': pd.to_datetime(['2021-01-01', '2021-01-01', '2021-01-02', '2021-01-03', '2021-01-03']),
+                       'GeoID': ['DE', 'FR', 'DE', 'DE', 'FR'],
+                       'Cases': [10, 20, 30, 5, 0]})
+    covidMap = CovidMap(df)
+    for workers in [1, 2]:
+        info = mapInfo('Cases', 'Cases', str(tmp_path / str(workers)))
+        report = covidMap.create_map_for_date_range(info, date(2021, 1, 1), date(2021, 1, 4), workers)
+        assert report['frames'] == 3
+        assert report['errors'] == []
+        assert report['framesPerSecond'] > 0
+        directory = tmp_path / str(workers) / 'Cases'
+        assert sorted(os.listdir(directory)) == ['2021-01-01-Cases.svg', '2021-01-02-Cases.svg', '2021-01-03-Cases.svg']
+        assert '20.0000' in (directory / '2021-01-01-Cases.svg').read_text(encoding='utf-8')
+
+
+def test_heatmap_bar_is_added_to_all_png(tmp_path):
+    directory = tmp_path / 'Cases'
+    directory.mkdir()
+    for day in range(3):
+        Image.new('RGB', (1920, 1080)).save(directory / ('2021-01-0' + str(day + 1) + '-Cases.png'))
+    report = CovidMap.add_heatmap_bar_to_all_png(mapInfo('Cases', 'Cases', str(tmp_path)), workers=2)
+    assert report['frames'] == 3
+    assert report['errors'] == []
+    image = Image.open(directory / '2021-01-02-Cases.png')
+    assert image.getpixel((690, 850)) == (3, 3, 232)
+    assert image.getpixel((690 + 1023, 850 + 31)) == (232, 3, 3)
@@ -0,0 +1,35 @@
+import time
+import threading
+from DatasetProvider import DatasetProvider
+
+
+def test_dataset_is_loaded_once():
+    provider = DatasetProvider()
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.1)
+        return {'data': 42}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.get('WHO', load))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert all(result is results[0] for result in results)
+    assert provider.get_stats() == {'loads': 1, 'hits': 7}
+
+
+def test_failed_load_is_not_kept():
+    provider = DatasetProvider()
+
+    def fail():
+        raise IOError('no data')
+    try:
+        provider.get('OWID', fail)
+        assert False
+    except IOError:
+        pass
+    assert provider.get('OWID', lambda: 'data') == 'data'
@@ -0,0 +1,164 @@
+import os
+import hashlib
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from Downloader import download_file, get_content_hash
+
+# the content served by the stand-in server and the number of requests per status code
+served = {'body': b'', 'etag': '"v1"', 'status': None}
+responses = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # the response is recorded before it is sent, the client might check it as soon as it is received
+        if self.path != '/data.csv':
+            responses.append(404)
+            self.send_response(404)
+            self.end_headers()
+            return
+        if served['status'] is not None:
+            # a failing server
+            responses.append(served['status'])
+            self.send_response(served['status'])
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == served['etag']:
+            responses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        responses.append(200)
+        self.send_response(200)
+        self.send_header('ETag', served['etag'])
+        self.send_header('Content-Length', str(len(served['body'])))
+        self.end_headers()
+        self.wfile.write(served['body'])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def setup_module():
+    global server, url
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:' + str(server.server_port)
+
+
+def teardown_module():
+    server.shutdown()
+
+
+def test_download_and_not_modified(tmp_path):
+    state = str(tmp_path / 'state.json')
+    served['body'] = b'a,b\n1,2\n' * 100000
+    served['etag'] = '"v1"'
+    first = download_file(url + '/data.csv', str(tmp_path / 'day1.csv'), state)
+    assert first == str(tmp_path / 'day1.csv')
+    assert open(first, 'rb').read() == served['body']
+    # the server reports the file as not modified, the new name is a link to the same content
+    second = download_file(url + '/data.csv', str(tmp_path / 'day2.csv'), state)
+    assert second == str(tmp_path / 'day2.csv')
+    assert os.path.samefile(first, second)
+    assert get_content_hash(second) == get_content_hash(first) == hashlib.sha256(served['body']).hexdigest()
+    assert responses[-2:] == [200, 304]
+    # a new version
+    served['body'] = b'a,b\n3,4\n'
+    served['etag'] = '"v2"'
+    third = download_file(url + '/data.csv', str(tmp_path / 'day3.csv'), state)
+    assert third == str(tmp_path / 'day3.csv')
+    assert open(third, 'rb').read() == b'a,b\n3,4\n'
+    assert get_content_hash(third) != get_content_hash(first)
+    # no temporary files are left, the content is stored once
+    assert sorted(os.listdir(tmp_path)) == ['blobs', 'day1.csv', 'day2.csv', 'day3.csv', 'state.json']
+    assert len(os.listdir(tmp_path / 'blobs')) == 2
+
+
+def test_unchanged_content_is_deduplicated(tmp_path):
+    # a server without ETag support sends the same content again
+    state = str(tmp_path / 'state.json')
+    served['body'] = b'same\n'
+    served['etag'] = '"v4"'
+    first = download_file(url + '/data.csv', str(tmp_path / 'day1.csv'), state)
+    os.remove(state)
+    second = download_file(url + '/data.csv', str(tmp_path / 'day2.csv'), state)
+    assert os.path.samefile(first, second)
+    assert os.listdir(tmp_path / 'blobs') == [hashlib.sha256(b'same\n').hexdigest() + '.csv']
+
+
+def test_min_check_interval(tmp_path):
+    state = str(tmp_path / 'state.json')
+    served['body'] = b'x\n'
+    served['etag'] = '"v3"'
+    first = download_file(url + '/data.csv', str(tmp_path / 'day1.csv'), state)
+    count = len(responses)
+    # no request within the interval
+    assert download_file(url + '/data.csv', str(tmp_path / 'day2.csv'), state, minCheckInterval=3600) == first
+    assert len(responses) == count
+
+
+def test_error_without_previous_file(tmp_path):
+    try:
+        download_file(url + '/missing.csv', str(tmp_path / 'day1.csv'), str(tmp_path / 'state.json'))
+        assert False
+    except FileNotFoundError:
+        pass
+    assert os.listdir(tmp_path) == []
+
+
+def test_server_error_uses_previous_file(tmp_path):
+    state = str(tmp_path / 'state.json')
+    served['body'] = b'y\n'
+    served['etag'] = '"v5"'
+    first = download_file(url + '/data.csv', str(tmp_path / 'day1.csv'), state)
+    served['status'] = 503
+    try:
+        # like a network error
+        assert download_file(url + '/data.csv', str(tmp_path / 'day2.csv'), state) == first
+        assert responses[-1] == 503
+        # without a previous file
+        try:
+            download_file(url + '/data.csv', str(tmp_path / 'other.csv'), str(tmp_path / 'other.json'))
+            assert False
+        except FileNotFoundError:
+            pass
+    finally:
+        served['status'] = None
+
+
+def test_not_modified_without_blob_downloads_again(tmp_path):
+    state = str(tmp_path / 'state.json')
+    served['body'] = b'z\n'
+    served['etag'] = '"v6"'
+    download_file(url + '/data.csv', str(tmp_path / 'day1.csv'), state)
+    for blob in os.listdir(tmp_path / 'blobs'):
+        os.remove(tmp_path / 'blobs' / blob)
+    second = download_file(url + '/data.csv', str(tmp_path / 'day2.csv'), state)
+    assert second == str(tmp_path / 'day2.csv')
+    assert responses[-2:] == [304, 200]
+    assert open(second, 'rb').read() == b'z\n'
+    assert os.listdir(tmp_path / 'blobs') == [hashlib.sha256(b'z\n').hexdigest() + '.csv']
+
+
+def test_older_downloads_are_removed(tmp_path):
+    state = str(tmp_path / 'state.json')
+    served['body'] = b'first\n'
+    served['etag'] = '"v7"'
+    download_file(url + '/data.csv', str(tmp_path / '2022-03-01-data.csv'), state)
+    # the blob is older than the grace period
+    for blob in os.listdir(tmp_path / 'blobs'):
+        os.utime(tmp_path / 'blobs' / blob, (0, 0))
+    served['body'] = b'second\n'
+    served['etag'] = '"v8"'
+    download_file(url + '/data.csv', str(tmp_path / '2022-03-05-data.csv'), state)
+    # within the days to keep
+    assert sorted(os.listdir(tmp_path / 'blobs')) == sorted([hashlib.sha256(b'first\n').hexdigest() + '.csv',
+                                                              hashlib.sha256(b'second\n').hexdigest() + '.csv'])
+    served['body'] = b'third\n'
+    served['etag'] = '"v9"'
+    download_file(url + '/data.csv', str(tmp_path / '2022-03-12-data.csv'), state)
+    # the file of the first day is rotated and its blob is removed, the blob of the second one is in its grace period
+    assert sorted(os.listdir(tmp_path)) == ['2022-03-05-data.csv', '2022-03-12-data.csv', 'blobs', 'state.json']
+    assert sorted(os.listdir(tmp_path / 'blobs')) == sorted([hashlib.sha256(b'second\n').hexdigest() + '.csv',
+                                                              hashlib.sha256(b'third\n').hexdigest() + '.csv'])
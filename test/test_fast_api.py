@@ -1,9 +1,51 @@
 from fastapi.testclient import TestClient
+import os
+import io
 import json
+import threading
+import pytest
+import time
 from re import search
-from src.rest.app import app
+from fastapi import HTTPException
+from src.rest.app import app, api, Attributes, DataSource
 
 client = TestClient(app)
+# the small WHO and OWID files of the tests that must not depend on the live data
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def setup_module():
+    # the data is loaded in the background, wait until the app is ready
+    for i in range(600):
+        if client.get("/readyz").status_code == 200:
+            return
+        time.sleep(0.1)
+
+
+@pytest.fixture(scope="module")
+def fixture_datasets():
+    from CovidCasesWHO import CovidCasesWHO
+    from CovidCasesOWID import CovidCasesOWID
+    from Downloader import get_content_hash
+    datasets = []
+    for dataClass, name in [(CovidCasesWHO, "WHO-fixture.csv"), (CovidCasesOWID, "OWID-fixture.csv")]:
+        filename = os.path.join(FIXTURE_DIRECTORY, name)
+        data = dataClass(filename)
+        datasets.append((data, {"version": get_content_hash(filename), "file": filename, "loadSeconds": 0.0,
+                                "rows": data.get_number_of_rows()}))
+    return datasets
+
+
+@pytest.fixture
+def fixture_data(monkeypatch, fixture_datasets):
+    # the loader of the live data must not replace the fixture data
+    loader = api._Rest_API__loader
+    if loader is not None:
+        loader.join(60)
+    monkeypatch.setattr(api, "start_loading", lambda: None)
+    monkeypatch.setattr(api, "_Rest_API__check_for_newer_data", lambda: None)
+    monkeypatch.setattr(api, "_Rest_API__data", [data for data, info in fixture_datasets])
+    monkeypatch.setattr(api, "_Rest_API__dataInfo", [info for data, info in fixture_datasets])
 
 # REST API calls, that dont provide the expected parameters (Not Found) (countries and wanted_attrib are essential)
 
@@ -208,3 +250,286 @@ def test_data_source_vaccination_but_not_owid():
     response = client.get(
         "/api/data/DE/DailyVaccineDosesAdministered7DayAverage?dataSource=ECDC")
     assert response.status_code == 200
+
+# Statistics tests
+
+
+def test_stats_coalescing():
+    response = client.get("/api/stats")
+    assert response.status_code == 200
+    stats = response.json()["coalescing"]
+    assert stats["unique"] >= 0
+    assert stats["coalesced"] >= 0
+    assert stats["inflight"] == 0
+
+
+def fake_plots(monkeypatch, data, version):
+    # the plots of the fake data show the name of the data, each rendering waits until release is set
+    state = {"data": data, "version": version, "renders": 0, "release": threading.Event()}
+
+    def generate_plot(*args, data=None, **kwargs):
+        state["renders"] += 1
+        assert state["release"].wait(10)
+        return io.BytesIO(data[0].encode())
+
+    monkeypatch.setattr(api, "_Rest_API__check_for_newer_data", lambda: None)
+    monkeypatch.setattr(api, "_Rest_API__data", data)
+    monkeypatch.setattr(api, "get_data_version", lambda: state["version"])
+    monkeypatch.setattr(api, "generate_plot", generate_plot)
+    return state
+
+
+def request_plots(count, results):
+    threads = [threading.Thread(target=lambda: results.append(
+        api.generate_plot_coalesced(["XX"], Attributes.Deaths, DataSource.WHO, last_n=4711).getvalue()))
+        for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_for(condition):
+    for i in range(1000):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("timeout")
+
+
+def test_concurrent_requests_share_one_render(monkeypatch):
+    state = fake_plots(monkeypatch, ["who", "owid"], ("v1", "v1"))
+    before = api.get_coalescing_stats()
+    results = []
+    threads = request_plots(8, results)
+    # all but the first request wait for the render of the first one
+    wait_for(lambda: api.get_coalescing_stats()["coalesced"] - before["coalesced"] == 7)
+    state["release"].set()
+    for thread in threads:
+        thread.join()
+    stats = api.get_coalescing_stats()
+    assert state["renders"] == 1
+    assert stats["unique"] - before["unique"] == 1
+    assert stats["coalesced"] - before["coalesced"] == 7
+    assert results == [b"who"] * 8
+
+
+def test_requests_of_newer_data_do_not_join_older_renders(monkeypatch):
+    state = fake_plots(monkeypatch, ["old", "old"], ("v2", "v2"))
+    oldResults = []
+    oldThreads = request_plots(1, oldResults)
+    wait_for(lambda: state["renders"] == 1)
+    # the data is swapped while the plot of the old data is rendered
+    monkeypatch.setattr(api, "_Rest_API__data", ["new", "new"])
+    state["version"] = ("v3", "v3")
+    newResults = []
+    newThreads = request_plots(1, newResults)
+    wait_for(lambda: state["renders"] == 2)
+    state["release"].set()
+    for thread in oldThreads + newThreads:
+        thread.join()
+    assert oldResults == [b"old"]
+    assert newResults == [b"new"]
+    # the cached plot of the new version is the one of the new data
+    for thread in request_plots(1, newResults):
+        thread.join()
+    assert newResults == [b"new", b"new"]
+    assert state["renders"] == 2
+
+
+def test_server_timing_header(fixture_data):
+    response = client.get("/api/data/FR/Cases?lastN=14")
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    for stage in ["select", "pivot", "draw", "encode", "total"]:
+        assert search(stage + ";dur=", timing)
+    stats = client.get("/api/stats").json()
+    assert stats["stages"]["encode"]["count"] >= 1
+    assert stats["endpoints"]["get_data"]["count"] >= 1
+
+
+def test_failed_plot_releases_the_figure():
+    import matplotlib.pyplot as plt
+    from Tracing import Trace
+
+    class FailingPivot:
+        def plot(self, **kwargs):
+            raise ValueError("drawing failed")
+
+    figures = len(plt.get_fignums())
+    with pytest.raises(ValueError):
+        api._Rest_API__render_plot(FailingPivot(), Attributes.Cases, False, -1, False, Trace())
+    assert len(plt.get_fignums()) == figures
+
+
+def test_plot_cache_hit(fixture_data):
+    first = client.get("/api/data/FR,DE/Deaths?lastN=14")
+    second = client.get("/api/data/DE,FR/Deaths?lastN=14")
+    assert first.status_code == 200
+    assert second.content == first.content
+    assert search("cache;dur=", second.headers["Server-Timing"])
+
+# Metrics tests
+
+
+def test_metrics_prometheus_format(fixture_data):
+    client.get("/api/data/DE/Cases?lastN=7")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert '# TYPE covid_http_requests_total counter' in text
+    assert 'covid_http_requests_total{route="/api/data/{countries}/{wanted_attrib}",attribute="Cases",status="200"}' in text
+    assert 'covid_http_request_duration_seconds_bucket{route="/api/data/{countries}/{wanted_attrib}",attribute="Cases",le="+Inf"}' in text
+    assert 'covid_cache_hit_ratio{cache="plot"}' in text
+    assert 'covid_dataset_info{source="WHO"' in text
+    assert 'covid_dataset_rows{source="OWID"}' in text
+    assert 'covid_render_pool_queue_depth 0' in text
+    assert 'covid_plot_computations_total{kind="unique"}' in text
+
+
+def test_metrics_ignore_invalid_attributes():
+    assert client.get("/api/data/DE/Bogus12345?lastN=7").status_code == 422
+    text = client.get("/metrics").text
+    assert 'Bogus12345' not in text
+    assert 'covid_http_requests_total{route="/api/data/{countries}/{wanted_attrib}",attribute="invalid",status="422"}' in text
+
+
+def test_healthz():
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readyz(fixture_data):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["ready"] == True
+    assert response.json()["versions"]["WHO"] is not None
+    assert "covid_ready 1" in client.get("/metrics").text
+
+# Map tests
+
+
+def test_map_asset_is_cached_forever(tmp_path, monkeypatch):
+    # the files are written into a temporary data directory, not into the real one
+    monkeypatch.setenv("COVID_DATA", str(tmp_path))
+    directory = os.path.join(str(tmp_path), "assets")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "MapTest-data-0123456789abcdef.json"), "w") as f:
+        f.write('[{"RS": "01001"}]')
+    response = client.get("/api/maps/assets/MapTest-data-0123456789abcdef.json")
+    assert response.status_code == 200
+    assert response.json() == [{"RS": "01001"}]
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    notModified = client.get("/api/maps/assets/MapTest-data-0123456789abcdef.json", 
+                             headers={"If-None-Match": response.headers["etag"]})
+    assert notModified.status_code == 304
+    assert client.get("/api/maps/assets/..%2Fapp.py").status_code == 404
+    assert client.get("/api/maps/assets/MapTest-data-fedcba9876543210.json").status_code == 404
+
+
+def test_map_is_revalidated(tmp_path, monkeypatch):
+    monkeypatch.setenv("COVID_DATA", str(tmp_path))
+    with open(os.path.join(str(tmp_path), "MapWorld.html"), "w") as f:
+        f.write("<html></html>")
+    response = client.get("/api/maps/MapWorld")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert client.get("/api/maps/MapWorld", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+# Vector tile tests
+
+
+def test_vector_tile_of_the_states(tmp_path, monkeypatch):
+    # the fixture must not replace the GeoJSON of the real data directory
+    monkeypatch.setenv("COVID_DATA", str(tmp_path))
+    states = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"AGS_TXT": "11", "LAN_ew_GEN": "Berlin", "Fallzahl": 12, "cases7_bl_per_100k": 3.5},
+         "geometry": {"type": "Polygon", "coordinates": [[[13.1, 52.3], [13.8, 52.3], [13.8, 52.7], [13.1, 52.7], [13.1, 52.3]]]}}]}
+    with open(os.path.join(str(tmp_path), "RKI_Corona_Bundeslaender.geojson"), "w") as f:
+        json.dump(states, f)
+    # Berlin is in the tile 8/137/83
+    response = client.get("/api/tiles/states/8/137/83.pbf")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert b"Berlin" in response.content
+    notModified = client.get("/api/tiles/states/8/137/83.pbf", headers={"If-None-Match": response.headers["etag"]})
+    assert notModified.status_code == 304
+    # the tile is empty, but exists
+    assert client.get("/api/tiles/states/8/0/0.pbf").content == b""
+    assert client.get("/api/tiles/states/1/2/0.pbf").status_code == 404
+    assert client.get("/api/tiles/rivers/0/0/0.pbf").status_code == 422
+
+
+def test_country_values_keep_exact_counts(monkeypatch):
+    import pandas as pd
+
+    class FakeWHO:
+        def get_all_data(self):
+            # the cumulative counts exceed the precision of float32
+            return pd.DataFrame({"Date": pd.to_datetime(["2022-01-01", "2022-01-02", "2022-01-01"]),
+                                 "GeoID": ["US", "US", "DE"],
+                                 "GeoName": ["United States", "United States", "Germany"],
+                                 "Cases": [103436820, 103436829, 5],
+                                 "Deaths": [1123000, 1123001, 1],
+                                 "CasesPerMillionPopulation": [310000.25, 310000.5, 0.1],
+                                 "DeathsPerMillionPopulation": [3370.0, 3370.5, 0.01],
+                                 "PercentDeaths": [1.085, 1.086, 20.0],
+                                 "DailyCases": [10, 9, 5],
+                                 "Population": [331000000, 331000000, 83000000]})
+
+    monkeypatch.setattr(api, "_Rest_API__data", [FakeWHO(), None])
+    values = api._Rest_API__get_country_values()
+    assert values["US"]["Cases"] == 103436829
+    assert isinstance(values["US"]["Cases"], int)
+    assert values["US"]["Deaths"] == 1123001
+    assert values["US"]["CasesPerMillionPopulation"] == 310000.5
+    # the last known value of a country without data of the last day
+    assert values["DE"]["Cases"] == 5
+
+
+def test_vector_tile_of_the_countries(fixture_data):
+    response = client.get("/api/tiles/countries/0/0/0.pbf")
+    assert response.status_code == 200
+    assert b"countries" in response.content
+
+
+# Point lookup tests
+
+
+def test_locate_point(fixture_data):
+    response = client.get("/api/locate?lat=52.5&lon=13.4")
+    assert response.status_code == 200
+    regions = response.json()["regions"]
+    assert regions["countries"]["id"] == "DE"
+    assert client.get("/api/locate?lat=95&lon=13.4").status_code == 422
+
+
+def test_locate_batch(fixture_data):
+    response = client.post("/api/locate", json={"points": [[52.5, 13.4], [0.0, -30.0], [48.85, 2.35]]})
+    assert response.status_code == 200
+    regions = response.json()["regions"]
+    assert [region["countries"] and region["countries"]["id"] for region in regions] == ["DE", None, "FR"]
+    assert client.post("/api/locate", json={"points": [[0.0, 0.0]] * 10001}).status_code == 413
+
+
+def test_locate_german_layers_while_loading(tmp_path, monkeypatch):
+    monkeypatch.setenv("COVID_DATA", str(tmp_path))
+    states = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"AGS_TXT": "11", "LAN_ew_GEN": "Berlin", "Fallzahl": 12},
+         "geometry": {"type": "Polygon", "coordinates": [[[13.1, 52.3], [13.8, 52.3], [13.8, 52.7], [13.1, 52.7], [13.1, 52.3]]]}}]}
+    with open(os.path.join(str(tmp_path), "RKI_Corona_Bundeslaender.geojson"), "w") as f:
+        json.dump(states, f)
+
+    def loading():
+        raise HTTPException(status_code=503, detail="The data is loading")
+
+    # the WHO data is still loading, only the countries need it
+    monkeypatch.setattr(api, "_Rest_API__check_for_newer_data", loading)
+    response = client.get("/api/locate?lat=52.5&lon=13.4&layers=states")
+    assert response.status_code == 200
+    assert response.json()["regions"] == {"states": {"id": "11", "name": "Berlin", "Fallzahl": 12}}
+    response = client.post("/api/locate", json={"points": [[52.5, 13.4], [0.0, 0.0]], "layers": ["states"]})
+    assert response.json()["regions"] == [{"states": {"id": "11", "name": "Berlin", "Fallzahl": 12}}, {"states": None}]
+    assert client.get("/api/locate?lat=52.5&lon=13.4").status_code == 503
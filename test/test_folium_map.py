@@ -0,0 +1,58 @@
+import pandas as pd
+import geopandas as gpd
+from datetime import date
+from shapely.geometry import box
+from CovidFoliumMap import CovidFoliumMap
+
+
+class CountyMap(CovidFoliumMap):
+    def __init__(self, directory):
+        # the Berlin districts are sorted differently in the geo and the data df
+        self.geo = gpd.GeoDataFrame({'RS': ['11001', '01001', '11002'], 'county': ['Mitte', 'Flensburg', 'Kreuzberg']},
+                                    geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1), box(2, 0, 3, 1)], crs='EPSG:4326')
+        self.data = pd.DataFrame({'RS': ['01001', '11002', '11001', '99999'],
+                                  'GeoName': ['Flensburg', 'Kreuzberg', 'Mitte', 'Nowhere'],
+                                  'Cases': [1, 2, 3, 4],
+                                  'Deaths': [0.0, 1.0, 2.0, 3.0]})
+        self.options = CovidFoliumMap.mapOptions(mapAlias='MapCounties', mapLocation=[0, 0], mapDate=date(2022, 1, 1), bins=None,
+                                                 tooltipAttributes=['GeoName', 'Cases'])
+        super().__init__(directory)
+
+    def get_data_df(self):
+        return self.data
+
+    def get_geo_df(self):
+        return self.geo
+
+    def get_default_map_options(self):
+        return self.options
+
+    def get_merge_UID(self):
+        return 'RS'
+
+    def get_nice_basemaps(self):
+        return ['cartodbpositron']
+
+
+def test_geo_and_data_are_joined_once_by_the_merge_uid(tmp_path):
+    countyMap = CountyMap(str(tmp_path))
+    joined, topology = countyMap.get_joined_df()
+    assert topology is None
+    # the rows and the geometry of the geo df keyed by the RS
+    assert list(joined.index) == ['11001', '01001', '11002']
+    assert list(joined['GeoName']) == ['Mitte', 'Flensburg', 'Kreuzberg']
+    assert list(joined['Cases']) == [3, 1, 2]
+    assert joined.geometry.iloc[1].equals(box(1, 0, 2, 1))
+    # the maps of other attributes take the columns of the same joined df
+    assert countyMap.create_default_map('cartodbpositron', 'Cases') is not None
+    assert countyMap.create_default_map('cartodbpositron', 'Deaths') is not None
+    assert countyMap.get_joined_df()[0] is joined
+
+
+def test_input_fingerprint_changes_with_the_data(tmp_path):
+    countyMap = CountyMap(str(tmp_path))
+    fingerprint = countyMap.get_input_fingerprint()
+    assert fingerprint == CountyMap(str(tmp_path)).get_input_fingerprint()
+    countyMap.data.loc[0, 'Cases'] = 5
+    assert countyMap.get_input_fingerprint()['data'] != fingerprint['data']
+    assert countyMap.get_input_fingerprint()['geometry'] == fingerprint['geometry']
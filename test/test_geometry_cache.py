@@ -0,0 +1,58 @@
+import os
+import json
+import geopandas as gpd
+from GeometryCache import read_geo_file, get_cache_filename, get_simplified_topology, GEO_CACHE_DIRECTORY
+
+
+def write_geojson(filename, names):
+    features = [{'type': 'Feature',
+                 'properties': {'RS': name},
+                 'geometry': {'type': 'Point', 'coordinates': [index, index]}} for index, name in enumerate(names)]
+    with open(filename, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def test_normalized_frame_is_cached(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'counties.geojson')
+    write_geojson(filename, ['02000', '01001'])
+    parsed = []
+    readFile = gpd.read_file
+    monkeypatch.setattr(gpd, 'read_file', lambda name: parsed.append(name) or readFile(name))
+
+    def normalize(df):
+        return df.sort_values('RS').reset_index()
+    first = read_geo_file(filename, normalize, 'sorted')
+    second = read_geo_file(filename, normalize, 'sorted')
+    assert len(parsed) == 1
+    assert list(second['RS']) == ['01001', '02000']
+    assert isinstance(second, gpd.GeoDataFrame)
+    assert second.equals(first)
+    # another normalization of the same file is cached separately
+    assert list(read_geo_file(filename)['RS']) == ['02000', '01001']
+    assert len(parsed) == 2
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    filename = str(tmp_path / 'states.geojson')
+    write_geojson(filename, ['01'])
+    read_geo_file(filename)
+    oldCacheFilename = get_cache_filename(filename)
+    write_geojson(filename, ['01', '02'])
+    assert list(read_geo_file(filename)['RS']) == ['01', '02']
+    # the outdated frame is removed
+    assert not os.path.exists(oldCacheFilename)
+    assert os.listdir(str(tmp_path / GEO_CACHE_DIRECTORY)) == [os.path.basename(get_cache_filename(filename))]
+
+
+def test_unused_topologies_are_removed(tmp_path):
+    from shapely.geometry import box
+    geometries = gpd.GeoSeries([box(0, 0, 1, 1)])
+    get_simplified_topology(geometries, 0.01, 4, str(tmp_path))
+    directory = tmp_path / GEO_CACHE_DIRECTORY
+    unused = os.listdir(directory)
+    assert len(unused) == 1
+    # not used for more than a week
+    os.utime(directory / unused[0], (0, 0))
+    get_simplified_topology(geometries, 0.02, 4, str(tmp_path))
+    assert len(os.listdir(directory)) == 1
+    assert os.listdir(directory) != unused
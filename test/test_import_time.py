@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+
+# the src directory
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# the import time budgets in seconds, measured by python -X importtime, both take about 0.35 seconds
+REST_API_BUDGET = 1.0
+MAP_GENERATOR_BUDGET = 1.0
+
+# heavy packages that must not be imported before they are used
+HEAVY_MODULES = ['matplotlib', 'geopandas', 'folium', 'requests']
+
+
+def import_module(module):
+    # import the module in a fresh interpreter, report the imported heavy modules and return the cumulative import time
+    code = ('import sys; sys.path.insert(0, "."); import ' + module + '; '
+            'print("heavy:" + ",".join(m for m in ' + repr(HEAVY_MODULES) + ' if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=SRC, capture_output=True, text=True, check=True)
+    heavy = [m for m in result.stdout.split('heavy:')[-1].strip().split(',') if m]
+    # the line looks like 'import time:   self [us] | cumulative | imported package'
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return heavy, int(parts[1]) / 1e6
+    raise AssertionError('no import time reported for ' + module)
+
+
+def test_import_time_rest_api():
+    heavy, seconds = import_module('rest.app')
+    assert heavy == []
+    assert seconds < REST_API_BUDGET
+
+
+def test_import_time_map_generator():
+    heavy, seconds = import_module('CovidFoliumMapGenerator')
+    assert heavy == []
+    assert seconds < MAP_GENERATOR_BUDGET
+
+
+def test_rest_api_selects_the_agg_backend():
+    code = ('import sys; sys.path.insert(0, "."); import rest.app; import matplotlib.pyplot; '
+            'print(matplotlib.get_backend().lower())')
+    result = subprocess.run([sys.executable, '-c', code], cwd=SRC, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == 'agg'
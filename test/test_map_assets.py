@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from MapAssets import write_asset, get_time_series_json, ASSET_DIRECTORY
+from CovidCases import CovidCases
+
+
+def test_asset_is_named_by_its_content(tmp_path):
+    url = write_asset(str(tmp_path), 'geometry', '{"type": "FeatureCollection"}')
+    assert url.startswith(ASSET_DIRECTORY + '/geometry-') and url.endswith('.json')
+    assert write_asset(str(tmp_path), 'geometry', '{"type": "FeatureCollection"}') == url
+    assert write_asset(str(tmp_path), 'geometry', '{"type": "Topology"}') != url
+    with open(os.path.join(str(tmp_path), url)) as f:
+        assert f.read() == '{"type": "FeatureCollection"}'
+
+
+def test_old_data_assets_are_removed(tmp_path):
+    urls = []
+    for day in range(4):
+        urls.append(write_asset(str(tmp_path), 'MapWorld-data', '[' + str(day) + ']', keep=2))
+        # the assets are ordered by their modification time
+        time.sleep(0.01)
+    files = sorted(os.listdir(str(tmp_path / ASSET_DIRECTORY)))
+    assert files == sorted(os.path.basename(url) for url in urls[2:])
+
+
+def test_unused_geometry_assets_are_removed(tmp_path):
+    old = write_asset(str(tmp_path), 'geometry', '{"type": "Topology"}')
+    used = write_asset(str(tmp_path), 'geometry', '{"type": "FeatureCollection"}')
+    # not used for two days
+    twoDaysAgo = time.time() - 2 * 24 * 3600
+    os.utime(os.path.join(str(tmp_path), old), (twoDaysAgo, twoDaysAgo))
+    os.utime(os.path.join(str(tmp_path), used), (twoDaysAgo, twoDaysAgo))
+    assert write_asset(str(tmp_path), 'geometry', '{"type": "FeatureCollection"}', maxAge=24 * 3600) == used
+    assert os.listdir(str(tmp_path / ASSET_DIRECTORY)) == [os.path.basename(used)]
+
+
+def test_data_assets_need_the_alias_of_the_map(tmp_path):
+    import folium
+    import geopandas as gpd
+    from shapely.geometry import box
+    from MapAssets import add_layered_choropleth, add_time_slider_choropleth
+    geoDf = gpd.GeoDataFrame({'GeoID': ['DE']}, geometry=[box(0, 0, 1, 1)], crs='EPSG:4326')
+    dataDf = pd.DataFrame({'GeoID': ['DE'], 'Cases': [1.0]})
+    with pytest.raises(ValueError):
+        add_layered_choropleth(folium.Map(), geoDf, dataDf, 'GeoID', ['Cases'], ['Cases'], [[0, 1, 2, 3]], ['Cases'],
+                               dataDirectory=str(tmp_path))
+    with pytest.raises(ValueError):
+        add_time_slider_choropleth(folium.Map(), geoDf, pd.DataFrame({'DE': [1.0]}), 'GeoID', 'Cases', [0, 1, 2, 3],
+                                   dataDirectory=str(tmp_path))
+
+
+def test_time_series_is_one_matrix_of_the_snapshot():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2022-01-02', '2022-01-01', '2022-01-01', '2022-01-02']),
+                       'GeoID': ['DE', 'DE', 'FR', 'FR'],
+                       'GeoName': ['Germany', 'Germany', 'France', 'France'],
+                       'Incidence7DayPer100Kpopulation': [2.04, 1.0, np.nan, 4.0]})
+    snapshot = CovidCases.get_date_indexed_snapshot(df, ['Incidence7DayPer100Kpopulation', 'Missing'])
+    series = json.loads(get_time_series_json(snapshot['Incidence7DayPer100Kpopulation']))
+    assert series == {'index': ['2022-01-01', '2022-01-02'],
+                      'columns': ['DE', 'FR'],
+                      'data': [[1.0, None], [2.0, 4.0]]}
+
+
+def test_streamed_map_is_the_saved_map(tmp_path):
+    import gzip
+    import re
+    import folium
+    from MapWriter import write_map
+
+    def create_map():
+        map = folium.Map(location=[0, 0], tiles=None)
+        features = [{'type': 'Feature', 'properties': {'name': '<' + str(index) + '>'},
+                     'geometry': {'type': 'Point', 'coordinates': [index, index]}} for index in range(100)]
+        folium.GeoJson({'type': 'FeatureCollection', 'features': features}).add_to(map)
+        return map
+
+    def read(filename, opener = open):
+        # the names of the elements differ
+        with opener(filename, 'rt') as f:
+            return re.sub('_[0-9a-f]{32}', '', f.read())
+    create_map().save(str(tmp_path / 'saved.html'))
+    report = write_map(create_map(), str(tmp_path / 'streamed.html'), traceMemory=True)
+    write_map(create_map(), str(tmp_path / 'streamed.html.gz'), compress=True)
+    assert report['size'] == os.path.getsize(str(tmp_path / 'streamed.html'))
+    assert report['peakMemory'] > 0
+    assert read(str(tmp_path / 'streamed.html')) == read(str(tmp_path / 'saved.html'))
+    assert read(str(tmp_path / 'streamed.html.gz'), gzip.open) == read(str(tmp_path / 'saved.html'))
+
+
+def test_streamed_choropleths_are_the_saved_maps(tmp_path):
+    import re
+    import folium
+    import geopandas as gpd
+    import pandas as pd
+    from jinja2 import Template
+    from shapely.geometry import box
+    from folium.features import GeoJson
+    from MapWriter import write_map, render_with_placeholders
+    from MapAssets import add_layered_choropleth
+    geoDf = gpd.GeoDataFrame({'GeoID': ['A' + str(index) for index in range(80)]},
+                             geometry=[box(index, 0, index + 1, 1) for index in range(80)], crs='EPSG:4326')
+    dataDf = pd.DataFrame({'GeoID': geoDf['GeoID'], 'GeoName': ['<' + str(index) + '>' for index in range(80)],
+                           'Cases': [float(index) for index in range(80)]})
+
+    class PlainGeoJson(GeoJson):
+        # a template rendering the data without the tojson filter can't be streamed
+        _template = Template(u"""
+            {% macro script(this, kwargs) %}
+                var {{ this.get_name() }} = {{ this.data }};
+            {% endmacro %}
+            """)
+
+    def create_choropleth():
+        map = folium.Map(location=[0, 0], tiles=None)
+        folium.Choropleth(geo_data=geoDf.to_json(), data=dataDf, columns=['GeoID', 'Cases'], 
+                          key_on='feature.properties.GeoID').add_to(map)
+        return map
+
+    def create_layered_choropleth():
+        map = folium.Map(location=[0, 0], tiles=None)
+        add_layered_choropleth(map, geoDf, dataDf, 'GeoID', ['Cases'], ['Cases'], [[0, 20, 40, 60, 80]], ['GeoName', 'Cases'])
+        return map
+
+    def create_plain_geojson():
+        map = folium.Map(location=[0, 0], tiles=None)
+        PlainGeoJson(geoDf.to_json()).add_to(map)
+        return map
+
+    def read(filename):
+        # the names of the elements differ
+        with open(filename, 'rt') as f:
+            return re.sub('_[0-9a-f]{32}', '', f.read())
+    for index, create_map in enumerate([create_choropleth, create_layered_choropleth, create_plain_geojson]):
+        create_map().save(str(tmp_path / (str(index) + '-saved.html')))
+        write_map(create_map(), str(tmp_path / (str(index) + '-streamed.html')))
+        assert read(str(tmp_path / (str(index) + '-streamed.html'))) == read(str(tmp_path / (str(index) + '-saved.html')))
+    # the GeoJSON of the choropleth and the layers are streamed, the plain GeoJSON is rendered as usual
+    assert len(render_with_placeholders(create_choropleth())[1]) > 0
+    assert len(render_with_placeholders(create_layered_choropleth())[1]) > 0
+    assert len(render_with_placeholders(create_plain_geojson())[1]) == 0
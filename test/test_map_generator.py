@@ -0,0 +1,137 @@
+import os
+from datetime import date
+from types import SimpleNamespace
+from CovidFoliumMapGenerator import get_map_jobs, run_map_jobs
+
+
+class FakeMap:
+    def __init__(self, directory, alias, fail = False):
+        self.directory = directory
+        self.options = SimpleNamespace(mapAlias=alias, bins=[0, 1])
+        self.fail = fail
+        self.data = 'data'
+        self.created = 0
+
+    def get_default_map_options(self):
+        return self.options
+
+    def get_geo_df(self):
+        return 'geo'
+
+    def get_input_fingerprint(self):
+        return {'data': self.data, 'geometry': 'geo'}
+
+    def get_data_directory(self):
+        return self.directory
+
+    def get_nice_basemaps(self):
+        return ['basemap']
+
+    def create_default_map(self, basemap, coloredAttribute = None, coloredAttributeAlias = None):
+        if self.fail:
+            raise RuntimeError('no data')
+        self.created += 1
+        text = str(coloredAttribute) + ' ' + str(self.options.bins)
+        return SimpleNamespace(save=lambda filename: open(filename, 'w').write(text))
+
+    def save_map(self, map, filename):
+        map.save(filename)
+
+
+def test_jobs_of_the_maps(tmp_path):
+    jobs = get_map_jobs([FakeMap(str(tmp_path), 'MapWorld'), FakeMap(str(tmp_path), 'MapDEageStates')])
+    assert [job.index for job in jobs] == [0, 1]
+    # one map with a layer per attribute
+    assert jobs[0].coloredAttribute == ['Incidence7DayPer100Kpopulation', 'PercentDeaths', 'CasesPerMillionPopulation']
+    assert jobs[1].coloredAttribute == 'Percent cases by age: 0-14'
+
+
+def test_failed_job_is_isolated(tmp_path):
+    for workers, traceMemory in [(1, True), (2, False)]:
+        directory = tmp_path / str(workers)
+        directory.mkdir()
+        mapObjects = [FakeMap(str(directory), 'MapEurope', fail=True), FakeMap(str(directory), 'MapAsia')]
+        reports = run_map_jobs(mapObjects, workers, traceMemory)
+        assert [report['name'] for report in reports] == ['MapEurope', 'MapAsia']
+        assert [report['error'] is None for report in reports] == [False, True]
+        assert 'no data' in reports[0]['error']
+        assert all(report['peakMemory'] is not None for report in reports)
+        assert (directory / 'MapAsia.html').read_text() == 'None [0, 1]'
+
+
+def test_unchanged_map_is_skipped(tmp_path):
+    mapObject = FakeMap(str(tmp_path), 'MapAsia')
+    reports = run_map_jobs([mapObject], 1)
+    assert reports[0]['skipped'] == False
+    assert (tmp_path / 'MapAsia.fingerprint').exists()
+    # the same inputs
+    reports = run_map_jobs([mapObject], 1)
+    assert reports[0]['skipped'] == True
+    assert reports[0]['size'] == len('None [0, 1]')
+    assert mapObject.created == 1
+    # newer data, other options or forced
+    mapObject.data = 'newer data'
+    assert run_map_jobs([mapObject], 1)[0]['skipped'] == False
+    mapObject.options.bins = [0, 2]
+    assert run_map_jobs([mapObject], 1)[0]['skipped'] == False
+    assert run_map_jobs([mapObject], 1, force=True)[0]['skipped'] == False
+    assert mapObject.created == 4
+    # the map was removed
+    (tmp_path / 'MapAsia.html').unlink()
+    assert run_map_jobs([mapObject], 1)[0]['skipped'] == False
+
+
+def test_map_of_unchanged_data_is_skipped_the_next_day(tmp_path, monkeypatch):
+    import geopandas as gpd
+    from shapely.geometry import box
+    import CovidFoliumMapWHO
+    from CovidCasesWHO import CovidCasesWHO
+    from DatasetProvider import DatasetProvider
+    # the WHO reports weekly
+    rows = ['Date_reported,Country_code,Country,WHO_region,New_cases,Cumulative_cases,New_deaths,Cumulative_deaths']
+    for day in ['2022-02-20', '2022-02-27', '2022-03-06']:
+        rows.append(day + ',DE,Germany,EURO,700,0,7,0')
+        rows.append(day + ',FR,France,EURO,1400,0,14,0')
+    (tmp_path / 'who.csv').write_text('\n'.join(rows) + '\n')
+    geo = gpd.GeoDataFrame({'Name': ['Germany', 'France'], 'ISO-3166-alpha_3': ['DEU', 'FRA'], 'GeoID': ['DE', 'FR']},
+                           geometry=[box(5, 47, 15, 55), box(-5, 42, 8, 51)], crs='EPSG:4326')
+    reports = []
+    for today in [date(2022, 3, 9), date(2022, 3, 10)]:
+        class Today(date):
+            @classmethod
+            def today(cls):
+                return cls(today.year, today.month, today.day)
+        monkeypatch.setattr(CovidFoliumMapWHO, 'date', Today)
+        provider = DatasetProvider(str(tmp_path))
+        provider.get('WorldCountriesMedRes.geojson', lambda: geo.copy())
+        provider.get('WHO', lambda: CovidCasesWHO(str(tmp_path / 'who.csv')))
+        mapObject = CovidFoliumMapWHO.CovidFoliumMapWHO(CovidFoliumMapWHO.Continents.Europe, str(tmp_path), 
+                                                        provider=provider)
+        # the date of the newest report
+        assert mapObject.get_default_map_options().mapDate == date(2022, 3, 6)
+        reports.append(run_map_jobs([mapObject], 1)[0])
+    assert [report['error'] for report in reports] == [None, None]
+    assert [report['skipped'] for report in reports] == [False, True]
+
+
+def test_assets_of_a_skipped_map_are_kept(tmp_path):
+    from MapAssets import write_asset
+
+    class SplitMap(FakeMap):
+        def create_default_map(self, basemap, coloredAttribute = None, coloredAttributeAlias = None):
+            self.created += 1
+            url = write_asset(self.directory, 'geometry', '{"type": "Topology"}')
+            return SimpleNamespace(save=lambda filename: open(filename, 'w').write('fetch("' + url + '")'))
+    mapObject = SplitMap(str(tmp_path), 'MapAsia')
+    mapObject.options.splitAssets = True
+    assert run_map_jobs([mapObject], 1)[0]['skipped'] == False
+    asset = next((tmp_path / 'assets').glob('geometry-*.json'))
+    # a skipped map marks its assets as used
+    os.utime(asset, (0, 0))
+    assert run_map_jobs([mapObject], 1)[0]['skipped'] == True
+    assert asset.stat().st_mtime > 0
+    # a removed asset is written again
+    asset.unlink()
+    assert run_map_jobs([mapObject], 1)[0]['skipped'] == False
+    assert asset.exists()
+    assert mapObject.created == 2
@@ -0,0 +1,55 @@
+import os
+import pandas as pd
+from datetime import date
+from CovidFoliumMapRKIageAndGender import DownloadAndPreprocessRKIdata
+
+
+def write_master_file(directory):
+    # a small RKI master file, the rows with NeuerFall == -9 are invalid
+    rows = [(1, 1001, 'A00-A04', 'M', 3, 0),
+            (1, 1001, 'A00-A04', 'W', 2, 1),
+            (1, 1001, 'A80+', 'W', 5, -1),
+            (1, 1001, 'A80+', 'W', 7, -9),
+            (1, 1002, 'A15-A34', 'unbekannt', 4, 0),
+            (2, 2000, 'A35-A59', 'M', 1, 0),
+            (2, 2000, 'unbekannt', 'M', 6, 0)]
+    df = pd.DataFrame(rows, columns=['IdBundesland', 'IdLandkreis', 'Altersgruppe', 'Geschlecht', 'AnzahlFall', 'NeuerFall'])
+    df['Meldedatum'] = '2022/01/01'
+    df['Datenstand'] = '01.02.2022'
+    df.to_csv(os.path.join(directory, date.today().strftime('%Y-%m-%d') + '-RKI_COVID19-db.csv'), index=False)
+
+
+def test_sums_by_county(tmp_path):
+    write_master_file(str(tmp_path))
+    # a small chunk size folds several chunks together
+    df = DownloadAndPreprocessRKIdata(str(tmp_path), chunkSize=2).get_age_and_gender_data_by_county().set_index('RS')
+    assert list(df.index) == ['01001', '01002', '02000']
+    assert df.loc['01001', 'Cases by age: 0-4'] == 5
+    assert df.loc['01001', 'Cases by age: 80+'] == 5
+    assert df.loc['01001', 'Cases by gender: female'] == 7
+    assert df.loc['01002', 'Cases by age: 80+'] == 0
+    assert df.loc['02000', 'Cases by gender: male'] == 7
+    assert df.loc['01001', 'Percent cases by age: 0-14'] == 50.0
+
+
+def test_sums_by_state(tmp_path):
+    write_master_file(str(tmp_path))
+    df = DownloadAndPreprocessRKIdata(str(tmp_path)).get_age_and_gender_data_by_state().set_index('AGS_TXT')
+    assert list(df.index) == ['00001', '00002']
+    assert df.loc['00001', 'Cases by age: 15-34'] == 4
+    assert df.loc['00002', 'Cases by gender: male'] == 7
+
+
+def test_time_series_from_the_cube(tmp_path):
+    write_master_file(str(tmp_path))
+    ps = DownloadAndPreprocessRKIdata(str(tmp_path))
+    df = ps.get_age_and_gender_time_series('Cases by gender: female', 28)
+    assert list(df.columns) == ['01001', '01002', '02000']
+    # the cube holds the current cases, the removed ones (NeuerFall == -1) are not counted
+    assert list(df['01001']) == [2]
+    df = ps.get_age_and_gender_time_series('7-day cases by age: 0-4', 28, byState=True)
+    assert list(df.columns) == ['01', '02']
+    assert list(df['01']) == [5]
+    assert ps.get_age_and_gender_time_series('Bogus', 28) is None
+    # the cube is kept for the next day
+    assert os.path.exists(os.path.join(str(tmp_path), 'RKI_COVID19_cube.npz'))
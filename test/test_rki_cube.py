@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from RKICube import RKICube
+
+COLUMNS = ['IdBundesland', 'IdLandkreis', 'Altersgruppe', 'Geschlecht', 'Meldedatum', 'AnzahlFall', 'NeuerFall', 'Datenstand']
+# the cases of the first day
+DAY1 = [(9, 9162, 'A80+', 'W', '2022/01/01 00:00:00+00', 2, 0),
+        (9, 9162, 'A80+', 'M', '2022/01/03 00:00:00+00', 1, 0),
+        (9, 9184, 'A15-A34', 'W', '2022/01/02 00:00:00+00', 4, 0),
+        (1, 1001, 'A80+', 'W', '2022/01/02 00:00:00+00', 3, 0),
+        (1, 1001, 'A05-A14', 'unbekannt', '2022/01/03 00:00:00+00', 1, 0)]
+# the second day removes a case of 9184 and adds cases of a new county and a new day
+DAY2 = [(9, 9162, 'A80+', 'W', '2022/01/01 00:00:00+00', 2, 0),
+        (9, 9162, 'A80+', 'M', '2022/01/03 00:00:00+00', 1, 0),
+        (9, 9184, 'A15-A34', 'W', '2022/01/02 00:00:00+00', 3, 0),
+        (9, 9184, 'A15-A34', 'W', '2022/01/02 00:00:00+00', -1, -1),
+        (1, 1001, 'A80+', 'W', '2022/01/02 00:00:00+00', 3, 0),
+        (1, 1001, 'A05-A14', 'unbekannt', '2022/01/03 00:00:00+00', 1, 0),
+        (9, 9190, 'A80+', 'W', '2022/01/04 00:00:00+00', 5, 1),
+        (9, 9162, 'unbekannt', 'M', '2022/01/04 00:00:00+00', 7, -9)]
+
+
+def write_master_file(filename, rows, dataDate):
+    df = pd.DataFrame([row + (dataDate,) for row in rows], columns=COLUMNS)
+    df.to_csv(filename, index=False)
+    return filename
+
+
+def test_build_and_slice(tmp_path):
+    cube = RKICube.build(write_master_file(str(tmp_path / 'day1.csv'), DAY1, '01.02.2022, 00:00 Uhr'), chunkSize=2)
+    assert list(cube.get_counties()) == [1001, 9162, 9184]
+    assert list(cube.get_dates().strftime('%Y-%m-%d')) == ['2022-01-01', '2022-01-02', '2022-01-03']
+    assert cube.get_counts().dtype == np.int32
+    # 80+ in Bavaria
+    assert list(cube.get_series(state=9, ages=['A80+'])) == [2, 0, 1]
+    assert list(cube.get_series(genders=['W'], lastDays=2)) == [7, 0]
+    assert list(cube.get_series(counties=[1001])) == [0, 3, 1]
+    incidence = cube.get_incidence(100000, days=2, lastDays=2, state=9)
+    assert list(incidence) == [6.0, 5.0]
+
+
+def test_incremental_update(tmp_path):
+    day1 = write_master_file(str(tmp_path / 'day1.csv'), DAY1, '01.02.2022, 00:00 Uhr')
+    day2 = write_master_file(str(tmp_path / 'day2.csv'), DAY2, '02.02.2022, 00:00 Uhr')
+    cubeFilename = str(tmp_path / 'cube.npz')
+    RKICube.update_or_build(cubeFilename, day1)
+    updated = RKICube.update_or_build(cubeFilename, day2)
+    built = RKICube.build(day2)
+    assert str(updated.get_data_date()) == '2022-02-02'
+    assert list(updated.get_counties()) == list(built.get_counties())
+    assert (updated.get_dates() == built.get_dates()).all()
+    assert (updated.get_counts() == built.get_counts()).all()
+    # the saved cube is the updated one
+    loaded = RKICube.load(cubeFilename)
+    assert (loaded.get_counts() == built.get_counts()).all()
+    assert loaded.get_data_date() == updated.get_data_date()
+
+
+def test_frame_by_county_and_state(tmp_path):
+    cube = RKICube.build(write_master_file(str(tmp_path / 'day1.csv'), DAY1, '01.02.2022, 00:00 Uhr'))
+    df = cube.get_frame(ages=['A80+'])
+    assert list(df.columns) == [1001, 9162, 9184]
+    assert list(df[9162]) == [2, 0, 1]
+    df = cube.get_frame(genders=['W'], byState=True)
+    assert list(df.columns) == [1, 9]
+    assert list(df[9]) == [2, 4, 0]
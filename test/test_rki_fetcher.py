@@ -0,0 +1,68 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from RKIFetcher import fetch_districts, fetch_states
+
+# the data of the stand-in API
+DISTRICTS = {id: {'ags': id, 'name': 'County ' + id, 'cases': int(id)} for id in ['01001', '01002', '01003', '01004']}
+STATES = {'SH': {'abbreviation': 'SH', 'name': 'Schleswig-Holstein'}, 'HH': {'abbreviation': 'HH', 'name': 'Hamburg'}}
+# the requested paths and whether the bulk endpoints are available
+paths = []
+options = {'bulk': True}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        paths.append(self.path)
+        parts = self.path.strip('/').split('/')
+        regions = {'districts': DISTRICTS, 'states': STATES}.get(parts[0])
+        if regions is None or (len(parts) == 1 and not options['bulk']) or (len(parts) == 2 and parts[1] not in regions):
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = regions if len(parts) == 1 else {parts[1]: regions[parts[1]]}
+        body = json.dumps({'data': data}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def setup_module():
+    global server, url
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:' + str(server.server_port)
+
+
+def teardown_module():
+    server.shutdown()
+
+
+def test_bulk_request():
+    options['bulk'] = True
+    del paths[:]
+    records, failures = fetch_districts(['01003', '01001', '09999'], baseUrl=url)
+    assert [r['ags'] for r in records] == ['01003', '01001']
+    assert list(failures.keys()) == ['09999']
+    assert paths == ['/districts']
+
+
+def test_concurrent_requests_with_partial_failure():
+    options['bulk'] = False
+    del paths[:]
+    records, failures = fetch_districts(['01004', '01002', '09999', '01001'], baseUrl=url, maxWorkers=2)
+    assert [r['ags'] for r in records] == ['01004', '01002', '01001']
+    assert list(failures.keys()) == ['09999']
+    assert sorted(paths) == ['/districts', '/districts/01001', '/districts/01002', '/districts/01004', '/districts/09999']
+
+
+def test_states():
+    options['bulk'] = False
+    records, failures = fetch_states(['HH', 'SH'], baseUrl=url, useBulk=False)
+    assert [r['name'] for r in records] == ['Hamburg', 'Schleswig-Holstein']
+    assert failures == {}
@@ -0,0 +1,24 @@
+from shapely.geometry import box
+from SpatialIndex import SpatialIndex
+
+
+def test_points_are_located_at_every_level():
+    spatialIndex = SpatialIndex()
+    spatialIndex.add_level('countries', [box(0, 0, 10, 10), box(10, 0, 20, 10)],
+                           [{'id': 'A', 'Cases': 1.0}, {'id': 'B', 'Cases': float('nan')}])
+    spatialIndex.add_level('counties', [box(0, 0, 5, 5)], [{'id': 'A1'}])
+    assert spatialIndex.locate(2, 3) == {'countries': {'id': 'A', 'Cases': 1.0}, 'counties': {'id': 'A1'}}
+    # NaN is returned as None
+    assert spatialIndex.locate(5, 15) == {'countries': {'id': 'B', 'Cases': None}, 'counties': None}
+    # the batch keeps the order of the points, a point on a border is in the first region
+    regions = spatialIndex.locate_many([5, 50, 5], [10, 50, 1])
+    assert [region['countries'] and region['countries']['id'] for region in regions] == ['A', None, 'A']
+    # only the selected levels
+    assert spatialIndex.locate_many([2], [3], ['counties']) == [{'counties': {'id': 'A1'}}]
+
+
+def test_geometries_of_the_caller_are_not_prepared():
+    import shapely
+    geometries = [box(0, 0, 10, 10)]
+    SpatialIndex().add_level('countries', geometries, [{'id': 'A'}])
+    assert not shapely.is_prepared(geometries[0])
@@ -0,0 +1,56 @@
+import os
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+from Topology import Topology
+
+# a wiggly border between two neighbours, simplifying them one by one would open gaps
+BORDER = [(1.0, 0.0), (1.001, 0.25), (0.999, 0.5), (1.001, 0.75), (1.0, 1.0)]
+WEST = Polygon([(0.0, 0.0)] + BORDER + [(0.0, 1.0)])
+EAST = Polygon(BORDER + [(2.0, 1.0), (2.0, 0.0)])
+
+
+def test_neighbours_share_the_simplified_border():
+    topology = Topology(gpd.GeoSeries([WEST, EAST]), precision=4)
+    # the common border is stored once
+    assert topology.get_arc_count() == 3
+    topology.simplify(0.01)
+    west, east = topology.to_geometries()
+    assert len(west.exterior.coords) == 5
+    assert west.intersection(east).area == 0
+    union = unary_union([west, east])
+    assert union.geom_type == 'Polygon'
+    assert abs(union.area - 2.0) < 1e-9
+
+
+def test_topojson_is_quantized_and_delta_encoded():
+    topology = Topology(gpd.GeoSeries([WEST, None]), precision=2)
+    topojson = topology.to_topojson([{'RS': '01'}, {'RS': '02'}], 'counties')
+    geometries = topojson['objects']['counties']['geometries']
+    assert geometries[0]['type'] == 'Polygon'
+    assert geometries[0]['properties'] == {'RS': '01'}
+    assert geometries[1] == {'type': None, 'properties': {'RS': '02'}}
+    assert topojson['transform']['scale'] == [0.01, 0.01]
+    # decode the ring
+    x = y = 0
+    points = []
+    for dx, dy in topojson['arcs'][geometries[0]['arcs'][0][0]]:
+        x, y = x + dx, y + dy
+        points.append((x * 0.01, y * 0.01))
+    assert Polygon(points).equals(Polygon([(0, 0), (1, 0), (1, 0.25), (1, 0.5), (1, 0.75), (1, 1), (0, 1)]))
+
+
+def test_simplified_world_stays_valid():
+    import shapely
+    world = gpd.read_file(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'WorldCountriesMedRes.geojson'))
+    quantized = Topology(world.geometry, precision=4)
+    valid = shapely.is_valid(np.array(quantized.to_geometries(), dtype=object))
+    topology = Topology(world.geometry, precision=4)
+    topology.simplify(0.1)
+    assert topology.get_point_count() < quantized.get_point_count()
+    # the arcs of crossing or vanishing features are restored, only the features invalid before might be invalid
+    simplified = np.array(topology.to_geometries(), dtype=object)
+    assert (shapely.is_valid(simplified) | ~valid).all()
+    # e.g. Liechtenstein
+    assert not shapely.is_missing(simplified[world['admin'] == 'Liechtenstein'][0])
@@ -0,0 +1,101 @@
+import struct
+import geopandas as gpd
+from shapely.geometry import Polygon, box
+from VectorTiles import TileLayer, EXTENT
+
+
+def read_varint(data, position):
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return result, position
+
+
+def read_message(data):
+    """ Returns the fields of a protobuf message as a list of (number, value) """
+    fields = []
+    position = 0
+    while position < len(data):
+        key, position = read_varint(data, position)
+        number, wireType = key >> 3, key & 7
+        if wireType == 0:
+            value, position = read_varint(data, position)
+        elif wireType == 1:
+            value, position = struct.unpack('<d', data[position:position + 8])[0], position + 8
+        else:
+            length, position = read_varint(data, position)
+            value, position = data[position:position + length], position + length
+        fields.append((number, value))
+    return fields
+
+
+def read_packed(data):
+    values = []
+    position = 0
+    while position < len(data):
+        value, position = read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def decode_tile(tile):
+    """ Returns the name of the layer and the rings and properties of its features """
+    (number, layerData), = read_message(tile)
+    layer = read_message(layerData)
+    keys = [value.decode() for number, value in layer if number == 3]
+    values = []
+    for number, value in layer:
+        if number == 4:
+            (valueNumber, content), = read_message(value)
+            if valueNumber == 1:
+                content = content.decode()
+            elif valueNumber == 6:
+                content = (content >> 1) ^ -(content & 1)
+            values.append(content)
+    features = []
+    for number, value in layer:
+        if number != 2:
+            continue
+        feature = dict(read_message(value))
+        tags = read_packed(feature[2])
+        properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+        commands = read_packed(feature[4])
+        rings, x, y, i = [], 0, 0, 0
+        while i < len(commands):
+            command, count = commands[i] & 7, commands[i] >> 3
+            i += 1
+            if command == 7:
+                continue
+            if command == 1:
+                rings.append([])
+            for _ in range(count):
+                dx, dy = commands[i], commands[i + 1]
+                x += (dx >> 1) ^ -(dx & 1)
+                y += (dy >> 1) ^ -(dy & 1)
+                rings[-1].append((x, y))
+                i += 2
+        features.append((feature[1], rings, properties))
+    return dict(layer)[1].decode(), dict(layer)[15], features
+
+
+def test_tile_holds_the_clipped_polygons_and_their_properties():
+    # a square with a hole in the north east quarter of the world and one in the south west
+    square = Polygon([(10, 10), (40, 10), (40, 40), (10, 40)], [[(20, 20), (20, 30), (30, 30), (30, 20)]])
+    layer = TileLayer('countries', gpd.GeoSeries([square, box(-40, -40, -10, -10)]),
+                      [{'GeoID': 'AA', 'Cases': 12, 'Incidence': 1.5}, {'GeoID': 'BB', 'Cases': 12}], precomputedZoom=1)
+    name, version, features = decode_tile(layer.get_tile(1, 1, 0))
+    assert (name, version) == ('countries', 2)
+    (id, rings, properties), = features
+    assert id == 1
+    assert properties == {'GeoID': 'AA', 'Cases': 12, 'Incidence': 1.5}
+    # the exterior ring is clockwise and the hole counter clockwise in tile units (y down)
+    exterior, hole = [Polygon(ring) for ring in rings]
+    assert exterior.exterior.is_ccw and not hole.exterior.is_ccw
+    assert 0 < exterior.bounds[0] < EXTENT / 2 < exterior.bounds[3] < EXTENT
+    # tiles beyond the precomputed zoom levels are encoded on request, empty tiles have no layer
+    assert len(decode_tile(layer.get_tile(2, 1, 2))[2]) == 1
+    assert layer.get_tile(3, 0, 0) == b''